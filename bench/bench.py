@@ -0,0 +1,724 @@
+# bench/bench.py
+"""
+KAPI RUN yerel yük testi / benchmark.
+
+Uygulamayı (bot.main:app) aynı process içinde ASGI üzerinden çalıştırır; ağ yok.
+Telegram Bot API için yerel bir sahte sunucu açar, Postgres yerine bellekte
+çalışan sahte bir engine kullanır (ya da --database-url ile gerçek DB'ye bağlanır).
+
+Kullanım (repo kökünden):
+    python -m bench.bench --scenario game_over_storm --requests 5000 --concurrency 100
+    python -m bench.bench --scenario top_burst --seed 20000
+    python -m bench.bench --scenario cold_asset_load --clients 20
+    python -m bench.bench --scenario all --json bench_output.json
+
+Her endpoint için istek sayısı, hata, throughput, p50/p95/p99 gecikme ve istek
+başına DB statement sayısı raporlanır.
+"""
+import os
+import re
+import sys
+import json
+import hmac
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+BENCH_BOT_TOKEN = "123456:BENCH-TOKEN"
+BENCH_SECRET = "bench-secret"
+BENCH_ADMIN = "bench-admin"
+
+# istek anında hangi endpoint ölçülüyor; DB statement'ları buna yazılır
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="background")
+db_statements: Counter = Counter()
+
+# =========================
+# SIGNING
+# =========================
+def sign_init_data(user: Dict[str, Any], bot_token: str = BENCH_BOT_TOKEN,
+                   auth_date: Optional[int] = None, **extra: str) -> str:
+    """Telegram'ın WebApp initData'sını üretir (bot.main.InitDataVerifier ile doğrulanır)."""
+    fields = {
+        "auth_date": str(auth_date if auth_date is not None else int(time.time())),
+        "query_id": extra.pop("query_id", f"AAH{user['id']}"),
+        "user": json.dumps(user, separators=(",", ":"), ensure_ascii=False),
+        **extra,
+    }
+    secret = hmac.new(b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256).digest()
+    dcs = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+    fields["hash"] = hmac.new(secret, dcs.encode("utf-8"), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+def sign_legacy(user_id: int, score: int, secret: str = BENCH_SECRET) -> str:
+    """Eski `sig` alanı: HMAC_SHA256(SECRET, "user_id:score")."""
+    return hmac.new(secret.encode("utf-8"), f"{user_id}:{score}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+# =========================
+# FAKE TELEGRAM BOT API
+# =========================
+class FakeBotApi:
+    """getMe, sendMessage, setChatMenuButton vb. için geçerli yanıt dönen yerel sunucu."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.calls: Counter = Counter()
+        self._msg_id = 0
+        self.app = Starlette(routes=[Route("/bot{token}/{method}", self.handle, methods=["GET", "POST"])])
+        self.server: Optional[uvicorn.Server] = None
+        self.port = 0
+
+    async def handle(self, request: Request):
+        method = request.path_params["method"]
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == "getMe":
+            result: Any = {"id": 123456, "is_bot": True, "first_name": "KAPI", "username": "kapi_bench_bot"}
+        elif method in ("sendMessage", "sendGame", "editMessageText"):
+            self._msg_id += 1
+            result = {
+                "message_id": self._msg_id,
+                "date": int(time.time()),
+                "chat": {"id": 1, "type": "private"},
+                "text": "",
+            }
+        else:
+            result = True
+        return JSONResponse({"ok": True, "result": result})
+
+    async def start(self) -> None:
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off")
+        self.server = uvicorn.Server(config)
+        self._task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        self.port = self.server.servers[0].sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.should_exit = True
+            await self._task
+
+# =========================
+# FAKE DATABASE
+# =========================
+class FakeRow(tuple):
+    def __new__(cls, mapping: Dict[str, Any]):
+        row = super().__new__(cls, tuple(mapping.values()))
+        row._mapping = mapping
+        return row
+
+class FakeResult:
+    def __init__(self, rows: List[Dict[str, Any]] = (), rowcount: Optional[int] = None):
+        self._rows = [FakeRow(r) for r in rows]
+        self.rowcount = len(self._rows) if rowcount is None else rowcount
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def one(self):
+        if len(self._rows) != 1:
+            raise RuntimeError(f"expected one row, got {len(self._rows)}")
+        return self._rows[0]
+
+    def one_or_none(self):
+        return self._rows[0] if self._rows else None
+
+    def all(self):
+        return list(self._rows)
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+COPY_ESCAPES = {"t": "\t", "n": "\n", "r": "\r"}
+
+def _copy_unescape(field: str) -> Optional[str]:
+    # COPY text biçimi: \N NULL, \t \n \r \\ kaçışları
+    if field == "\\N":
+        return None
+    return re.sub(r"\\(.)", lambda m: COPY_ESCAPES.get(m.group(1), m.group(1)), field)
+
+LB_COLUMNS = ("user_id", "username", "best_score", "updated_at")
+
+def _lb_order(row: Dict[str, Any]) -> Tuple[int, datetime, int]:
+    return (-row["best_score"], row["updated_at"], row["user_id"])
+
+class FakeDatabase:
+    """
+    bot.main'in kullandığı SQL'in küçük bir alt kümesini bellekte uygular: skor
+    upsert'leri (tekli ve unnest, reset_at koşuluyla), leaderboard SELECT'i ve keyset
+    sayfaları, sıra sorguları, export akışı, reset'ler, sezonlar, şema sürümü, asset
+    manifestleri, run geçmişi toplamları ve import'un COPY + birleştirme adımı.
+    Tanınmayan statement'lar boş sonuç döner; şema DDL'i yok sayılır.
+    """
+
+    def __init__(self, latency_ms: float, pool_size: int):
+        self.latency = latency_ms / 1000.0
+        self.pool = asyncio.Semaphore(pool_size)
+        self.season = 1
+        self.scores: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self.staged: List[Tuple[int, Optional[str], int]] = []   # score_import geçici tablosu
+        self.manifests: Dict[str, str] = {}                        # asset_manifests: sürüm -> JSON
+        # run geçmişi: runs satırları, aylık bölümler ve toplamlar
+        self.runs: List[tuple] = []
+        self.partitions: set = set()
+        self.user_stats: Dict[Tuple[int, int], List[Any]] = {}
+        self.user_days: set = set()
+        self.daily_stats: Dict[Any, List[int]] = {}
+        self.schema_versions: set = set()
+
+    def seed(self, n: int) -> None:
+        now = datetime.now(timezone.utc)
+        for uid in range(1, n + 1):
+            self.scores[(self.season, uid)] = {
+                "user_id": uid, "username": f"seed{uid}",
+                "best_score": random.randint(0, 5000), "updated_at": now, "season": self.season,
+            }
+
+    def _upsert(self, season: int, uid: int, uname: Optional[str], score: int,
+                age: float = 0.0) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        old = self.scores.get((season, uid))
+        if old is None:
+            row = {"user_id": uid, "username": uname, "best_score": score, "updated_at": now, "season": season}
+        elif old.get("reset_at") and old["reset_at"] >= now - timedelta(seconds=age):
+            # yazı reset'ten önce alınmıştı: WHERE koşulu satırı atlar, RETURNING boş
+            return None
+        else:
+            better = score > old["best_score"]
+            row = {**old, "username": uname, "best_score": max(score, old["best_score"]),
+                   "updated_at": now if better else old["updated_at"]}
+        self.scores[(season, uid)] = row
+        return row
+
+    def copy_in(self, data: bytes) -> None:
+        for line in data.decode("utf-8").split("\n"):
+            if line:
+                uid, uname, score = [_copy_unescape(f) for f in line.split("\t")]
+                self.staged.append((int(uid), uname, int(score)))
+
+    def _merge_import(self, season: int) -> int:
+        best: Dict[int, Tuple[Optional[str], int]] = {}
+        for uid, uname, score in self.staged:
+            cur = best.get(uid)
+            name = cur[0] if cur else None
+            if uname is not None and (name is None or score > cur[1]):
+                name = uname
+            best[uid] = (name, max(score, cur[1]) if cur else score)
+        changed = 0
+        now = datetime.now(timezone.utc)
+        for uid in sorted(best):
+            uname, score = best[uid]
+            old = self.scores.get((season, uid))
+            if old is None:
+                self.scores[(season, uid)] = {"user_id": uid, "username": uname, "best_score": score,
+                                              "updated_at": now, "season": season}
+            elif score > old["best_score"] or (uname is not None and uname != old["username"]):
+                better = score > old["best_score"]
+                self.scores[(season, uid)] = {
+                    **old, "username": uname if uname is not None else old["username"],
+                    "best_score": max(score, old["best_score"]),
+                    "updated_at": now if better else old["updated_at"],
+                }
+            else:
+                continue
+            changed += 1
+        self.staged = []
+        return changed
+
+    def _ranked(self, season: int) -> List[Dict[str, Any]]:
+        rows = (r for (s, _), r in self.scores.items() if s == season)
+        return [{k: r[k] for k in LB_COLUMNS} for r in sorted(rows, key=_lb_order)]
+
+    def execute(self, sql: str, p: Dict[str, Any]) -> FakeResult:
+        q = " ".join(sql.lower().split())
+        if q.startswith("insert into scores") and "from score_import" in q:
+            return FakeResult(rowcount=self._merge_import(p["season"]))
+        if q.startswith("insert into scores") and "unnest" in q:
+            rows = [self._upsert(p["season"], u, n, s, p.get("age", 0.0))
+                    for u, n, s in zip(p["uids"], p["unames"], p["scores"])]
+            return FakeResult([r for r in rows if r is not None])
+        if q.startswith("insert into scores"):
+            row = self._upsert(p["season"], p["uid"], p["uname"], p["s"], p.get("age", 0.0))
+            return FakeResult([row] if row is not None else [])
+        if q.startswith("create temp table score_import"):
+            self.staged = []
+            return FakeResult()
+        if q.startswith("update scores set best_score=0"):
+            changed = 0
+            for uid in p["uids"]:
+                row = self.scores.get((p["season"], uid))
+                if row:
+                    now = datetime.now(timezone.utc)
+                    self.scores[(p["season"], uid)] = {**row, "best_score": 0, "updated_at": now, "reset_at": now}
+                    changed += 1
+            return FakeResult(rowcount=changed)
+        if q.startswith("insert into asset_manifests"):
+            self.manifests.setdefault(p["v"], p["f"])
+            return FakeResult()
+        if "from asset_manifests where version" in q:
+            return FakeResult([{"files": self.manifests[p["v"]]}] if p["v"] in self.manifests else [])
+        if "select max(id) from seasons" in q:
+            return FakeResult([{"max": self.season}])
+        if "from seasons where id = :season" in q:
+            return FakeResult([{"exists": 1 <= p["season"] <= self.season}])
+        if q.startswith("insert into seasons") and "returning id" in q:
+            self.season += 1
+            return FakeResult([{"id": self.season}])
+        if "from scores" in q and "order by best_score desc" in q and ":lim" in q:
+            return FakeResult(self._ranked(p["season"])[: p["lim"]])
+        if "from scores" in q and "(updated_at, user_id) > (:t, :uid)" in q:
+            # keyset sayfası: (best_score DESC, updated_at ASC, user_id) sırasında anahtardan sonrakiler
+            key = (-p["s"], p["t"], p["uid"])
+            return FakeResult([r for r in self._ranked(p["season"]) if _lb_order(r) > key][: p["n"]])
+        if "from scores" in q and "order by best_score desc" in q:
+            return FakeResult(self._ranked(p["season"]))
+        if "from scores where season = :season and user_id = :uid" in q:
+            row = self.scores.get((p["season"], p["uid"]))
+            return FakeResult([{k: row[k] for k in LB_COLUMNS}] if row else [])
+        if "(updated_at, user_id) < (:t, :uid)" in q:
+            # rank_count: önündeki satır sayısı + 1; rank_window: hemen üstündeki n satır (yakından uzağa)
+            key = (-p["s"], p["t"], p["uid"])
+            ahead = [r for r in self._ranked(p["season"]) if _lb_order(r) < key]
+            if "limit :n" in q:
+                return FakeResult(ahead[::-1][: p["n"]])
+            return FakeResult([{"rank": len(ahead) + 1}])
+        if "from score_hist where season = :season" in q:
+            return FakeResult([{"total": len(self._ranked(p["season"]))}])
+        if "from schema_version" in q:
+            return FakeResult([{"max": max(self.schema_versions, default=None)}])
+        if q.startswith("insert into schema_version"):
+            self.schema_versions.add(p["v"])
+            return FakeResult()
+        if q.startswith("create table if not exists runs_"):
+            self.partitions.add(q.split()[5])
+            return FakeResult()
+        if q.startswith("drop table if exists runs_"):
+            self.partitions.discard(q.split()[4])
+            return FakeResult()
+        if "from pg_inherits" in q:
+            return FakeResult([{"relname": n} for n in sorted(self.partitions)])
+        if q.startswith("insert into user_stats"):
+            for row in zip(p["seasons"], p["uids"], p["runs"], p["totals"], p["lasts"]):
+                u = self.user_stats.setdefault(row[:2], [0, 0, row[4]])
+                u[0] += row[2]
+                u[1] += row[3]
+                u[2] = max(u[2], row[4])
+            return FakeResult()
+        if "insert into user_days" in q:
+            fresh = {pair for pair in zip(p["pdays"], p["puids"]) if pair not in self.user_days}
+            self.user_days |= fresh
+            for day, runs, total in zip(p["days"], p["runs"], p["totals"]):
+                d = self.daily_stats.setdefault(day, [0, 0, 0])
+                d[0] += sum(1 for fd, _ in fresh if fd == day)
+                d[1] += runs
+                d[2] += total
+            return FakeResult()
+        if q.startswith("delete from user_days"):
+            self.user_days = {pair for pair in self.user_days if pair[0] >= p["cutoff"]}
+            return FakeResult()
+        if "information_schema" in q or "pg_try_advisory_lock" in q:
+            return FakeResult([{"count": 1}])
+        if q.startswith("select"):
+            return FakeResult([{"value": 0}])
+        return FakeResult()
+
+class _FakeCopy:
+    def __init__(self, db: FakeDatabase, statement: str):
+        self.db = db
+        self.table = statement.split()[1]
+        self._buf: List[bytes] = []
+        self._rows: List[tuple] = []
+
+    async def write(self, data: bytes) -> None:
+        self._buf.append(bytes(data))
+
+    async def write_row(self, row) -> None:
+        self._rows.append(tuple(row))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, *exc) -> None:
+        if exc_type is not None:
+            return
+        if self.table == "runs":
+            self.db.runs.extend(self._rows)
+        else:
+            self.db.copy_in(b"".join(self._buf))
+
+class _FakeCursor:
+    """psycopg AsyncCursor'ın import ve run geçmişinde kullanılan kısmı: copy()."""
+
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    def copy(self, statement: str) -> _FakeCopy:
+        return _FakeCopy(self.db, statement)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+class _FakeStream:
+    """AsyncResult'ın export'ta kullanılan kısmı: mappings().partitions(n)."""
+
+    def __init__(self, result: FakeResult):
+        self._rows = [r._mapping for r in result]
+
+    def mappings(self) -> "_FakeStream":
+        return self
+
+    async def partitions(self, size: int):
+        for i in range(0, len(self._rows), size):
+            yield self._rows[i: i + size]
+
+class FakeConnection:
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    async def execute(self, stmt, params: Optional[Dict[str, Any]] = None):
+        db_statements[current_endpoint.get()] += 1
+        if self.db.latency:
+            await asyncio.sleep(self.db.latency)
+        return self.db.execute(getattr(stmt, "text", str(stmt)), params or {})
+
+    async def commit(self) -> None:
+        db_statements[current_endpoint.get()] += 1
+
+    async def execution_options(self, **options) -> "FakeConnection":
+        # postgresql_readonly vb.; sahte DB'de etkisi yok
+        return self
+
+    async def stream(self, stmt, params: Optional[Dict[str, Any]] = None):
+        return _FakeStream(await self.execute(stmt, params))
+
+    async def get_raw_connection(self):
+        # AsyncConnection.get_raw_connection().driver_connection -> psycopg bağlantısı
+        return self
+
+    @property
+    def driver_connection(self):
+        return self
+
+    def cursor(self) -> _FakeCursor:
+        db_statements[current_endpoint.get()] += 1
+        return _FakeCursor(self.db)
+
+class _FakeConnect:
+    def __init__(self, db: FakeDatabase, transactional: bool):
+        self.db = db
+        self.transactional = transactional
+
+    async def __aenter__(self) -> FakeConnection:
+        await self.db.pool.acquire()
+        if self.transactional:
+            db_statements[current_endpoint.get()] += 1   # BEGIN
+        return FakeConnection(self.db)
+
+    async def __aexit__(self, *exc) -> None:
+        if self.transactional:
+            db_statements[current_endpoint.get()] += 1   # COMMIT / ROLLBACK
+        self.db.pool.release()
+
+class FakeEngine:
+    """AsyncEngine'in bot.main'de kullanılan kısmı: begin(), connect(), dispose()."""
+
+    def __init__(self, db: FakeDatabase):
+        self.db = db
+
+    def begin(self):
+        return _FakeConnect(self.db, True)
+
+    def connect(self):
+        return _FakeConnect(self.db, False)
+
+    async def dispose(self) -> None:
+        pass
+
+def _count_real_statements(engine) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        db_statements[current_endpoint.get()] += 1
+
+# =========================
+# MEASUREMENT
+# =========================
+class EndpointStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.elapsed = 0.0
+
+    def record(self, seconds: float, status: int) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+
+    @property
+    def errors(self) -> int:
+        return sum(n for s, n in self.statuses.items() if s >= 400)
+
+def _percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = max(0, min(len(sorted_vals) - 1, int(round(pct / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+RequestSpec = Tuple[str, str, str, Dict[str, Any]]   # label, method, url, httpx kwargs
+
+async def run_load(client: httpx.AsyncClient, make: Callable[[int], RequestSpec],
+                   total: int, concurrency: int, stats: Dict[str, EndpointStats]) -> float:
+    counter = iter(range(total))
+    touched = set()
+
+    async def worker():
+        for i in counter:
+            label, method, url, kw = make(i)
+            touched.add(label)
+            token = current_endpoint.set(label)
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, url, **kw)
+                status = r.status_code
+            except Exception as e:
+                print(f"[bench] {label} request error: {e}", file=sys.stderr)
+                status = 599
+            stats[label].record(time.perf_counter() - t0, status)
+            current_endpoint.reset(token)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - t0
+    for label in touched:
+        stats[label].elapsed += elapsed
+    return elapsed
+
+# =========================
+# SCENARIOS
+# =========================
+_update_ids = iter(range(1, 10**12))
+
+def _user(i: int, users: int) -> Dict[str, Any]:
+    uid = 1_000_000 + (i % users)
+    return {"id": uid, "first_name": "Bench", "username": f"bench{uid}"}
+
+def _command_update(text: str, uid: int) -> Dict[str, Any]:
+    return {
+        "update_id": next(_update_ids),
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        },
+    }
+
+def scenario_game_over_storm(args, main) -> Callable[[int], RequestSpec]:
+    # aynı oyuncular tekrar tekrar oynar; initData oturum boyunca sabittir
+    init_data = {}
+    legacy_every = int(1 / args.legacy_ratio) if args.legacy_ratio > 0 else 0
+
+    def make(i: int) -> RequestSpec:
+        u = _user(i, args.users)
+        if args.reset_every and i % args.reset_every == args.reset_every - 1:
+            # hile temizliği: son oynayanlardan bir grup toplu sıfırlanır
+            uids = [_user(i - k, args.users)["id"] for k in range(10)]
+            return ("POST /api/admin/reset_users", "POST", "/api/admin/reset_users",
+                    {"json": {"user_ids": uids}, "headers": {"X-Admin-Token": BENCH_ADMIN}})
+        score = random.randint(0, 5000)
+        if legacy_every and i % legacy_every == 0:
+            body = {"user_id": u["id"], "username": u["username"], "score": score,
+                    "sig": sign_legacy(u["id"], score)}
+            return ("POST /api/score (sig)", "POST", "/api/score", {"json": body})
+        if u["id"] not in init_data:
+            init_data[u["id"]] = sign_init_data(u)
+        d = init_data[u["id"]]
+        return ("POST /api/score", "POST", "/api/score",
+                {"json": {"score": score, "init_data": d}, "headers": {"X-Telegram-Init-Data": d}})
+    return make
+
+def scenario_top_burst(args, main) -> Callable[[int], RequestSpec]:
+    def make(i: int) -> RequestSpec:
+        if i % 2:
+            return ("GET /api/leaderboard", "GET", "/api/leaderboard?limit=200", {})
+        upd = _command_update("/top", 1_000_000 + (i % args.users))
+        return ("POST webhook /top", "POST", main.WEBHOOK_PATH, {"json": upd})
+    return make
+
+def scenario_cold_asset_load(args, main) -> Callable[[int], RequestSpec]:
+    paths = ["/", "/data.json", "/style.css", "/offline.json", "/scripts/c3runtime.js", "/scripts/main.js"]
+    try:
+        with open("offline.json", "r", encoding="utf-8-sig") as f:
+            paths += ["/" + p for p in json.load(f).get("fileList", [])]
+    except Exception as e:
+        print("[bench] offline.json not readable:", e, file=sys.stderr)
+    enc = {"Accept-Encoding": "br, gzip"}
+
+    def make(i: int) -> RequestSpec:
+        return ("GET static (cold)", "GET", paths[i % len(paths)], {"headers": enc})
+    make.paths = paths   # type: ignore[attr-defined]
+    return make
+
+SCENARIOS = {
+    "game_over_storm": scenario_game_over_storm,
+    "top_burst": scenario_top_burst,
+    "cold_asset_load": scenario_cold_asset_load,
+}
+
+async def revalidate_assets(client: httpx.AsyncClient, paths: List[str], args,
+                            stats: Dict[str, EndpointStats]) -> float:
+    """Sıcak ziyaret: önceki ETag'lerle If-None-Match gönderir (304 beklenir)."""
+    etags = {}
+    for p in paths:
+        r = await client.get(p, headers={"Accept-Encoding": "br, gzip"})
+        if "etag" in r.headers:
+            etags[p] = r.headers["etag"]
+
+    def make(i: int) -> RequestSpec:
+        p = paths[i % len(paths)]
+        h = {"Accept-Encoding": "br, gzip"}
+        if p in etags:
+            h["If-None-Match"] = etags[p]
+        return ("GET static (revalidate)", "GET", p, {"headers": h})
+    return await run_load(client, make, args.clients * len(paths), args.concurrency, stats)
+
+# =========================
+# MAIN
+# =========================
+def _report(name: str, stats: Dict[str, EndpointStats], elapsed: float,
+            bot_calls: Counter) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"scenario": name, "elapsed_s": round(elapsed, 3), "endpoints": {}}
+    print(f"\n== {name} ({elapsed:.2f}s) ==")
+    print(f"{'endpoint':<28}{'n':>7}{'err':>6}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'db/req':>8}  status")
+    for label, st in sorted(stats.items()):
+        lat = sorted(st.latencies)
+        n = len(lat)
+        row = {
+            "requests": n,
+            "errors": st.errors,
+            "statuses": dict(st.statuses),
+            "rps": round(n / st.elapsed, 1) if st.elapsed else 0.0,
+            "p50_ms": round(_percentile(lat, 50) * 1000, 2),
+            "p95_ms": round(_percentile(lat, 95) * 1000, 2),
+            "p99_ms": round(_percentile(lat, 99) * 1000, 2),
+            "db_statements": db_statements[label],
+            "db_per_request": round(db_statements[label] / n, 2) if n else 0.0,
+        }
+        out["endpoints"][label] = row
+        codes = " ".join(f"{s}x{c}" for s, c in sorted(st.statuses.items()))
+        print(f"{label:<28}{n:>7}{row['errors']:>6}{row['rps']:>9}{row['p50_ms']:>9}"
+              f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['db_per_request']:>8}  {codes}")
+    if db_statements["background"]:
+        print(f"{'(background)':<28}{'':>7}{'':>6}{'':>9}{'':>9}{'':>9}{'':>9}{db_statements['background']:>8}")
+    out["background_db_statements"] = db_statements["background"]
+    out["bot_api_calls"] = dict(bot_calls)
+    if bot_calls:
+        print("bot api calls:", dict(bot_calls))
+    return out
+
+async def amain(args) -> int:
+    fake_tg = FakeBotApi(args.botapi_latency_ms)
+    await fake_tg.start()
+
+    os.environ["TELEGRAM_BOT_TOKEN"] = BENCH_BOT_TOKEN
+    os.environ["TELEGRAM_BASE_URL"] = f"http://127.0.0.1:{fake_tg.port}/bot"
+    os.environ["SECRET"] = BENCH_SECRET
+    os.environ["SECRET_ADMIN"] = BENCH_ADMIN
+    os.environ["DATABASE_URL"] = args.database_url or "postgresql+psycopg://fake/bench"
+    # yük üretici tek IP'den ve aynı oyunculardan gelir; hız sınırları ölçümü bozmasın
+    for name in ("RATE_LIMIT_SCORE", "RATE_LIMIT_SCORE_IP", "RATE_LIMIT_WEBHOOK"):
+        os.environ.setdefault(name, "0")
+    if not args.database_url:
+        os.environ["RUN_HISTORY"] = "0"   # sahte motor COPY protokolünü taklit etmez
+    import bot.main as main
+    from bot import db as bot_db
+
+    fake_db = FakeDatabase(args.db_latency_ms, args.db_pool)
+    fake_db.seed(args.seed)
+    real_create = bot_db.create_async_engine
+
+    def create_engine(url, **kw):
+        if args.database_url:
+            eng = real_create(url, **kw)
+            _count_real_statements(eng)
+            return eng
+        return FakeEngine(fake_db)
+    bot_db.create_async_engine = create_engine
+
+    await main.on_startup()
+    # platform gibi /ready'i bekle: asset indeksi ve Telegram initialize arkada tamamlanır
+    while not all(main.readiness.values()):
+        await asyncio.sleep(0.05)
+    db_statements.clear()
+
+    results = []
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in names:
+                stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+                db_statements.clear()
+                fake_tg.calls.clear()
+                make = SCENARIOS[name](args, main)
+                total = args.requests
+                if name == "cold_asset_load":
+                    total = args.clients * len(make.paths)
+                elapsed = await run_load(client, make, total, args.concurrency, stats)
+                if name == "cold_asset_load":
+                    elapsed += await revalidate_assets(client, make.paths, args, stats)
+                # kuyruklu modlarda arkada kalan işi de say
+                await asyncio.sleep(0.2)
+                results.append(_report(name, stats, elapsed, fake_tg.calls))
+    finally:
+        await main.on_shutdown()
+        await fake_tg.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2, default=str)
+        print(f"\nwrote {args.json}")
+    return 0
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="KAPI RUN local benchmark")
+    ap.add_argument("--scenario", default="all", choices=["all"] + list(SCENARIOS))
+    ap.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--users", type=int, default=500, help="distinct players")
+    ap.add_argument("--clients", type=int, default=10, help="cold_asset_load: simulated game opens")
+    ap.add_argument("--reset-every", type=int, default=100,
+                    help="game_over_storm: every Nth request is a bulk admin reset (0 = off)")
+    ap.add_argument("--legacy-ratio", type=float, default=0.0, help="share of score posts using legacy sig")
+    ap.add_argument("--seed", type=int, default=1000, help="fake DB: pre-existing score rows")
+    ap.add_argument("--db-latency-ms", type=float, default=1.0, help="fake DB: per statement latency")
+    ap.add_argument("--db-pool", type=int, default=15, help="fake DB: concurrent connections")
+    ap.add_argument("--botapi-latency-ms", type=float, default=20.0, help="fake Bot API: per call latency")
+    ap.add_argument("--database-url", default="", help="use a real Postgres instead of the fake DB")
+    ap.add_argument("--json", default="", help="write results to this file")
+    args = ap.parse_args()
+    random.seed(1)
+    return asyncio.run(amain(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
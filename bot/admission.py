@@ -0,0 +1,236 @@
+# bot/admission.py
+"""
+Öncelikli admission control: route sınıfları tek bir in-flight bütçesini paylaşır,
+yük altında düşük öncelikli istekler kuyrukta bekletilir ya da 503 ile reddedilir.
+"""
+import asyncio
+import math
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+from bot.config import (
+    WEBHOOK_PATH, ADMISSION_CAPACITY, ADMISSION_QUEUE, ADMISSION_POOL_WAIT_MS,
+    ADMISSION_LOOP_LAG_MS,
+)
+from bot.assets import NO_STORE_PREFIXES, NO_STORE_PATHS, asset_index
+from bot.metrics import metrics
+
+# =========================
+# ADMISSION CONTROL
+# =========================
+class AdmissionClass:
+    """
+    Bir route sınıfı. `share`: toplam kapasitenin bu sınıfa açık kısmı; düşük öncelikli
+    sınıflar kapasitenin son kısmını üst sınıflara bırakır. `max_wait`: kuyrukta en fazla bekleme.
+    """
+    __slots__ = ("name", "priority", "share", "max_wait", "inflight", "waiting", "admitted", "shed")
+
+    def __init__(self, name: str, priority: int, share: float, max_wait: float):
+        self.name = name
+        self.priority = priority
+        self.share = share
+        self.max_wait = max_wait
+        self.inflight = 0
+        self.waiting: deque = deque()
+        self.admitted = 0
+        self.shed = 0
+
+class AdmissionController:
+    """
+    Route sınıfları (webhook > score > read > static) tek bir in-flight bütçesini paylaşır;
+    AssetIndex'ten bellekten sunulan dosyalar sınıflandırılmaz.
+    Sınıf, toplam in-flight `capacity * scale * share` altındaysa hemen girer; değilse
+    kuyrukta bekler ve boşalan yer önce yüksek öncelikli sınıfa verilir. Kuyruk doluysa ya da
+    bekleme süresi dolarsa istek 503 + Retry-After ile hemen reddedilir.
+    `scale` her örneklemede ayarlanır: DB pool bekleme ortalaması ya da event loop gecikmesi
+    hedefi aşarsa çarpımsal azalır, aşmazsa yavaşça 1'e döner (AIMD).
+    """
+
+    SAMPLE_INTERVAL = 0.25
+    MIN_SCALE = 0.1
+
+    def __init__(self, capacity: int, queue_max: int, pool_wait_ms: int, loop_lag_ms: int):
+        self.capacity = capacity
+        self.queue_max = queue_max
+        self.pool_target = pool_wait_ms / 1000.0
+        self.lag_target = loop_lag_ms / 1000.0
+        self.scale = 1.0
+        self.loop_lag = 0.0
+        self.pool_wait = 0.0
+        self.inflight = 0
+        self.classes = {
+            c.name: c for c in (
+                AdmissionClass("webhook", 0, 1.0, 10.0),
+                AdmissionClass("score", 1, 0.9, 2.0),
+                AdmissionClass("read", 2, 0.7, 0.5),
+                AdmissionClass("static", 3, 0.5, 2.0),
+            )
+        }
+        self._ordered = sorted(self.classes.values(), key=lambda c: c.priority)
+        self._task: Optional[asyncio.Task] = None
+
+    def classify(self, scope) -> Optional[AdmissionClass]:
+        p = scope["path"]
+        if p == WEBHOOK_PATH:
+            return self.classes["webhook"]
+        if p == "/api/score":
+            return self.classes["score"]
+        if p.startswith("/api/"):
+            # canlı akış uzun yaşar, LIVE_MAX_SUBSCRIBERS ile sınırlı; admin işleri kısılmaz
+            if p == "/api/leaderboard/live" or p.startswith("/api/admin/"):
+                return None
+            return self.classes["read"]
+        # bellekten sunulan asset'ler ve sw.js/offline.json DB'ye dokunmaz; sw.js offline kurulumu
+        # tek bir başarısız dosyada baştan başladığı için bunlar hiç reddedilmez
+        if p == "/" or p in asset_index.assets or p in NO_STORE_PATHS:
+            return None
+        if scope["method"] in ("GET", "HEAD") and p.startswith(NO_STORE_PREFIXES):
+            return self.classes["static"]   # indekste olmayan, diskten okunan dosyalar
+        return None
+
+    def _limit(self, c: AdmissionClass) -> int:
+        return max(1, int(self.capacity * self.scale * c.share))
+
+    def _grant(self, c: AdmissionClass) -> None:
+        self.inflight += 1
+        c.inflight += 1
+        c.admitted += 1
+
+    def release(self, c: AdmissionClass) -> None:
+        self.inflight -= 1
+        c.inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        # share önceliğe göre azaldığından üst sınıf sığmıyorsa alttakiler de sığmaz
+        for c in self._ordered:
+            while c.waiting and self.inflight < self._limit(c):
+                fut = c.waiting.popleft()
+                if not fut.done():
+                    self._grant(c)
+                    fut.set_result(True)
+            if c.waiting:
+                return
+
+    def retry_after(self) -> int:
+        return min(30, max(1, math.ceil(1 / self.scale)))
+
+    async def acquire(self, c: AdmissionClass) -> bool:
+        ahead = any(o.waiting for o in self._ordered if o.priority <= c.priority)
+        if not ahead and self.inflight < self._limit(c):
+            self._grant(c)
+            return True
+        if sum(len(o.waiting) for o in self._ordered) >= self.queue_max:
+            # kuyruk dolu: daha düşük öncelikli en yeni bekleyen yer açar, yoksa yeni gelen düşer
+            lowest = next((o for o in reversed(self._ordered) if o.waiting), None)
+            if lowest is None or lowest.priority <= c.priority:
+                c.shed += 1
+                return False
+            victim = lowest.waiting.pop()
+            if not victim.done():
+                victim.set_result(False)
+        fut = asyncio.get_running_loop().create_future()
+        c.waiting.append(fut)
+        try:
+            ok = await asyncio.wait_for(fut, c.max_wait)
+        except asyncio.TimeoutError:
+            # _wake yeri tam süre dolarken vermiş olabilir (3.12+ wait_for bunu da timeout sayar):
+            # verilmiş yer kullanılır, yoksa inflight kalıcı olarak sızar
+            ok = self._granted(fut)
+        except BaseException:
+            # istemci koptu: verilmiş yer varsa geri bırak
+            if self._granted(fut):
+                self.release(c)
+            else:
+                self._discard(c, fut)
+            raise
+        if not ok:
+            self._discard(c, fut)
+            c.shed += 1
+        return ok
+
+    @staticmethod
+    def _granted(fut: asyncio.Future) -> bool:
+        return fut.done() and not fut.cancelled() and bool(fut.result())
+
+    @staticmethod
+    def _discard(c: AdmissionClass, fut: asyncio.Future) -> None:
+        try:
+            c.waiting.remove(fut)
+        except ValueError:
+            pass
+
+    async def _monitor(self) -> None:
+        loop = asyncio.get_running_loop()
+        prev_sum = metrics.pool_wait.sum + metrics.read_pool_wait.sum
+        prev_count = metrics.pool_wait.count + metrics.read_pool_wait.count
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.SAMPLE_INTERVAL)
+            self.loop_lag = max(0.0, loop.time() - t0 - self.SAMPLE_INTERVAL)
+            total = metrics.pool_wait.sum + metrics.read_pool_wait.sum
+            count = metrics.pool_wait.count + metrics.read_pool_wait.count
+            self.pool_wait = (total - prev_sum) / (count - prev_count) if count > prev_count else 0.0
+            prev_sum, prev_count = total, count
+            if self.loop_lag > self.lag_target or self.pool_wait > self.pool_target:
+                self.scale = max(self.MIN_SCALE, self.scale * 0.7)
+            else:
+                self.scale = min(1.0, self.scale + 0.05)
+                self._wake()
+
+    def start(self) -> None:
+        if self.capacity and self._task is None:
+            self._task = asyncio.create_task(self._monitor())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def gauges(self) -> List[Tuple[str, Any]]:
+        g: List[Tuple[str, Any]] = [
+            ("kapi_admission_scale", round(self.scale, 3)),
+            ("kapi_admission_loop_lag_seconds", round(self.loop_lag, 6)),
+            ("kapi_admission_pool_wait_seconds", round(self.pool_wait, 6)),
+        ]
+        for c in self.classes.values():
+            lab = f'{{class="{c.name}"}}'
+            g += [
+                ("kapi_admission_inflight" + lab, c.inflight),
+                ("kapi_admission_waiting" + lab, len(c.waiting)),
+                ("kapi_admission_shed" + lab, c.shed),
+            ]
+        return g
+
+admission = AdmissionController(ADMISSION_CAPACITY, ADMISSION_QUEUE, ADMISSION_POOL_WAIT_MS, ADMISSION_LOOP_LAG_MS)
+metrics.gauges.append(admission.gauges)
+
+class AdmissionMiddleware:
+    """Sınıflandırılan istekleri AdmissionController'dan geçirir; reddedilene gövdesi okunmadan 503 döner."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not admission.capacity:
+            return await self.app(scope, receive, send)
+        c = admission.classify(scope)
+        if c is None:
+            return await self.app(scope, receive, send)
+        if not await admission.acquire(c):
+            body = b'{"detail":"overloaded"}'
+            await send({"type": "http.response.start", "status": 503, "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(admission.retry_after()).encode("latin-1")),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(c)
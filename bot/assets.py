@@ -0,0 +1,499 @@
+# bot/assets.py
+"""
+Statik oyun dosyaları: içerik hash'li, önceden sıkıştırılmış bellek içi indeks,
+onu uygulamaya inmeden sunan ASGI middleware'leri ve tekil dosya route'larının yolları.
+"""
+import os
+import sys
+import json
+import re
+import gzip
+import hashlib
+import mimetypes
+import mmap
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+try:
+    import brotli
+except ImportError:  # brotli yoksa yalnızca gzip varyantı üretilir
+    brotli = None
+
+from bot.config import STATIC_FILES_IMMUTABLE
+
+# =========================
+# NO-STORE HEADERS
+# =========================
+NO_STORE_PREFIXES = ("/images", "/scripts", "/media", "/icons")
+NO_STORE_PATHS = frozenset((
+    "/style.css", "/data.json", "/appmanifest.json", "/manifest.json",
+    "/sw.js", "/offline.json", "/index.html", "/webapp-check.html",
+))
+NO_STORE_HEADERS = [
+    (b"cache-control", b"no-store, no-cache, must-revalidate, max-age=0"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+]
+
+class NoStoreForStatic:
+    """
+    Saf ASGI middleware: yalnızca statik path'lerin yanıt başlığına no-store ekler,
+    API ve webhook isteklerine hiç dokunmaz (BaseHTTPMiddleware'in ek task/stream'i yok).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        p = scope["path"]
+        if not (p in NO_STORE_PATHS or p.startswith(NO_STORE_PREFIXES)):
+            return await self.app(scope, receive, send)
+
+        async def send_no_store(message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    (k, v) for k, v in message.get("headers", [])
+                    if k.lower() not in (b"cache-control", b"pragma", b"expires")
+                ]
+                headers.extend(NO_STORE_HEADERS)
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_no_store)
+
+# =========================
+# STATIC ASSET INDEX
+# =========================
+# offline.json'daki dosyalara ek olarak her açılışta istenen giriş dosyaları
+ASSET_EXTRA_FILES = (
+    "index.html", "data.json", "style.css", "sw.js", "offline.json", "appmanifest.json",
+    "webapp-check.html", "scripts/c3runtime.js", "scripts/main.js", "scripts/tg-bridge.js",
+)
+# içeriği değişse de URL'i değişmeyen, her açılışta tekrar doğrulanması gereken dosyalar
+ASSET_REVALIDATE_FILES = ("index.html", "data.json", "offline.json", "sw.js", "appmanifest.json")
+ASSET_COMPRESSIBLE = (".js", ".json", ".css", ".html", ".wasm", ".svg", ".txt")
+# büyük medya/wasm dosyaları Python heap'ine okunmaz: mmap'lenir (STATIC_FILES_IMMUTABLE ile
+# doğrudan, yoksa özel bir memfd kopyası), Range istekleri eşlemenin dilimlerinden verilir
+ASSET_MMAP_EXTENSIONS = (".webm", ".wasm", ".ogg", ".opus", ".mp3", ".m4a", ".mp4")
+ASSET_SEND_CHUNK = 256 * 1024
+
+# sayfadaki `yol?v=...` referansları; `"...?v=" + V` biçimindeki JS birleştirmesi de yakalanır
+ASSET_REF_RE = re.compile(r'(?P<path>(?:\./)?[\w./-]+\.\w+)\?v=(?P<v>"\s*\+\s*[A-Za-z_$][\w$]*|[\w.-]*)')
+
+CACHE_REVALIDATE = "no-cache"
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+
+class StaticAsset:
+    __slots__ = ("path", "media_type", "hash", "bodies", "revalidate")
+
+    def __init__(self, path: str, data: Any):   # bytes ya da mmap üzerinde memoryview
+        self.path = path
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if path.endswith(".json"):
+            self.media_type = "application/manifest+json" if path.endswith("manifest.json") else "application/json"
+        self.hash = hashlib.sha256(data).hexdigest()[:20]
+        self.revalidate = path in ASSET_REVALIDATE_FILES
+        self.bodies: Dict[str, bytes] = {"identity": data}
+        if path.endswith(ASSET_COMPRESSIBLE) and len(data) > 512:
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                self.bodies["gzip"] = gz
+            if brotli is not None:
+                # 10-11 ancak %10 daha küçük çıkarıyor ama c3runtime.js için açılışı saniyelerce uzatıyor
+                br = brotli.compress(data, quality=9)
+                if len(br) < len(data):
+                    self.bodies["br"] = br
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.hash}"' if encoding == "identity" else f'"{self.hash}-{encoding}"'
+
+    @classmethod
+    def load(cls, rel: str, full: str) -> "StaticAsset":
+        with open(full, "rb") as f:
+            if rel.endswith(ASSET_MMAP_EXTENSIONS):
+                if STATIC_FILES_IMMUTABLE:
+                    view = _shared_map(f)
+                elif hasattr(os, "memfd_create"):
+                    view = _private_map(f, "asset:" + rel)
+                else:
+                    view = None
+                if view is not None:
+                    return cls(rel, view)
+            return cls(rel, f.read())
+
+def _shared_map(f) -> Optional[memoryview]:
+    """
+    Dosyayı doğrudan salt okunur eşler; sayfalar page cache'ten gelir ve worker'lar arasında
+    paylaşılır. Yalnızca STATIC_FILES_IMMUTABLE ile: dosya yerinde kısaltılırsa erişim SIGBUS verir.
+    """
+    try:
+        if os.fstat(f.fileno()).st_size <= 0:
+            return None
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError):
+        return None
+
+def _private_map(f, name: str) -> Optional[memoryview]:
+    """
+    Dosyanın o anki içeriğini sendfile ile bir memfd'ye kopyalayıp salt okunur eşler.
+    Canlı dosya doğrudan eşlenmez: yerinde yeniden yazılırsa (cp, editör) kısalan sayfa
+    SIGBUS ile worker'ı düşürür, aynı boyda değişiklik de eski ETag ile sunulurdu.
+    Kopya, hash'i hesaplanan içerikle birebir aynıdır; eski sürüm son yanıt bitince GC ile kapanır.
+    Bedeli: kopya her worker'da ayrı bellek tutar (boyut x WEB_CONCURRENCY); bkz. _shared_map.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if size <= 0:
+        return None
+    fd = os.memfd_create(name, os.MFD_CLOEXEC)
+    try:
+        copied = 0
+        while copied < size:
+            n = os.sendfile(fd, f.fileno(), copied, size - copied)
+            if n == 0:   # kopyalanırken kısaldı; hot reload mtime değişiminden yeniden yükler
+                break
+            copied += n
+        if copied == 0:
+            return None
+        return memoryview(mmap.mmap(fd, copied, access=mmap.ACCESS_READ))
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+def _asset_rel(entry: str) -> str:
+    rel = entry.split("?", 1)[0]
+    if rel.startswith("./"):
+        rel = rel[2:]
+    return rel.lstrip("/")
+
+class AssetIndex:
+    """
+    Açılışta offline.json'daki dosyaları okuyup içerik hash'i, gzip ve brotli
+    varyantlarıyla bellekte tutar. URL path'i -> StaticAsset.
+    /offline.json diskteki dosyanın kendisi değil, ondan üretilen içerik adresli
+    manifesttir (bkz. _generate_manifest); üretilen her sürüm `manifests`te kalır.
+    """
+
+    def __init__(self):
+        self.assets: Dict[str, StaticAsset] = {}
+        self.version: Optional[str] = None
+        self._page: Optional[StaticAsset] = None      # hash'li URL'lerle yeniden yazılmış index.html
+        self._page_raw: bytes = b""
+        self.manifests: Dict[str, Dict[str, str]] = {}   # sürüm -> {dosya: hash}
+        self._source: Dict[str, Any] = {}
+        self._manifest: Optional[str] = None
+        self._mtimes: Dict[str, Tuple[float, int]] = {}
+
+    def build(self) -> None:
+        manifest = _first_existing("offline.json")
+        if not manifest:
+            return
+        base = os.path.dirname(manifest)
+        try:
+            with open(manifest, "r", encoding="utf-8-sig") as f:
+                source = json.load(f)
+            files = list(source.get("fileList") or [])
+        except Exception as e:
+            print("offline.json read error:", e, file=sys.stderr)
+            source, files = {}, []
+        assets: Dict[str, StaticAsset] = {}
+        for rel in files + list(ASSET_EXTRA_FILES):
+            rel = _asset_rel(rel)
+            if not rel or "/" + rel in assets:
+                continue
+            full = os.path.join(base, rel)
+            if not os.path.isfile(full):
+                continue
+            assets["/" + rel] = StaticAsset.load(rel, full)
+        self._source = source
+        self._link_page(assets)
+        self._generate_manifest(assets)
+        self.assets = assets
+        self._manifest = manifest
+        self._mtimes = self._stat_all()
+
+    @staticmethod
+    def _versioned(entry: str, assets: Dict[str, StaticAsset]) -> str:
+        """Değişmez dosya için `yol?v=<hash>`; bilinmeyen ya da doğrulanan dosyada girdi aynen kalır."""
+        a = assets.get("/" + _asset_rel(entry))
+        if a is None or a.revalidate:
+            return entry
+        return entry.split("?", 1)[0] + "?v=" + a.hash
+
+    def _link_page(self, assets: Dict[str, StaticAsset]) -> None:
+        """
+        index.html'deki `?v=` referanslarını dosyaların içerik hash'iyle değiştirir; sayfanın
+        istediği URL'ler böylece immutable önbelleklenir ve dosya değişince URL de değişir.
+        """
+        page = assets.get("/index.html")
+        if page is None:
+            return
+        if page is not self._page:   # diskten yeni okundu
+            self._page_raw = bytes(page.bodies["identity"])
+
+        def sub(m: "re.Match[str]") -> str:
+            a = assets.get("/" + _asset_rel(m.group("path")))
+            if a is None or a.revalidate:
+                return m.group(0)
+            url = m.group("path") + "?v=" + a.hash
+            return url + '"' if m.group("v").startswith('"') else url
+
+        html = ASSET_REF_RE.sub(sub, self._page_raw.decode("utf-8"))
+        self._page = StaticAsset("index.html", html.encode("utf-8"))
+        assets["/index.html"] = assets["/"] = self._page
+
+    def _generate_manifest(self, assets: Dict[str, StaticAsset]) -> None:
+        """
+        offline.json'ı diskteki dosyalardan üretir: fileList girdileri sayfayla aynı
+        `?v=<hash>` URL'lerine çevrilir (service worker'ın önbelleği sayfanın isteğiyle
+        eşleşsin), `files` her girdinin hash'ini ve boyunu taşır, `version` bunların
+        hash'idir; yani sürüm yalnızca bir dosyanın içeriği değişince değişir.
+        """
+        if not self._source:
+            return
+        file_list = [self._versioned(e, assets) for e in self._source.get("fileList") or []]
+        files: Dict[str, Dict[str, Any]] = {}
+        for entry in file_list + ["index.html"]:
+            a = assets.get("/" + _asset_rel(entry))
+            if a is not None and entry not in files:
+                files[entry] = {"hash": a.hash, "size": len(a.bodies["identity"])}
+        version = hashlib.sha256(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        out = {**self._source, "version": version, "fileList": file_list, "files": files}
+        assets["/offline.json"] = StaticAsset("offline.json", json.dumps(out, indent=1).encode("utf-8"))
+        self.version = version
+        self.manifests[version] = {k: v["hash"] for k, v in files.items()}
+
+    def _stat_all(self) -> Dict[str, Tuple[float, int]]:
+        files = {"": self._manifest} if self._manifest else {}
+        base = os.path.dirname(self._manifest) if self._manifest else ""
+        for url, asset in self.assets.items():
+            if url == "/" + asset.path:   # "/" gibi takma adları bir kez say
+                files[url] = os.path.join(base, asset.path)
+        out: Dict[str, Tuple[float, int]] = {}
+        for key, full in files.items():
+            try:
+                st = os.stat(full)
+                out[key] = (st.st_mtime, st.st_size)
+            except OSError:
+                out[key] = (0.0, -1)
+        return out
+
+    def refresh(self) -> bool:
+        """Değişen dosyaları yeniden okur; offline.json değiştiyse indeksi baştan kurar."""
+        mtimes = self._stat_all()
+        if mtimes == self._mtimes:
+            return False
+        if mtimes.get("") != self._mtimes.get(""):
+            self.build()
+            return True
+        assets = dict(self.assets)
+        base = os.path.dirname(self._manifest)
+        for url, stamp in mtimes.items():
+            if url == "" or stamp == self._mtimes.get(url):
+                continue
+            rel = assets[url].path
+            try:
+                asset = StaticAsset.load(rel, os.path.join(base, rel))
+            except OSError:
+                assets.pop(url, None)
+                continue
+            for alias, old in self.assets.items():
+                if old.path == rel:
+                    assets[alias] = asset
+        self._link_page(assets)
+        self._generate_manifest(assets)
+        self.assets = assets
+        self._mtimes = mtimes
+        return True
+
+asset_index = AssetIndex()
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Accept-Encoding -> {kodlama: q}; q değeri okunamayan parça yok sayılır."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        name = name.strip()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            k, _, v = param.partition("=")
+            if k.strip() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = -1.0
+        if q >= 0:
+            accepted[name] = q
+    return accepted
+
+def _pick_encoding(asset: StaticAsset, accept_encoding: str) -> str:
+    # en yüksek q kazanır, eşitlikte br; q=0 o kodlamayı reddeder ("*" listelenmeyenlere uygulanır)
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = "identity", 0.0
+    for enc in ("br", "gzip"):
+        q = accepted.get(enc, wildcard)
+        if q > best_q and enc in asset.bodies:
+            best, best_q = enc, q
+    return best
+
+def _etag_matches(asset: StaticAsset, if_none_match: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"').split("-", 1)[0] == asset.hash:
+            return True
+    return False
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Tek aralıklı "bytes=a-b" / "bytes=a-" / "bytes=-n" başlığı -> (başlangıç, bitiş dahil).
+    Geçersiz ya da çok aralıklı başlıkta None (tam yanıt), karşılanamayan aralıkta (-1, -1).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    try:
+        if not sep:
+            return None
+        if first == "":
+            n = int(last)
+            if n <= 0:
+                return (-1, -1)
+            return (max(0, size - n), size - 1)
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return (-1, -1)
+    if start > end:
+        return None
+    return (start, min(end, size - 1))
+
+class StaticAssetMiddleware:
+    """
+    AssetIndex'teki dosyaları uygulamaya inmeden sunar: güçlü ETag, 304 ve
+    Accept-Encoding'e göre önceden sıkıştırılmış gövde. `?v=<hash>` ile istenen
+    dosyalar immutable olarak, diğerleri her seferinde doğrulanarak önbelleklenir.
+    Range istekleri (If-Range dahil) sıkıştırılmamış gövdeden 206 ile karşılanır.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+        asset = asset_index.assets.get(scope["path"])
+        if asset is None:
+            return await self.app(scope, receive, send)
+
+        req_headers = {
+            k: v for k, v in scope["headers"]
+            if k in (b"accept-encoding", b"if-none-match", b"range", b"if-range")
+        }
+        encoding = _pick_encoding(asset, req_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if not asset.revalidate and query.get("v", [""])[0] == asset.hash:
+            cache_control = CACHE_IMMUTABLE
+        else:
+            cache_control = CACHE_REVALIDATE
+        inm = req_headers.get(b"if-none-match")
+        if inm is not None and _etag_matches(asset, inm.decode("latin-1")):
+            headers = [
+                (b"etag", asset.etag(encoding).encode("latin-1")),
+                (b"cache-control", cache_control.encode("latin-1")),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        rng = None
+        range_header = req_headers.get(b"range")
+        if range_header is not None:
+            if_range = req_headers.get(b"if-range")
+            # If-Range eşleşmiyorsa istemcinin parçası eski sürüme ait: tam gövde gönder
+            if if_range is None or if_range.decode("latin-1").strip() == asset.etag("identity"):
+                rng = _parse_range(range_header.decode("latin-1"), len(asset.bodies["identity"]))
+                if rng is not None:
+                    encoding = "identity"
+
+        body = asset.bodies[encoding]
+        size = len(body)
+        headers = [
+            (b"etag", asset.etag(encoding).encode("latin-1")),
+            (b"cache-control", cache_control.encode("latin-1")),
+            (b"vary", b"Accept-Encoding"),
+            (b"accept-ranges", b"bytes"),
+            (b"content-type", asset.media_type.encode("latin-1")),
+        ]
+        if rng == (-1, -1):
+            headers.append((b"content-range", f"bytes */{size}".encode("latin-1")))
+            headers.append((b"content-length", b"0"))
+            await send({"type": "http.response.start", "status": 416, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        status_code = 200
+        if rng is not None:
+            status_code = 206
+            headers.append((b"content-range", f"bytes {rng[0]}-{rng[1]}/{size}".encode("latin-1")))
+            body = memoryview(body)[rng[0]: rng[1] + 1]   # kopyasız dilim
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        if scope["method"] == "HEAD" or len(body) <= ASSET_SEND_CHUNK:
+            await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+            return
+        # büyük gövdeler parça parça: transport bir parçayı boşaltmadan sıradakine geçilmez
+        view = memoryview(body)
+        for off in range(0, len(view), ASSET_SEND_CHUNK):
+            chunk = view[off: off + ASSET_SEND_CHUNK]
+            await send({"type": "http.response.body", "body": chunk, "more_body": off + ASSET_SEND_CHUNK < len(view)})
+
+# =========================
+# STATIC ROUTES
+# =========================
+def _first_existing(filename: str, fallback: bool = True):
+    p1 = os.path.join(os.getcwd(), filename)
+    if os.path.isfile(p1):
+        return p1
+    if fallback:
+        base = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        p2 = os.path.join(base, filename)
+        if os.path.isfile(p2):
+            return p2
+    return None
+
+class StaticRouteTable:
+    """
+    Tekil statik route'ların dosya yollarını bir kez çözer; istek başına
+    _first_existing'in isfile çağrıları yapılmaz. resolve() ile tazelenir.
+    """
+
+    def __init__(self, files: Tuple[str, ...]):
+        self.files = files
+        self._paths: Optional[Dict[str, Optional[str]]] = None
+
+    def resolve(self) -> None:
+        self._paths = {f: _first_existing(f) for f in self.files}
+
+    def get(self, filename: str) -> Optional[str]:
+        if self._paths is None:
+            self.resolve()
+        return self._paths.get(filename)
+
+static_routes = StaticRouteTable((
+    "index.html", "style.css", "data.json", "appmanifest.json", "manifest.json",
+    "sw.js", "offline.json", "webapp-check.html",
+))
@@ -0,0 +1,149 @@
+# bot/config.py
+"""
+Ortam değişkenlerinden okunan ayarlar; tüm modüller buradan alır.
+"""
+import os
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+# =========================
+# ENV
+# =========================
+def _env_flag(name: str, default: bool = False) -> bool:
+    v = (os.environ.get(name) or "").strip().lower()
+    if not v:
+        return default
+    return v in ("1", "true", "yes", "on")
+
+TELEGRAM_BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
+DATABASE_URL = (os.environ.get("DATABASE_URL") or "").strip()
+SECRET = (os.environ.get("SECRET") or "").strip()  # optional legacy HMAC
+PUBLIC_GAME_URL = (os.environ.get("PUBLIC_GAME_URL") or "/").strip()
+GAME_SHORT_NAME = (os.environ.get("GAME_SHORT_NAME") or "kapi_run").strip()
+# yerel test/benchmark için Bot API adresi (ör. http://127.0.0.1:8081/bot)
+TELEGRAM_BASE_URL = (os.environ.get("TELEGRAM_BASE_URL") or "").strip()
+# Bot API'ye eşzamanlı bağlantı sayısı (PTB varsayılanı 1: tüm handler'ların çağrıları sıraya girer)
+TELEGRAM_POOL_SIZE = max(1, int(os.environ.get("TELEGRAM_POOL_SIZE", "16")))
+# kuyruksuz webhook'ta getMe/initialize için en fazla bekleme; aşılırsa 503 (Telegram tekrar dener)
+TELEGRAM_READY_TIMEOUT = max(0.1, float(os.environ.get("TELEGRAM_READY_TIMEOUT", "10")))
+# sohbet başına bot durumu (menü butonu vb.) önbelleği
+CHAT_STATE_CACHE_SIZE = max(1, int(os.environ.get("CHAT_STATE_CACHE_SIZE", "50000")))
+
+WEBHOOK_PATH = (os.environ.get("WEBHOOK_PATH") or "/tg/webhook").strip()
+if not WEBHOOK_PATH.startswith("/"):
+    WEBHOOK_PATH = "/" + WEBHOOK_PATH
+
+ADMIN_OWNER_ID = int(os.environ.get("ADMIN_OWNER_ID", "1375167714"))
+SECRET_ADMIN = (os.environ.get("SECRET_ADMIN") or "").strip()
+# toplu admin işlemleri: tek istekte sıfırlanabilecek kullanıcı sayısı ve import satır boyu sınırı
+ADMIN_BULK_MAX_USERS = max(1, int(os.environ.get("ADMIN_BULK_MAX_USERS", "100000")))
+IMPORT_MAX_LINE = max(1024, int(os.environ.get("IMPORT_MAX_LINE", "65536")))
+# import gövdesi DB bağlantısı alınmadan önce biriktirilir; bu boyuttan sonrası diske taşar
+IMPORT_SPOOL_MEMORY = max(0, int(os.environ.get("IMPORT_SPOOL_MEMORY", str(4 * 1024 * 1024))))
+
+# bellekte tutulan leaderboard boyu; API en fazla 200 satır döndürdüğü için altına inmez
+LEADERBOARD_CACHE_SIZE = max(200, int(os.environ.get("LEADERBOARD_CACHE_SIZE", "200")))
+
+# write-behind: skorlar bellekte birleştirilip toplu upsert ile yazılır
+SCORE_WRITE_BEHIND = _env_flag("SCORE_WRITE_BEHIND")
+SCORE_FLUSH_INTERVAL_MS = max(10, int(os.environ.get("SCORE_FLUSH_INTERVAL_MS", "500")))  # en uzun dayanıklılık penceresi
+SCORE_FLUSH_MAX_BATCH = max(1, int(os.environ.get("SCORE_FLUSH_MAX_BATCH", "500")))
+
+# initData: auth_date'ten sonra geçerli sayılma süresi (sn, 0 = sınırsız) ve doğrulama önbelleği boyu
+INITDATA_MAX_AGE = int(os.environ.get("INITDATA_MAX_AGE", "86400"))
+INITDATA_CACHE_SIZE = max(1, int(os.environ.get("INITDATA_CACHE_SIZE", "10000")))
+
+# geliştirme için: statik dosyalar değişince route tablosu ve asset indeksi yenilenir
+STATIC_HOT_RELOAD = _env_flag("STATIC_HOT_RELOAD")
+STATIC_RELOAD_INTERVAL = max(0.2, float(os.environ.get("STATIC_RELOAD_INTERVAL", "2")))
+# statik dosyalar çalışırken yerinde değiştirilmiyorsa (yeni imaj/atomik rename ile deploy) büyük
+# dosyalar doğrudan eşlenir ve page cache tüm worker'larca paylaşılır; bkz. DEPLOY.md
+STATIC_FILES_IMMUTABLE = _env_flag("STATIC_FILES_IMMUTABLE") and not STATIC_HOT_RELOAD
+
+# webhook kuyruğu: güncellemeler 200 ile hemen onaylanır, worker havuzu arkada işler
+WEBHOOK_QUEUE = _env_flag("WEBHOOK_QUEUE")
+WEBHOOK_WORKERS = max(1, int(os.environ.get("WEBHOOK_WORKERS", "4")))
+WEBHOOK_QUEUE_SIZE = max(1, int(os.environ.get("WEBHOOK_QUEUE_SIZE", "1000")))
+WEBHOOK_QUEUE_FULL = (os.environ.get("WEBHOOK_QUEUE_FULL") or "reject").strip().lower()  # reject (503) | shed
+WEBHOOK_DEDUPE_SIZE = max(1, int(os.environ.get("WEBHOOK_DEDUPE_SIZE", "10000")))
+
+# /metrics için isteğe bağlı Bearer token
+METRICS_TOKEN = (os.environ.get("METRICS_TOKEN") or "").strip()
+
+# sezonlar: reset_all yeni sezon açar; SEASON_RETAIN > 0 ise en son N sezon dışındakiler silinir
+SEASON_RETAIN = max(0, int(os.environ.get("SEASON_RETAIN", "0")))
+SEASON_PRUNE_BATCH = max(100, int(os.environ.get("SEASON_PRUNE_BATCH", "5000")))
+
+# oyun geçmişi: her gönderim bellekte birikir, runs tablosuna COPY ile toplu yazılır
+RUN_HISTORY = _env_flag("RUN_HISTORY", True)
+RUN_FLUSH_INTERVAL_MS = max(50, int(os.environ.get("RUN_FLUSH_INTERVAL_MS", "1000")))
+RUN_FLUSH_MAX_BATCH = max(1, int(os.environ.get("RUN_FLUSH_MAX_BATCH", "5000")))
+RUN_BUFFER_MAX = max(RUN_FLUSH_MAX_BATCH, int(os.environ.get("RUN_BUFFER_MAX", "100000")))  # aşılırsa yeni kayıtlar düşürülür
+RUN_RETAIN_MONTHS = max(0, int(os.environ.get("RUN_RETAIN_MONTHS", "0")))  # 0 = aylık bölümler silinmez
+
+# canlı leaderboard (SSE): ilk LIVE_TOP_N sıra, değişiklikler LIVE_DEBOUNCE_MS içinde birleştirilir
+LIVE_TOP_N = max(1, min(LEADERBOARD_CACHE_SIZE, int(os.environ.get("LIVE_TOP_N", "50"))))
+LIVE_DEBOUNCE_MS = max(0, int(os.environ.get("LIVE_DEBOUNCE_MS", "200")))
+LIVE_QUEUE_SIZE = max(1, int(os.environ.get("LIVE_QUEUE_SIZE", "32")))   # dolan abone düşürülür
+LIVE_MAX_SUBSCRIBERS = max(1, int(os.environ.get("LIVE_MAX_SUBSCRIBERS", "10000")))
+LIVE_HEARTBEAT = max(1.0, float(os.environ.get("LIVE_HEARTBEAT", "15")))
+
+# bağlantı havuzları: yazılar DATABASE_URL'e, okumalar (isteğe bağlı replika) DATABASE_READ_URL'e;
+# DB_READ_* verilmezse DB_* değerleri kullanılır
+DATABASE_READ_URL = (os.environ.get("DATABASE_READ_URL") or "").strip()
+
+def _pool_config(prefix: str, fallback: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    fb = fallback or {}
+    def get(name: str, default: str) -> str:
+        v = (os.environ.get(prefix + name) or "").strip()
+        return v if v else str(fb.get(name, default))
+    return {
+        "POOL_SIZE": max(1, int(get("POOL_SIZE", "5"))),
+        "MAX_OVERFLOW": max(0, int(get("MAX_OVERFLOW", "10"))),
+        "POOL_TIMEOUT": max(0.1, float(get("POOL_TIMEOUT", "30"))),
+        "POOL_RECYCLE": int(get("POOL_RECYCLE", "1800")),   # sn, -1 = kapalı
+        "POOL_PRE_PING": _env_flag(prefix + "POOL_PRE_PING", fb.get("POOL_PRE_PING", True)),
+    }
+
+DB_POOL = _pool_config("DB_")
+DB_READ_POOL = _pool_config("DB_READ_", DB_POOL)
+
+# kullanıcı başına en iyi skor önbelleği: iyileşmeyen gönderimler DB'ye gitmez
+BEST_CACHE_SIZE = max(0, int(os.environ.get("BEST_CACHE_SIZE", "100000")))  # 0 = kapalı
+
+# hız sınırı (token bucket): "saniyedeki_token:kova_boyu", tek sayı = kova boyu da aynı, 0 = kapalı
+def _parse_rate(v: str) -> Tuple[float, float]:
+    rate, _, burst = v.partition(":")
+    r = float(rate)
+    b = float(burst) if burst else r
+    return (max(0.0, r), max(1.0, b))
+
+def _rate_env(name: str, default: str) -> Tuple[float, float]:
+    v = (os.environ.get(name) or "").strip()
+    if v:
+        try:
+            return _parse_rate(v)
+        except ValueError:
+            # sessizce kapatmak yerine varsayılanla devam
+            print(f"WARNING: invalid {name}={v!r} (expected rate:burst), using {default}", file=sys.stderr)
+    return _parse_rate(default)
+
+RATE_LIMIT_SCORE = _rate_env("RATE_LIMIT_SCORE", "1:10")          # doğrulanmış user_id başına
+RATE_LIMIT_SCORE_IP = _rate_env("RATE_LIMIT_SCORE_IP", "20:60")   # doğrulamadan önce, IP başına
+RATE_LIMIT_WEBHOOK = _rate_env("RATE_LIMIT_WEBHOOK", "1:20")      # update gönderen kullanıcı başına
+RATE_LIMIT_MAX_KEYS = max(100, int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000")))
+# X-Forwarded-For yalnızca başlığı yeniden yazan bir proxy arkasında açılmalı (son eleman istemci IP'si);
+# aksi halde istemci başlığı uydurup her istekte yeni bir IP anahtarı alır. Bkz. DEPLOY.md
+TRUST_PROXY_HEADERS = _env_flag("TRUST_PROXY_HEADERS", False)
+
+# admission control: worker başına aynı anda işlenen istek sınırı (0 = kapalı) ve bekleme kuyruğu;
+# DB pool bekleme ortalaması ya da event loop gecikmesi hedefi aşınca kapasite daraltılır
+ADMISSION_CAPACITY = max(0, int(os.environ.get("ADMISSION_CAPACITY", "256")))
+ADMISSION_QUEUE = max(0, int(os.environ.get("ADMISSION_QUEUE", "512")))
+ADMISSION_POOL_WAIT_MS = max(1, int(os.environ.get("ADMISSION_POOL_WAIT_MS", "100")))
+ADMISSION_LOOP_LAG_MS = max(1, int(os.environ.get("ADMISSION_LOOP_LAG_MS", "100")))
+
+# çok worker'lı çalışma: yerel cache'ler Postgres LISTEN/NOTIFY ile senkron tutulur
+WEB_CONCURRENCY = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+CACHE_NOTIFY = _env_flag("CACHE_NOTIFY", WEB_CONCURRENCY > 1)
+CACHE_NOTIFY_CHANNEL = (os.environ.get("CACHE_NOTIFY_CHANNEL") or "kapi_cache").strip()
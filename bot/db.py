@@ -0,0 +1,373 @@
+# bot/db.py
+"""
+Veritabanı erişimi: yazma/okuma havuzları, süre ölçen bağlantı yardımcıları,
+sürümlü migration'lar ve aktif sezon. `engine`, `read_engine` ve `current_season`
+çalışırken yeniden bağlanır; diğer modüller bunları `db.engine` gibi modül üzerinden okur.
+"""
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy import text
+
+from bot.config import DATABASE_URL, DATABASE_READ_URL, DB_POOL, DB_READ_POOL
+from bot.metrics import metrics
+
+# =========================
+# DATABASE
+# =========================
+engine: Optional[AsyncEngine] = None        # yazma (primary)
+read_engine: Optional[AsyncEngine] = None   # okuma; ayrı havuz, replika olabilir
+
+def create_engines() -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    Yazma ve okuma için ayrı havuzlar: /top fırtınası skor yazılarının bağlantılarını
+    tüketemez. Okuma havuzundaki işlemler READ ONLY açılır.
+    """
+    def make(url: str, cfg: Dict[str, Any], **kw) -> AsyncEngine:
+        return create_async_engine(
+            url,
+            pool_size=cfg["POOL_SIZE"],
+            max_overflow=cfg["MAX_OVERFLOW"],
+            pool_timeout=cfg["POOL_TIMEOUT"],
+            pool_recycle=cfg["POOL_RECYCLE"],
+            pool_pre_ping=cfg["POOL_PRE_PING"],
+            **kw,
+        )
+    write = make(DATABASE_URL, DB_POOL)
+    read = make(DATABASE_READ_URL or DATABASE_URL, DB_READ_POOL,
+                execution_options={"postgresql_readonly": True})
+    return write, read
+
+def _pool_gauges() -> List[Tuple[str, Any]]:
+    g: List[Tuple[str, Any]] = []
+    for label, eng in (("write", engine), ("read", read_engine)):
+        pool = getattr(eng, "pool", None)
+        if pool is not None and hasattr(pool, "checkedout"):
+            lab = f'{{pool="{label}"}}'
+            g += [
+                ("kapi_db_pool_size" + lab, pool.size()),
+                ("kapi_db_pool_checked_out" + lab, pool.checkedout()),
+                ("kapi_db_pool_checked_in" + lab, pool.checkedin()),
+                ("kapi_db_pool_overflow" + lab, pool.overflow()),
+            ]
+    return g
+
+metrics.gauges.append(_pool_gauges)
+
+@asynccontextmanager
+async def db_begin():
+    """engine.begin() ile aynı; havuzdan bağlantı alma süresini metriklere yazar."""
+    t0 = time.perf_counter()
+    async with engine.begin() as conn:
+        metrics.pool_wait.observe(time.perf_counter() - t0)
+        yield conn
+
+@asynccontextmanager
+async def db_connect():
+    t0 = time.perf_counter()
+    async with engine.connect() as conn:
+        metrics.pool_wait.observe(time.perf_counter() - t0)
+        yield conn
+
+@asynccontextmanager
+async def db_read(fresh: bool = False):
+    """
+    Okuma havuzundan salt okunur bağlantı. fresh=True: replika gecikmesini kaldıramayan
+    okumalar (ör. cache yüklemesi) replika tanımlıysa primary'den, yine READ ONLY yapılır.
+    """
+    t0 = time.perf_counter()
+    if fresh and DATABASE_READ_URL:
+        async with engine.connect() as conn:
+            metrics.read_pool_wait.observe(time.perf_counter() - t0)
+            await conn.execution_options(postgresql_readonly=True)
+            yield conn
+        return
+    async with read_engine.connect() as conn:
+        metrics.read_pool_wait.observe(time.perf_counter() - t0)
+        yield conn
+
+async def sql(conn, name: str, stmt, params: Optional[Dict[str, Any]] = None):
+    """conn.execute + statement adına göre süre ölçümü."""
+    t0 = time.perf_counter()
+    try:
+        return await conn.execute(stmt, params)
+    finally:
+        metrics.sql[name].observe(time.perf_counter() - t0)
+
+# pg_advisory_lock anahtarı; tek seferlik başlangıç işlerini worker'lar arasında sıraya sokar
+STARTUP_LOCK_KEY = 0x4B415049
+
+async def run_startup_once(fn) -> bool:
+    """
+    `fn`i worker'lar arası advisory lock altında çalıştırır: aynı anda açılanlardan ilki
+    çalıştırırken diğerleri bekler. Bekleyenler kilidi alınca `fn`i yine çalıştırır;
+    `fn` idempotent olmalıdır (tamamlanmış işi kendisi atlar). Böylece kilit sahibinin
+    işi yarıda kaldıysa sonraki worker yarım şemayla açılmaz, işi tamamlar ya da hata verir.
+    True: kilidi ilk bu worker aldı.
+    """
+    assert engine is not None
+    async with db_connect() as conn:
+        got = bool((await conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": STARTUP_LOCK_KEY})).scalar())
+        if not got:
+            await conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": STARTUP_LOCK_KEY})
+        try:
+            await fn()
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": STARTUP_LOCK_KEY})
+            await conn.commit()
+    return got
+
+async def ensure_schema(conn) -> None:
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS scores (
+            user_id BIGINT PRIMARY KEY
+        );
+    """))
+    await conn.execute(text("""
+        ALTER TABLE scores
+          ADD COLUMN IF NOT EXISTS username   TEXT,
+          ADD COLUMN IF NOT EXISTS best_score INTEGER NOT NULL DEFAULT 0,
+          ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+          ADD COLUMN IF NOT EXISTS season     INTEGER NOT NULL DEFAULT 1;
+    """))
+    await ensure_seasons(conn)
+    await ensure_score_hist(conn)
+    await ensure_runs(conn)
+
+async def ensure_seasons(conn) -> None:
+    """
+    Skorlar sezona bağlıdır: scores'un anahtarı (season, user_id). "reset_all"
+    tabloyu güncellemek yerine yeni bir sezon başlatır; eski sezonlar geçmiş
+    olarak kalır ve prune_old_seasons ile parça parça silinebilir.
+    """
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS seasons (
+            id         INTEGER PRIMARY KEY,
+            started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            ended_at   TIMESTAMPTZ
+        );
+    """))
+    await conn.execute(text("INSERT INTO seasons (id) VALUES (1) ON CONFLICT (id) DO NOTHING;"))
+    pk_has_season = (await conn.execute(text("""
+        SELECT count(*) FROM information_schema.key_column_usage
+        WHERE table_name = 'scores' AND constraint_name = 'scores_pkey' AND column_name = 'season'
+    """))).scalar()
+    if not pk_has_season:
+        # tek seferlik: eski (user_id) anahtarı (season, user_id) olur
+        await conn.execute(text("""
+            ALTER TABLE scores
+              DROP CONSTRAINT IF EXISTS scores_pkey,
+              ADD CONSTRAINT scores_pkey PRIMARY KEY (season, user_id);
+        """))
+    await conn.execute(text("DROP INDEX IF EXISTS idx_scores_best;"))
+    await ensure_score_rank_index(conn)
+
+async def ensure_score_rank_index(conn) -> None:
+    # sıralama anahtarının tamamı: eşit skorlu gruplar da sıralı okunur (sort/tam tarama yok)
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_scores_season_rank
+        ON scores (season, best_score DESC, updated_at, user_id);
+    """))
+    await conn.execute(text("DROP INDEX IF EXISTS idx_scores_season_best;"))
+
+async def ensure_score_hist(conn) -> None:
+    """
+    score_hist: her sezonda her best_score değerinde kaç oyuncu olduğu. scores
+    üzerindeki statement seviyesinde trigger'larla güncel tutulur; sıralama (rank)
+    sorgusu satırları saymak yerine bu küçük tabloyu toplar.
+    """
+    exists = (await conn.execute(text("""
+        SELECT count(*) FROM information_schema.columns
+        WHERE table_name = 'score_hist' AND column_name = 'season'
+    """))).scalar()
+    if not exists:
+        await conn.execute(text("DROP TABLE IF EXISTS score_hist;"))
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS score_hist (
+            season     INTEGER NOT NULL,
+            best_score INTEGER NOT NULL,
+            n          BIGINT  NOT NULL DEFAULT 0,
+            PRIMARY KEY (season, best_score)
+        );
+    """))
+    # satırlar her zaman (season, best_score) sırasıyla kilitlenir, eşzamanlı upsert'ler kilitlenmez
+    await conn.execute(text("""
+        CREATE OR REPLACE FUNCTION score_hist_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO score_hist (season, best_score, n)
+                SELECT season, best_score, count(*) FROM new_rows
+                GROUP BY season, best_score ORDER BY season, best_score
+                ON CONFLICT (season, best_score) DO UPDATE SET n = score_hist.n + EXCLUDED.n;
+            ELSIF TG_OP = 'UPDATE' THEN
+                INSERT INTO score_hist (season, best_score, n)
+                SELECT season, best_score, sum(d) FROM (
+                    SELECT season, best_score, -1 AS d FROM old_rows
+                    UNION ALL
+                    SELECT season, best_score, 1 AS d FROM new_rows
+                ) x
+                GROUP BY season, best_score HAVING sum(d) <> 0 ORDER BY season, best_score
+                ON CONFLICT (season, best_score) DO UPDATE SET n = score_hist.n + EXCLUDED.n;
+            ELSE
+                INSERT INTO score_hist (season, best_score, n)
+                SELECT season, best_score, -count(*) FROM old_rows
+                GROUP BY season, best_score ORDER BY season, best_score
+                ON CONFLICT (season, best_score) DO UPDATE SET n = score_hist.n + EXCLUDED.n;
+            END IF;
+            RETURN NULL;
+        END $$;
+    """))
+    # CREATE OR REPLACE TRIGGER PG 14 ister; DROP + CREATE aynı transaction'da eski sürümlerde de çalışır
+    await conn.execute(text("DROP TRIGGER IF EXISTS trg_score_hist_ins ON scores;"))
+    await conn.execute(text("""
+        CREATE TRIGGER trg_score_hist_ins AFTER INSERT ON scores
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION score_hist_apply();
+    """))
+    await conn.execute(text("DROP TRIGGER IF EXISTS trg_score_hist_upd ON scores;"))
+    await conn.execute(text("""
+        CREATE TRIGGER trg_score_hist_upd AFTER UPDATE ON scores
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION score_hist_apply();
+    """))
+    await conn.execute(text("DROP TRIGGER IF EXISTS trg_score_hist_del ON scores;"))
+    await conn.execute(text("""
+        CREATE TRIGGER trg_score_hist_del AFTER DELETE ON scores
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION score_hist_apply();
+    """))
+    if not exists:
+        # ilk kurulum: mevcut satırlardan doldur (bu sırada yazılar beklesin)
+        await conn.execute(text("LOCK TABLE scores IN SHARE ROW EXCLUSIVE MODE"))
+        await conn.execute(text("""
+            INSERT INTO score_hist (season, best_score, n)
+            SELECT season, best_score, count(*) FROM scores GROUP BY season, best_score
+            ON CONFLICT (season, best_score) DO UPDATE SET n = EXCLUDED.n;
+        """))
+
+async def ensure_runs(conn) -> None:
+    """
+    runs: her oyunun ham kaydı, played_at'e göre aylık bölümlenir (eski aylar DROP ile
+    gider). user_stats / daily_stats flush sırasında partideki toplamlarla artırılır;
+    user_days günlük aktif oyuncuyu saymak için (gün, oyuncu) çiftlerini tutar.
+    """
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS runs (
+            played_at TIMESTAMPTZ NOT NULL,
+            user_id   BIGINT      NOT NULL,
+            season    INTEGER     NOT NULL,
+            score     INTEGER     NOT NULL
+        ) PARTITION BY RANGE (played_at);
+    """))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS idx_runs_user ON runs (user_id, played_at)"))
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            season      INTEGER NOT NULL,
+            user_id     BIGINT  NOT NULL,
+            runs        BIGINT  NOT NULL DEFAULT 0,
+            total       BIGINT  NOT NULL DEFAULT 0,
+            last_played TIMESTAMPTZ,
+            PRIMARY KEY (season, user_id)
+        );
+    """))
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS user_days (
+            day     DATE   NOT NULL,
+            user_id BIGINT NOT NULL,
+            PRIMARY KEY (day, user_id)
+        );
+    """))
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day     DATE   PRIMARY KEY,
+            players BIGINT NOT NULL DEFAULT 0,
+            runs    BIGINT NOT NULL DEFAULT 0,
+            total   BIGINT NOT NULL DEFAULT 0
+        );
+    """))
+
+async def ensure_chat_state(conn) -> None:
+    """chat_state: sohbet başına Bot API'de en son ayarlanan durum (bkz. ChatStateCache)."""
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS chat_state (
+            chat_id          BIGINT PRIMARY KEY,
+            menu_url         TEXT,
+            menu_text        TEXT,
+            kb_version       TEXT,
+            web_app_fallback BOOLEAN NOT NULL DEFAULT false,
+            updated_at       TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """))
+
+async def ensure_asset_manifests(conn) -> None:
+    # üretilen offline.json sürümleri; deploy'lar arası dosya farkı için
+    await conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS asset_manifests (
+            version    TEXT PRIMARY KEY,
+            files      JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """))
+
+async def ensure_score_reset_at(conn) -> None:
+    # admin reset zamanı: reset'ten önce alınmış, geç commit edilen yazılar bu satırı geri yükseltemez
+    await conn.execute(text("ALTER TABLE scores ADD COLUMN IF NOT EXISTS reset_at TIMESTAMPTZ;"))
+
+# sıralı şema sürümleri; yeni değişiklik = listeye yeni (sürüm, fonksiyon) eklemek.
+# 1: ensure_schema'nın tamamı (idempotent, eski kurulumları da yakalar), 2: chat_state, 3: asset_manifests,
+# 4: scores.reset_at, 5: (season, best_score, updated_at, user_id) sıralama indeksi
+MIGRATIONS: List[Tuple[int, Callable[[Any], Any]]] = [
+    (1, ensure_schema),
+    (2, ensure_chat_state),
+    (3, ensure_asset_manifests),
+    (4, ensure_score_reset_at),
+    (5, ensure_score_rank_index),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+async def schema_version() -> int:
+    try:
+        async with db_connect() as conn:
+            return int((await conn.execute(text("SELECT max(version) FROM schema_version"))).scalar() or 0)
+    except Exception:
+        return 0   # tablo henüz yok
+
+async def _apply_migrations() -> None:
+    async with db_begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version    INTEGER PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """))
+        cur = int((await conn.execute(text("SELECT COALESCE(max(version), 0) FROM schema_version"))).scalar() or 0)
+        for version, fn in MIGRATIONS:
+            if version <= cur:
+                continue
+            await fn(conn)
+            await conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+            print(f"schema migrated to v{version}", file=sys.stderr)
+
+async def migrate() -> None:
+    """Güncel şemada tek bir SELECT; aksi halde migration'lar kilit altında tek worker'da çalışır."""
+    assert engine is not None
+    if await schema_version() >= SCHEMA_VERSION:
+        return
+    await run_startup_once(_apply_migrations)
+
+# =========================
+# SEASON STATE
+# =========================
+# aktif sezon; sezon açan/değiştiren kod `db.current_season`a yazar
+current_season = 1
+
+async def load_current_season() -> int:
+    global current_season
+    assert engine is not None
+    async with db_connect() as conn:
+        current_season = int((await conn.execute(text("SELECT max(id) FROM seasons"))).scalar() or 1)
+    return current_season
@@ -1,19 +1,28 @@
 ﻿# bot/main.py
+import io
 import os
 import sys
+import csv
 import json
+import base64
 import hmac
+import asyncio
 import hashlib
-from typing import Any, Dict, Optional
-from urllib.parse import parse_qs, parse_qsl, unquote_plus
+import math
+import functools
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
 
 from fastapi import FastAPI, Request, HTTPException, status, Header
-from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.engine import make_url
 from sqlalchemy import text
+import psycopg
 
 from telegram import (
     Update,
@@ -22,43 +31,61 @@ from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
+from telegram.error import BadRequest
 from telegram.ext import Application, CommandHandler, ContextTypes
 
-# =========================
-# ENV
-# =========================
-TELEGRAM_BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
-DATABASE_URL = (os.environ.get("DATABASE_URL") or "").strip()
-SECRET = (os.environ.get("SECRET") or "").strip()  # optional legacy HMAC
-PUBLIC_GAME_URL = (os.environ.get("PUBLIC_GAME_URL") or "/").strip()
-GAME_SHORT_NAME = (os.environ.get("GAME_SHORT_NAME") or "kapi_run").strip()
-
-WEBHOOK_PATH = (os.environ.get("WEBHOOK_PATH") or "/tg/webhook").strip()
-if not WEBHOOK_PATH.startswith("/"):
-    WEBHOOK_PATH = "/" + WEBHOOK_PATH
-
-ADMIN_OWNER_ID = int(os.environ.get("ADMIN_OWNER_ID", "1375167714"))
-SECRET_ADMIN = (os.environ.get("SECRET_ADMIN") or "").strip()
+from bot.config import (
+    TELEGRAM_BOT_TOKEN, DATABASE_URL, SECRET, PUBLIC_GAME_URL, TELEGRAM_BASE_URL,
+    TELEGRAM_POOL_SIZE, TELEGRAM_READY_TIMEOUT, CHAT_STATE_CACHE_SIZE, WEBHOOK_PATH, ADMIN_OWNER_ID,
+    SECRET_ADMIN, ADMIN_BULK_MAX_USERS, SCORE_WRITE_BEHIND, INITDATA_MAX_AGE, INITDATA_CACHE_SIZE,
+    STATIC_HOT_RELOAD, STATIC_RELOAD_INTERVAL, WEBHOOK_QUEUE, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_QUEUE_FULL, WEBHOOK_DEDUPE_SIZE, METRICS_TOKEN, SEASON_RETAIN, SEASON_PRUNE_BATCH,
+    RUN_HISTORY, LIVE_TOP_N, LIVE_DEBOUNCE_MS, LIVE_QUEUE_SIZE, LIVE_MAX_SUBSCRIBERS,
+    LIVE_HEARTBEAT, RATE_LIMIT_SCORE, RATE_LIMIT_SCORE_IP, RATE_LIMIT_WEBHOOK, RATE_LIMIT_MAX_KEYS,
+    TRUST_PROXY_HEADERS, CACHE_NOTIFY, CACHE_NOTIFY_CHANNEL,
+)
+from bot.assets import NoStoreForStatic, asset_index, StaticAssetMiddleware, static_routes
+from bot.metrics import metrics, MetricsMiddleware
+from bot.admission import admission, AdmissionMiddleware
+from bot import db
+from bot.db import create_engines, db_begin, db_connect, db_read, sql, migrate, load_current_season
+from bot.scores import (
+    LeaderboardCache, leaderboard_cache, best_cache, score_buffer, run_log, ScoreImportParser,
+    spool_import, merge_import,
+)
 
 # =========================
 # FASTAPI
 # =========================
 app = FastAPI(title="KAPI RUN - Bot & API")
+app.add_middleware(NoStoreForStatic)
+app.add_middleware(StaticAssetMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# =========================
+# METRICS
+# =========================
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=403, detail="forbidden")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-class NoStoreForStatic(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        p = request.url.path or ""
-        if p.startswith(("/images", "/scripts", "/media", "/icons")) or p in (
-            "/style.css", "/data.json", "/appmanifest.json", "/manifest.json",
-            "/sw.js", "/offline.json", "/index.html", "/webapp-check.html"
-        ):
-            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-        return response
+def _app_gauges() -> List[Tuple[str, Any]]:
+    q = webhook_queue.stats()
+    return [
+        ("kapi_webhook_queue_depth", q["depth"]),
+        ("kapi_webhook_queue_lag_seconds", q["last_lag_ms"] / 1000.0),
+        ("kapi_initdata_cache_entries", len(initdata_verifier._cache)),
+        ("kapi_static_assets", len(asset_index.assets)),
+        ("kapi_live_subscribers", len(live_board._subs)),
+        ("kapi_live_dropped", live_board.dropped),
+        *((f'kapi_rate_limited{{limiter="{rl.name}"}}', rl.limited) for rl in rate_limiters),
+        *((f'kapi_rate_limit_buckets{{limiter="{rl.name}"}}', len(rl._buckets)) for rl in rate_limiters),
+    ]
 
-app.add_middleware(NoStoreForStatic)
+metrics.gauges.append(_app_gauges)
 
 if os.path.isdir("images"):
     app.mount("/images", StaticFiles(directory="images"), name="images")
@@ -69,43 +96,52 @@ if os.path.isdir("media"):
 if os.path.isdir("icons"):
     app.mount("/icons", StaticFiles(directory="icons"), name="icons")
 
+# hazır olma durumu: /health canlılık (her zaman 200), /ready yalnızca ısınınca 200
+readiness: Dict[str, bool] = {"database": False, "assets": False, "telegram": False}
+
 @app.get("/health")
 async def health() -> Dict[str, Any]:
-    return {"ok": True}
+    return {"ok": True, "ready": all(readiness.values())}
+
+@app.get("/ready")
+async def ready():
+    ok = all(readiness.values())
+    return JSONResponse({"ready": ok, **readiness}, status_code=200 if ok else 503)
 
 @app.get("/__routes")
 async def list_routes():
     return [{"path": r.path, "methods": list(getattr(r, "methods", []))} for r in app.routes]
 
-def _first_existing(filename: str, fallback: bool = True):
-    import os
-    p1 = os.path.join(os.getcwd(), filename)
-    if os.path.isfile(p1):
-        return p1
-    if fallback:
-        base = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-        p2 = os.path.join(base, filename)
-        if os.path.isfile(p2):
-            return p2
-    return None
+async def _static_reload_loop() -> None:
+    # STATIC_HOT_RELOAD: dosya değişikliklerini mtime ile yakala, indeksi yerinde güncelle
+    while True:
+        await asyncio.sleep(STATIC_RELOAD_INTERVAL)
+        try:
+            static_routes.resolve()
+            if await asyncio.to_thread(asset_index.refresh):
+                print("static assets reloaded", file=sys.stderr)
+                await record_manifest()
+                await cache_bus.publish("assets")
+        except Exception as e:
+            print("static reload error:", e, file=sys.stderr)
 
 @app.get("/")
 async def serve_index():
-    p = _first_existing("index.html")
+    p = static_routes.get("index.html")
     if p:
         return FileResponse(p, media_type="text/html")
     return JSONResponse({"ok": True, "hint": "index.html not found"}, status_code=200)
 
 @app.get("/style.css")
 async def serve_style_css():
-    p = _first_existing("style.css")
+    p = static_routes.get("style.css")
     if p:
         return FileResponse(p, media_type="text/css")
     raise HTTPException(status_code=404, detail="style.css not found")
 
 @app.get("/data.json")
 async def serve_data_json():
-    p = _first_existing("data.json")
+    p = static_routes.get("data.json")
     if not p:
         raise HTTPException(status_code=404, detail="data.json not found")
     return FileResponse(
@@ -120,74 +156,467 @@ async def serve_data_json():
 
 @app.get("/appmanifest.json")
 async def serve_appmanifest_json():
-    p = _first_existing("appmanifest.json")
+    p = static_routes.get("appmanifest.json")
     if p:
         return FileResponse(p, media_type="application/manifest+json")
     raise HTTPException(status_code=404, detail="appmanifest.json not found")
 
 @app.get("/manifest.json")
 async def serve_manifest_json():
-    p = _first_existing("manifest.json")
+    p = static_routes.get("manifest.json")
     if p:
         return FileResponse(p, media_type="application/manifest+json")
     raise HTTPException(status_code=404, detail="manifest.json not found")
 
 @app.get("/sw.js")
 async def serve_service_worker():
-    p = _first_existing("sw.js")
+    p = static_routes.get("sw.js")
     if p:
         return FileResponse(p, media_type="application/javascript")
     raise HTTPException(status_code=404, detail="sw.js not found")
 
 @app.get("/offline.json")
 async def serve_offline_json():
-    p = _first_existing("offline.json")
+    # normalde StaticAssetMiddleware üretilmiş manifesti bellekten verir; bu yalnızca yedek yol
+    headers = {
+        "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+        "Pragma": "no-cache",
+        "Expires": "0",
+    }
+    a = asset_index.assets.get("/offline.json")
+    if a is not None:
+        return Response(a.bodies["identity"], media_type="application/json", headers=headers)
+    p = static_routes.get("offline.json")
     if not p:
         raise HTTPException(status_code=404, detail="offline.json not found")
-    return FileResponse(
-        p,
-        media_type="application/json",
-        headers={
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-            "Expires": "0",
-        },
-    )
+    return FileResponse(p, media_type="application/json", headers=headers)
+
+async def record_manifest(after: Optional[asyncio.Task] = None) -> None:
+    """Güncel manifesti asset_manifests'e yazar; deploy sonrası eski sürümden fark hesaplanabilsin."""
+    if after is not None:
+        await asyncio.shield(after)
+    version = asset_index.version
+    if db.engine is None or version is None:
+        return
+    try:
+        async with db_begin() as conn:
+            await sql(conn, "manifest_insert", text("""
+                INSERT INTO asset_manifests (version, files) VALUES (:v, CAST(:f AS JSONB))
+                ON CONFLICT (version) DO NOTHING
+            """), {"v": version, "f": json.dumps(asset_index.manifests[version])})
+    except Exception as e:
+        print("manifest record error:", e, file=sys.stderr)
+
+async def _load_manifest(version: str) -> Optional[Dict[str, str]]:
+    files = asset_index.manifests.get(version)
+    if files is not None or db.engine is None:
+        return files
+    async with db_read() as conn:
+        res = await sql(conn, "manifest_select", text(
+            "SELECT files FROM asset_manifests WHERE version = :v"
+        ), {"v": version})
+        files = res.scalar()
+    if isinstance(files, str):
+        files = json.loads(files)
+    return files
+
+@app.get("/offline/changes")
+async def offline_changes(request: Request):
+    """
+    İki manifest sürümü arasında içeriği değişen dosyalar. sw.js yeni sürümü kurarken
+    `unchanged` dosyaları eski cache'ten kopyalar, yalnızca `changed` olanları indirir.
+    Eski sürüm bilinmiyorsa full=true döner (hepsini indir).
+    """
+    src = request.query_params.get("from") or ""
+    dst = request.query_params.get("to") or asset_index.version or ""
+    new = await _load_manifest(dst) if dst else None
+    if new is None:
+        raise HTTPException(status_code=404, detail="unknown version")
+    old = await _load_manifest(src) if src else None
+    if old is None:
+        return {"from": src, "to": dst, "full": True, "changed": list(new), "unchanged": [], "removed": []}
+    return {
+        "from": src,
+        "to": dst,
+        "full": False,
+        "changed": [f for f, h in new.items() if old.get(f) != h],
+        "unchanged": [f for f, h in new.items() if old.get(f) == h],
+        "removed": [f for f in old if f not in new],
+    }
 
 @app.get("/webapp-check.html")
 async def serve_webapp_check_html():
-    p = _first_existing("webapp-check.html")
+    p = static_routes.get("webapp-check.html")
     if p:
         return FileResponse(p, media_type="text/html")
     raise HTTPException(status_code=404, detail="webapp-check.html not found")
 
 # =========================
-# DATABASE
+# SEASONS
 # =========================
-engine: Optional[AsyncEngine] = None
-
-async def ensure_schema() -> None:
-    assert engine is not None
-    async with engine.begin() as conn:
-        await conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS scores (
-                user_id BIGINT PRIMARY KEY
-            );
-        """))
-        await conn.execute(text("""
-            ALTER TABLE scores
-              ADD COLUMN IF NOT EXISTS username   TEXT,
-              ADD COLUMN IF NOT EXISTS best_score INTEGER NOT NULL DEFAULT 0,
-              ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
-        """))
-        await conn.execute(text("""
-            CREATE INDEX IF NOT EXISTS idx_scores_best ON scores (best_score DESC);
+async def start_new_season() -> int:
+    """Yeni sezonu açar; yalnızca seasons'a bir satır yazar, scores'a dokunmaz."""
+    assert db.engine is not None
+    async with db_begin() as conn:
+        await conn.execute(text("LOCK TABLE seasons IN EXCLUSIVE MODE"))
+        await conn.execute(text("UPDATE seasons SET ended_at = now() WHERE ended_at IS NULL"))
+        res = await sql(conn, "new_season", text("""
+            INSERT INTO seasons (id) SELECT COALESCE(max(id), 0) + 1 FROM seasons
+            RETURNING id
         """))
+        db.current_season = int(res.scalar())
+    score_buffer.discard()
+    best_cache.discard()
+    leaderboard_cache.invalidate()
+    await cache_bus.publish("season", season=db.current_season)
+    if SEASON_RETAIN > 0:
+        schedule_season_prune(db.current_season - SEASON_RETAIN + 1)
+    return db.current_season
+
+season_prune_task: Optional[asyncio.Task] = None
+
+async def prune_old_seasons(before: int) -> int:
+    """`before`dan eski sezonların skorlarını SEASON_PRUNE_BATCH'lik parçalarla siler."""
+    assert db.engine is not None
+    total = 0
+    while True:
+        async with db_begin() as conn:
+            res = await sql(conn, "season_prune", text("""
+                DELETE FROM scores WHERE ctid IN (
+                    SELECT ctid FROM scores WHERE season < :before LIMIT :n
+                )
+            """), {"before": before, "n": SEASON_PRUNE_BATCH})
+            deleted = res.rowcount or 0
+        total += deleted
+        if deleted < SEASON_PRUNE_BATCH:
+            break
+        await asyncio.sleep(0)   # diğer isteklere sıra ver
+    async with db_begin() as conn:
+        await conn.execute(text("DELETE FROM score_hist WHERE season < :before"), {"before": before})
+        await conn.execute(text("DELETE FROM user_stats WHERE season < :before"), {"before": before})
+    return total
+
+def schedule_season_prune(before: int) -> None:
+    global season_prune_task
+    if before <= 0 or (season_prune_task is not None and not season_prune_task.done()):
+        return
+
+    async def run():
+        try:
+            n = await prune_old_seasons(before)
+            print(f"pruned {n} score rows from seasons < {before}", file=sys.stderr)
+        except Exception as e:
+            print("season prune error:", e, file=sys.stderr)
+
+    season_prune_task = asyncio.create_task(run())
+
+# =========================
+# LEADERBOARD RENDER
+# =========================
+def _json_default(o: Any) -> Any:
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError(f"not JSON serializable: {type(o).__name__}")
+
+TOP_TEXT_MAX = 3500   # Telegram mesaj sınırının altında kal
+
+class LeaderboardRenderer:
+    """
+    Cache'in sürümü değişmedikçe /api/leaderboard gövdesini (limit başına JSON baytları +
+    içerik hash'inden ETag) ve /top metnini yeniden üretmez. ETag içerikten türediği için
+    worker'lar arasında da tutarlıdır.
+    """
+
+    def __init__(self, cache: LeaderboardCache):
+        self.cache = cache
+        self._json: Dict[int, Tuple[int, bytes, str]] = {}
+        self._text: Tuple[int, Optional[str]] = (-1, None)
+
+    def json(self, limit: int) -> Tuple[bytes, str]:
+        v = self.cache.version
+        hit = self._json.get(limit)
+        if hit is not None and hit[0] == v:
+            return hit[1], hit[2]
+        body = json.dumps(
+            self.cache.top(limit), default=_json_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        etag = '"lb-' + hashlib.blake2b(body, digest_size=10).hexdigest() + '"'
+        self._json[limit] = (v, body, etag)
+        return body, etag
+
+    def top_text(self) -> Optional[str]:
+        v = self.cache.version
+        if self._text[0] == v:
+            return self._text[1]
+        rows = self.cache.top(200)
+        text_ = None
+        if rows:
+            lines = []
+            size = -1
+            for i, r in enumerate(rows, 1):
+                line = f"{i}. @{_fmt_user(r['username'], r['user_id'])} - {r['best_score']}"
+                lines.append(line)
+                size += len(line) + 1
+                if size > TOP_TEXT_MAX:
+                    lines.append("...")
+                    break
+            text_ = "🏆 Global Leaderboard\n" + "\n".join(lines)
+        self._text = (v, text_)
+        return text_
+
+def _if_none_match(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+leaderboard_render = LeaderboardRenderer(leaderboard_cache)
+
+# =========================
+# LIVE LEADERBOARD (SSE)
+# =========================
+def _sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n".encode("utf-8")
+
+class _Subscriber:
+    __slots__ = ("buf", "wake", "closed")
+
+    def __init__(self):
+        self.buf: deque = deque()
+        self.wake = asyncio.Event()
+        self.closed = False
+
+class LiveLeaderboard:
+    """
+    İlk LIVE_TOP_N sıranın tek bir anlık görüntüsü. Cache değiştiğinde (debounce ile)
+    yalnızca bir kez fark hesaplanır ve tek bir SSE mesajı olarak serileştirilir;
+    aynı bayt dizisi tüm abonelerin kuyruğuna eklenir. Kuyruğu LIVE_QUEUE_SIZE'a
+    ulaşan yavaş abone düşürülür (istemci yeniden bağlanıp snapshot alır).
+    Mesajlar:
+      snapshot {"v": N, "rows": [{rank, user_id, username, best_score}, ...]}
+      diff     {"v": N, "set": [{rank, user_id, username, best_score}, ...], "del": [user_id, ...]}
+    `v` ardışıktır; boşluk gören istemci yeniden bağlanmalıdır.
+    """
+
+    def __init__(self, n: int, queue_size: int, max_subscribers: int, debounce_ms: int):
+        self.n = n
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.debounce = debounce_ms / 1000.0
+        self.version = 0
+        self.dropped = 0
+        self._subs: set = set()
+        self._snap: List[Tuple[int, Optional[str], int]] = []
+        self._snap_msg: Optional[bytes] = None
+        self._current = False     # _snap cache ile senkron mu
+        self._dirty = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self) -> None:
+        self._current = False
+        if self._subs:
+            self._dirty.set()
+
+    @staticmethod
+    def _entry(rank: int, e: Tuple[int, Optional[str], int]) -> Dict[str, Any]:
+        return {"rank": rank, "user_id": e[0], "username": e[1], "best_score": e[2]}
+
+    def _snapshot_msg(self) -> bytes:
+        if self._snap_msg is None:
+            rows = [self._entry(i + 1, e) for i, e in enumerate(self._snap)]
+            self._snap_msg = _sse("snapshot", {"v": self.version, "rows": rows})
+        return self._snap_msg
+
+    async def _refresh(self) -> None:
+        async with self._lock:
+            if self._current:
+                return
+            self._current = True
+            await leaderboard_cache.ensure_loaded()
+            new = [(r["user_id"], r["username"], r["best_score"]) for r in leaderboard_cache.top(self.n)]
+            old = self._snap
+            if new == old:
+                return
+            old_pos = {e[0]: (i, e) for i, e in enumerate(old)}
+            changed = [self._entry(i + 1, e) for i, e in enumerate(new) if old_pos.get(e[0]) != (i, e)]
+            new_ids = {e[0] for e in new}
+            removed = [uid for uid in old_pos if uid not in new_ids]
+            self.version += 1
+            self._snap = new
+            self._snap_msg = None
+            if len(changed) > self.n // 2:
+                # sezon değişimi gibi büyük farklarda tam liste daha kısa
+                msg = self._snapshot_msg()
+            else:
+                msg = _sse("diff", {"v": self.version, "set": changed, "del": removed})
+            self._broadcast(msg)
+
+    def _broadcast(self, msg: bytes) -> None:
+        for sub in list(self._subs):
+            if len(sub.buf) >= self.queue_size:
+                self._drop(sub)
+                continue
+            sub.buf.append(msg)
+            sub.wake.set()
+
+    def _drop(self, sub: _Subscriber) -> None:
+        self._subs.discard(sub)
+        sub.closed = True
+        sub.buf.clear()
+        sub.wake.set()
+        self.dropped += 1
+
+    async def _run(self) -> None:
+        while True:
+            await self._dirty.wait()
+            if self.debounce:
+                await asyncio.sleep(self.debounce)
+            self._dirty.clear()
+            try:
+                await self._refresh()
+            except Exception as e:
+                self._current = False
+                print("live leaderboard error:", e, file=sys.stderr)
+                await asyncio.sleep(1)
+
+    async def subscribe(self) -> Optional[_Subscriber]:
+        if len(self._subs) >= self.max_subscribers:
+            return None
+        await self._refresh()
+        sub = _Subscriber()
+        sub.buf.append(self._snapshot_msg())
+        self._subs.add(sub)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        self._subs.discard(sub)
+
+    async def stream(self, sub: _Subscriber):
+        try:
+            while True:
+                while sub.buf:
+                    yield sub.buf.popleft()
+                if sub.closed:
+                    return
+                sub.wake.clear()
+                try:
+                    await asyncio.wait_for(sub.wake.wait(), timeout=LIVE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    async def stop(self) -> None:
+        for sub in list(self._subs):
+            sub.closed = True
+            sub.wake.set()
+        self._subs.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+live_board = LiveLeaderboard(LIVE_TOP_N, LIVE_QUEUE_SIZE, LIVE_MAX_SUBSCRIBERS, LIVE_DEBOUNCE_MS)
+leaderboard_cache.listeners.append(live_board.touch)
+
+# =========================
+# RANKS
+# =========================
+RANK_AROUND_MAX = 50
+# sıralamadaki ilk satırdan önceki sanal anahtar (best_score, updated_at, user_id)
+LB_FIRST_KEY = (2**31 - 1, datetime.min, 0)
+
+async def _rows_after(conn, season: int, score: int, updated_at: datetime, user_id: int, n: int) -> List[Dict[str, Any]]:
+    """(best_score DESC, updated_at ASC, user_id) sırasında verilen anahtardan sonraki n satır."""
+    res = await sql(conn, "leaderboard_page", text("""
+        SELECT * FROM (
+            (SELECT user_id, username, best_score, updated_at FROM scores
+             WHERE season = :season AND best_score = :s AND (updated_at, user_id) > (:t, :uid)
+             ORDER BY updated_at ASC, user_id ASC LIMIT :n)
+            UNION ALL
+            (SELECT user_id, username, best_score, updated_at FROM scores
+             WHERE season = :season AND best_score < :s
+             ORDER BY best_score DESC, updated_at ASC, user_id ASC LIMIT :n)
+        ) b
+        ORDER BY best_score DESC, updated_at ASC, user_id ASC LIMIT :n
+    """), {"season": season, "s": score, "t": updated_at, "uid": user_id, "n": n})
+    return [dict(r._mapping) for r in res]
+
+async def rank_lookup(user_id: int, around: int = 0, season: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Kullanıcının sırası ve istenirse üstündeki/altındaki `around` oyuncu.
+    Sıra = 1 + score_hist'te daha yüksek skorlu oyuncu sayısı + aynı skorda daha
+    önce ulaşanlar. Eşitlerin sayımı ve pencere idx_scores_season_rank üzerinde
+    anahtardan itibaren iki yönlü LIMIT'li index taramasıdır.
+    """
+    assert db.engine is not None
+    around = max(0, min(RANK_AROUND_MAX, around))
+    if season is None:
+        season = db.current_season
+    async with db_read() as conn:
+        res = await sql(conn, "rank_user", text("""
+            SELECT user_id, username, best_score, updated_at
+            FROM scores WHERE season = :season AND user_id = :uid
+        """), {"season": season, "uid": user_id})
+        me = res.one_or_none()
+        if me is None:
+            return None
+        me = dict(me._mapping)
+        p = {"season": season, "uid": user_id, "s": me["best_score"], "t": me["updated_at"], "n": around}
+        rank = leaderboard_cache.rank_of(user_id) if season == leaderboard_cache.season else None
+        if rank is None:
+            res = await sql(conn, "rank_count", text("""
+                SELECT 1
+                  + COALESCE((SELECT sum(n) FROM score_hist WHERE season = :season AND best_score > :s), 0)
+                  + (SELECT count(*) FROM scores
+                     WHERE season = :season AND best_score = :s AND (updated_at, user_id) < (:t, :uid))
+            """), p)
+            rank = int(res.scalar())
+        total = int((await sql(
+            conn, "rank_total", text("SELECT COALESCE(sum(n), 0) FROM score_hist WHERE season = :season"), p
+        )).scalar())
+        above: List[Dict[str, Any]] = []
+        below: List[Dict[str, Any]] = []
+        if around:
+            res = await sql(conn, "rank_window", text("""
+                SELECT * FROM (
+                    (SELECT user_id, username, best_score, updated_at FROM scores
+                     WHERE season = :season AND best_score = :s AND (updated_at, user_id) < (:t, :uid)
+                     ORDER BY updated_at DESC, user_id DESC LIMIT :n)
+                    UNION ALL
+                    (SELECT user_id, username, best_score, updated_at FROM scores
+                     WHERE season = :season AND best_score > :s
+                     ORDER BY best_score ASC, updated_at DESC, user_id DESC LIMIT :n)
+                ) a
+                ORDER BY best_score ASC, updated_at DESC, user_id DESC LIMIT :n
+            """), p)
+            above = [dict(r._mapping) for r in res]
+            below = await _rows_after(conn, season, me["best_score"], me["updated_at"], user_id, around)
+    above.reverse()
+    for i, r in enumerate(above):
+        r["rank"] = rank - len(above) + i
+    for i, r in enumerate(below, 1):
+        r["rank"] = rank + i
+    return {**me, "season": season, "rank": rank, "total": total, "above": above, "below": below}
 
 # =========================
 # TELEGRAM
 # =========================
-telegram_app: Application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+_tg_builder = Application.builder().token(TELEGRAM_BOT_TOKEN).connection_pool_size(TELEGRAM_POOL_SIZE)
+if TELEGRAM_BASE_URL:
+    _tg_builder = _tg_builder.base_url(TELEGRAM_BASE_URL)
+telegram_app: Application = _tg_builder.build()
 
 def _fmt_user(u: Optional[str], uid: int) -> str:
     u = (u or "").strip()
@@ -238,52 +667,157 @@ INFO_TEXT = (
     "• Keeping him safe is up to you!\n\n"
     "7) Leaderboard\n"
     "• Your best score is saved automatically.\n"
-    "• Use /top to see the highest-scoring players.\n\n"
+    "• Use /top to see the highest-scoring players.\n"
+    "• Use /rank to see your own position and the players around you.\n\n"
     "8) Tips\n"
     "• Stay calm; avoid unnecessary jumps.\n"
     "• Jump timing is the most critical skill.\n"
     "• Push for long runs, collect red scarves, and aim for the top! 🧣❤️"
 )
 
-# ---------- Commands ----------
-async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat = update.effective_chat
-    # sadece özel sohbetlerde cevap ver
-    if not chat or chat.type in ("group", "supergroup"):
-        return
+# ---------- Chat state ----------
+MENU_TEXT = "KAPI RUN"
+# /start klavyesinin kimliği: URL ya da düzen değişirse eski fallback kararları geçersizleşir
+START_KB_VERSION = hashlib.sha1(f"v1|{PUBLIC_GAME_URL}".encode("utf-8")).hexdigest()[:12]
 
-    msg = update.message or update.effective_message
+class ChatStateCache:
+    """
+    Sohbet başına Bot API tarafındaki durum: ayarlı menü butonu (URL, metin), /start
+    klavyesinin sürümü ve o sürümde web_app butonunun reddedilip URL fallback'ine
+    düşülüp düşülmediği. chat_state tablosu + bellekte LRU. PUBLIC_GAME_URL değişince
+    kayıtlı URL/sürüm tutmadığı için her şey bir kez yeniden ayarlanır.
+    """
+
+    FIELDS = ("menu_url", "menu_text", "kb_version", "web_app_fallback")
 
+    def __init__(self, size: int):
+        self.size = size
+        self._data: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+
+    async def get(self, chat_id: int) -> Dict[str, Any]:
+        st = self._data.get(chat_id)
+        if st is not None:
+            self._data.move_to_end(chat_id)
+            return st
+        st = dict.fromkeys(self.FIELDS)
+        if db.engine is not None:
+            try:
+                async with db_connect() as conn:
+                    res = await sql(conn, "chat_state_select", text("""
+                        SELECT menu_url, menu_text, kb_version, web_app_fallback
+                        FROM chat_state WHERE chat_id = :cid
+                    """), {"cid": chat_id})
+                    row = res.first()
+                if row is not None:
+                    st = dict(row._mapping)
+            except Exception as e:
+                print("chat_state read error:", e, file=sys.stderr)
+        self._put(chat_id, st)
+        return st
+
+    def _put(self, chat_id: int, st: Dict[str, Any]) -> None:
+        self._data[chat_id] = st
+        self._data.move_to_end(chat_id)
+        if len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    async def save(self, chat_id: int, st: Dict[str, Any]) -> None:
+        self._put(chat_id, st)
+        if db.engine is None:
+            return
+        try:
+            async with db_begin() as conn:
+                await sql(conn, "chat_state_upsert", text("""
+                    INSERT INTO chat_state (chat_id, menu_url, menu_text, kb_version, web_app_fallback)
+                    VALUES (:cid, :menu_url, :menu_text, :kb_version, :web_app_fallback)
+                    ON CONFLICT (chat_id) DO UPDATE
+                    SET menu_url = EXCLUDED.menu_url,
+                        menu_text = EXCLUDED.menu_text,
+                        kb_version = EXCLUDED.kb_version,
+                        web_app_fallback = EXCLUDED.web_app_fallback,
+                        updated_at = now();
+                """), {"cid": chat_id, **{k: st.get(k) for k in self.FIELDS}})
+        except Exception as e:
+            print("chat_state write error:", e, file=sys.stderr)
+
+chat_state = ChatStateCache(CHAT_STATE_CACHE_SIZE)
+
+# ---------- Commands ----------
+async def _set_menu_button(bot, chat_id: int) -> bool:
     # alt menüde KAPI RUN mini-app butonu
     try:
-        await context.bot.set_chat_menu_button(
-            chat_id=chat.id,
+        await bot.set_chat_menu_button(
+            chat_id=chat_id,
             menu_button=MenuButtonWebApp(
-                text="KAPI RUN",
+                text=MENU_TEXT,
                 web_app=WebAppInfo(url=PUBLIC_GAME_URL)
             )
         )
+        return True
     except Exception as e:
         print("set_chat_menu_button error:", e, file=sys.stderr)
+        return False
 
-    kb = InlineKeyboardMarkup([
-        [InlineKeyboardButton("▶️ PLAY", web_app=WebAppInfo(url=PUBLIC_GAME_URL))]
+async def _reply_start(msg, use_fallback: bool) -> Optional[bool]:
+    """
+    START_TEXT'i gönderir. True: web_app butonu Telegram tarafından reddedildi (BadRequest),
+    sohbet için URL fallback'i kalıcıdır; None: geçici hata yüzünden yalnızca bu mesajda
+    fallback kullanıldı, kayıtlı değer değişmez; False: web_app butonu gönderildi.
+    """
+    persist: Optional[bool] = True
+    if not use_fallback:
+        kb = InlineKeyboardMarkup([
+            [InlineKeyboardButton("▶️ PLAY", web_app=WebAppInfo(url=PUBLIC_GAME_URL))]
+        ])
+        try:
+            await msg.reply_text(START_TEXT, parse_mode="Markdown", reply_markup=kb)
+            return False
+        except BadRequest as e:
+            # Eski istemci fallback: aynı URL'yi normal link olarak gönder
+            print("start reply rejected (web_app), fallback to URL:", e, file=sys.stderr)
+        except Exception as e:
+            # ağ hatası/timeout: URL butonu initData taşımaz, kalıcı yapılmaz
+            print("start reply error (web_app), URL fallback for this message:", e, file=sys.stderr)
+            persist = None
+    kb_fallback = InlineKeyboardMarkup([
+        [InlineKeyboardButton("▶️ PLAY", url=PUBLIC_GAME_URL)]
     ])
+    await msg.reply_text(
+        START_TEXT,
+        parse_mode="Markdown",
+        reply_markup=kb_fallback,
+        disable_web_page_preview=True
+    )
+    return persist
 
-    try:
-        await msg.reply_text(START_TEXT, parse_mode="Markdown", reply_markup=kb)
-    except Exception as e:
-        # Eski istemci fallback: aynı URL'yi normal link olarak gönder
-        print("start reply error (web_app), fallback to URL:", e, file=sys.stderr)
-        kb_fallback = InlineKeyboardMarkup([
-            [InlineKeyboardButton("▶️ PLAY", url=PUBLIC_GAME_URL)]
-        ])
-        await msg.reply_text(
-            START_TEXT,
-            parse_mode="Markdown",
-            reply_markup=kb_fallback,
-            disable_web_page_preview=True
+async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    # sadece özel sohbetlerde cevap ver
+    if not chat or chat.type in ("group", "supergroup"):
+        return
+
+    msg = update.message or update.effective_message
+
+    st = await chat_state.get(chat.id)
+    need_menu = st["menu_url"] != PUBLIC_GAME_URL or st["menu_text"] != MENU_TEXT
+    known_fallback = bool(st["web_app_fallback"]) and st["kb_version"] == START_KB_VERSION
+
+    # menü butonu yalnızca değiştiyse ayarlanır, o da cevapla eşzamanlı
+    if need_menu:
+        menu_ok, fell_back = await asyncio.gather(
+            _set_menu_button(context.bot, chat.id),
+            _reply_start(msg, known_fallback),
         )
+    else:
+        menu_ok, fell_back = False, await _reply_start(msg, known_fallback)
+
+    new = dict(st)
+    if menu_ok:
+        new["menu_url"], new["menu_text"] = PUBLIC_GAME_URL, MENU_TEXT
+    if fell_back is not None:
+        new["kb_version"], new["web_app_fallback"] = START_KB_VERSION, fell_back
+    if new != st:
+        await chat_state.save(chat.id, new)
 
 async def cmd_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
@@ -320,29 +854,36 @@ async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message or update.effective_message
     if not msg:
         return
-    if engine is None:
+    if db.engine is None:
         await msg.reply_text("Leaderboard is not available (database not configured).")
         return
-    async with engine.connect() as conn:
-        res = await conn.execute(text("""
-            SELECT user_id, username, best_score
-            FROM scores
-            ORDER BY best_score DESC, updated_at ASC
-            LIMIT 200
-        """))
-        rows = list(res)
-    if not rows:
+    await leaderboard_cache.ensure_loaded()
+    text_ = leaderboard_render.top_text()
+    if not text_:
         await msg.reply_text("No scores yet.")
         return
+    await msg.reply_text(text_)
+
+async def cmd_rank(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.message or update.effective_message
+    u = update.effective_user
+    if not msg or not u:
+        return
+    if db.engine is None:
+        await msg.reply_text("Leaderboard is not available (database not configured).")
+        return
+    info = await rank_lookup(u.id, around=2)
+    if info is None:
+        await msg.reply_text("You have no score yet. Play a run first!")
+        return
     lines = []
-    for i, r in enumerate(rows, 1):
-        uname = _fmt_user(r._mapping["username"], r._mapping["user_id"])
-        score = r._mapping["best_score"]
-        lines.append(f"{i}. @{uname} - {score}")
-        if len("\n".join(lines)) > 3500:
-            lines.append("...")
-            break
-    await msg.reply_text("🏆 Global Leaderboard\n" + "\n".join(lines))
+    for r in info["above"] + [info] + info["below"]:
+        uname = _fmt_user(r["username"], r["user_id"])
+        mark = " ⬅️" if r["user_id"] == u.id else ""
+        lines.append(f"{r['rank']}. @{uname} - {r['best_score']}{mark}")
+    await msg.reply_text(
+        f"🏅 Your rank: #{info['rank']} of {info['total']}\n" + "\n".join(lines)
+    )
 
 # ----- ADMIN COMMANDS (Telegram) -----
 async def cmd_whoami(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -366,54 +907,67 @@ async def cmd_admin_reset_user(update: Update, context: ContextTypes.DEFAULT_TYP
     if not _is_owner(update):
         await (update.message or update.effective_message).reply_text("forbidden")
         return
-    if engine is None:
+    if db.engine is None:
         await (update.message or update.effective_message).reply_text("db not configured")
         return
     if not context.args or len(context.args) < 2:
-        await (update.message or update.effective_message).reply_text("usage: /admin_reset_user <token> <user_id>")
+        await (update.message or update.effective_message).reply_text("usage: /admin_reset_user <token> <user_id> [user_id ...]")
         return
     tok = context.args[0].strip()
     if not (SECRET_ADMIN and tok == SECRET_ADMIN):
         await (update.message or update.effective_message).reply_text("token invalid")
         return
     try:
-        uid = int(context.args[1])
-    except Exception:
+        uids = _parse_user_ids(" ".join(context.args[1:]).replace(",", " ").split())
+    except ValueError:
         await (update.message or update.effective_message).reply_text("invalid user_id")
         return
-    async with engine.begin() as conn:
-        res = await conn.execute(
-            text("UPDATE scores SET best_score=0, updated_at=now() WHERE user_id=:uid"),
-            {"uid": uid}
-        )
-        changed = res.rowcount or 0
+    changed = await reset_users(uids)
     await (update.message or update.effective_message).reply_text(f"changed:{changed}")
 
 async def cmd_admin_reset_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not _is_owner(update):
         await (update.message or update.effective_message).reply_text("forbidden")
         return
-    if engine is None:
+    if db.engine is None:
         await (update.message or update.effective_message).reply_text("db not configured")
         return
     tok = " ".join(context.args).strip() if context.args else ""
     if not (SECRET_ADMIN and tok == SECRET_ADMIN):
         await (update.message or update.effective_message).reply_text("token invalid")
         return
-    async with engine.begin() as conn:
-        await conn.execute(text("UPDATE scores SET best_score=0, updated_at=now()"))
-    await (update.message or update.effective_message).reply_text("ok:true reset_all")
+    season = await start_new_season()
+    await (update.message or update.effective_message).reply_text(f"ok:true reset_all season={season}")
 
 # Handlers
 telegram_app.add_handler(CommandHandler("start",            cmd_start))
 telegram_app.add_handler(CommandHandler(["play", "Play"],   cmd_play))   # /play ve /Play
 telegram_app.add_handler(CommandHandler("info",             cmd_info))
 telegram_app.add_handler(CommandHandler("top",              cmd_top))
+telegram_app.add_handler(CommandHandler("rank",             cmd_rank))
 telegram_app.add_handler(CommandHandler("whoami",           cmd_whoami))
 telegram_app.add_handler(CommandHandler("admin_test",       cmd_admin_test))
 telegram_app.add_handler(CommandHandler("admin_reset_user", cmd_admin_reset_user))
 telegram_app.add_handler(CommandHandler("admin_reset_all",  cmd_admin_reset_all))
 
+def _timed_command(name: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        t0 = time.perf_counter()
+        try:
+            return await fn(update, context)
+        except Exception:
+            metrics.command_errors[name] += 1
+            raise
+        finally:
+            metrics.commands[name].observe(time.perf_counter() - t0)
+    return wrapper
+
+# komut sürelerini metriklere yaz
+for _h in telegram_app.handlers.get(0, []):
+    if isinstance(_h, CommandHandler):
+        _h.callback = _timed_command(min(_h.commands), _h.callback)
+
 # =========================
 # SCORE SIGNATURE HELPERS
 # =========================
@@ -424,29 +978,308 @@ def _hmac_ok(user_id: int, score: int, sig: str) -> bool:
     expected = hmac.new(SECRET.encode("utf-8"), msg, hashlib.sha256).hexdigest()
     return hmac.compare_digest(expected, sig)
 
-def _check_webapp_initdata(init_data: str, bot_token: str) -> bool:
-    if not init_data or not bot_token:
-        return False
-    try:
-        parsed = parse_qsl(init_data, keep_blank_values=True, strict_parsing=False, encoding="utf-8")
-        hash_val: Optional[str] = None
-        pairs = []
-        for k, v in parsed:
-            k = unquote_plus(k); v = unquote_plus(v)
-            if k == "hash":
-                hash_val = v
-            else:
-                pairs.append((k, v))
-        if not hash_val:
-            return False
-        pairs.sort(key=lambda kv: kv[0])
-        data_check_string = "\n".join([f"{k}={v}" for (k, v) in pairs])
-        secret = hmac.new(b"WebAppData", bot_token.strip().encode("utf-8"), hashlib.sha256).digest()
-        calc = hmac.new(secret, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
-        return hmac.compare_digest(calc.lower(), hash_val.lower())
-    except Exception as e:
-        print("initdata verify error:", e, file=sys.stderr)
-        return False
+class InitDataVerifier:
+    """
+    Telegram WebApp initData doğrulayıcı. Gizli anahtar bir kez türetilir; doğrulanmış
+    initData'lar `hash` değerine göre, auth_date + INITDATA_MAX_AGE anına kadar
+    saklanır, böylece aynı oturumdan gelen tekrar gönderimler HMAC hesaplamaz.
+    """
+
+    def __init__(self, bot_token: str, max_age: int, cache_size: int):
+        self._secret = hmac.new(b"WebAppData", bot_token.strip().encode("utf-8"), hashlib.sha256).digest()
+        self.max_age = max_age
+        self.cache_size = cache_size
+        # hash -> (init_data, user, expires_at)
+        self._cache: "OrderedDict[str, Tuple[str, Dict[str, Any], float]]" = OrderedDict()
+
+    def verify(self, init_data: str) -> Optional[Dict[str, Any]]:
+        """initData geçerliyse içindeki `user` nesnesini, değilse None döndürür."""
+        if not init_data:
+            return None
+        now = time.time()
+        try:
+            fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=False, encoding="utf-8"))
+            hash_val = fields.pop("hash", "").lower()
+            if not hash_val:
+                return None
+            hit = self._cache.get(hash_val)
+            if hit is not None:
+                # aynı hash farklı bir gövdeyle gelirse önbellek kullanılmaz
+                if hit[0] == init_data and hit[2] > now:
+                    self._cache.move_to_end(hash_val)
+                    return hit[1]
+                del self._cache[hash_val]
+            expires_at = float("inf")
+            if self.max_age > 0:
+                auth_date = int(fields.get("auth_date") or 0)
+                expires_at = auth_date + self.max_age
+                if expires_at <= now:
+                    return None
+            data_check_string = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+            calc = hmac.new(self._secret, data_check_string.encode("utf-8"), hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(calc, hash_val):
+                return None
+            user: Dict[str, Any] = {}
+            if fields.get("user"):
+                try:
+                    u = json.loads(fields["user"])
+                    if isinstance(u, dict):
+                        user = u
+                except Exception:
+                    pass
+        except Exception as e:
+            print("initdata verify error:", e, file=sys.stderr)
+            return None
+        self._cache[hash_val] = (init_data, user, expires_at)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return user
+
+initdata_verifier = InitDataVerifier(TELEGRAM_BOT_TOKEN, INITDATA_MAX_AGE, INITDATA_CACHE_SIZE)
+
+# =========================
+# CACHE BUS (LISTEN/NOTIFY)
+# =========================
+NOTIFY_PAYLOAD_MAX = 7500   # Postgres sınırı 8000 bayt
+NOTIFY_UIDS_PER_MSG = 300   # 300 x 20 haneli id de sınırın altında kalır
+
+def _row_wire(row: Dict[str, Any]) -> list:
+    return [row["user_id"], row["username"], row["best_score"], row["updated_at"].isoformat(), row["season"]]
+
+def _row_from_wire(r: list) -> Dict[str, Any]:
+    return {
+        "user_id": int(r[0]), "username": r[1], "best_score": int(r[2]),
+        "updated_at": datetime.fromisoformat(r[3]), "season": int(r[4]),
+    }
+
+class CacheBus:
+    """
+    Worker'lar arası cache tutarlılığı. Her worker kendi leaderboard cache'ini,
+    sezonunu ve asset indeksini tutar; değişiklikler NOTIFY ile duyurulur,
+    ayrı bir psycopg bağlantısı LISTEN ile dinler. Mesajlar JSON:
+      lb     {"r": [[uid, uname, best, updated_at, season], ...]}  ilk sıraları etkileyen yazılar
+      user   {"uids": [...]}                                       kullanıcılar sıfırlandı
+      scores {}                                                    toplu import: skorlar dışarıdan değişti
+      season {"season": N}                                         yeni sezon açıldı
+      assets {}                                                    statik dosyalar değişti
+    Bağlantı koparsa yeniden bağlanılır ve kaçmış olabilecek mesajlar yüzünden cache'ler tazelenir.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.pid = os.getpid()
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _payload(self, kind: str, **data) -> str:
+        return json.dumps({"t": kind, "pid": self.pid, **data}, separators=(",", ":"), default=str)
+
+    async def _notify(self, payloads: List[str]) -> None:
+        if not CACHE_NOTIFY or db.engine is None or not payloads:
+            return
+        try:
+            async with db_connect() as conn:
+                await sql(conn, "cache_notify", text(
+                    "SELECT pg_notify(:ch, p) FROM unnest(CAST(:ps AS TEXT[])) AS p"
+                ), {"ch": self.channel, "ps": payloads})
+                await conn.commit()
+        except Exception as e:
+            # yazı zaten commit edildi; duyuru kaybı diğer worker'larda yalnızca gecikmeli tazelenme demek
+            print("cache notify error:", e, file=sys.stderr)
+
+    async def publish(self, kind: str, **data) -> None:
+        await self._notify([self._payload(kind, **data)])
+
+    async def publish_rows(self, rows: List[Dict[str, Any]]) -> None:
+        if not CACHE_NOTIFY:
+            return
+        payloads, chunk, size = [], [], 0
+        for row in rows:
+            w = _row_wire(row)
+            n = len(json.dumps(w, default=str)) + 1
+            if chunk and size + n > NOTIFY_PAYLOAD_MAX:
+                payloads.append(self._payload("lb", r=chunk))
+                chunk, size = [], 0
+            chunk.append(w)
+            size += n
+        if chunk:
+            payloads.append(self._payload("lb", r=chunk))
+        await self._notify(payloads)
+
+    async def publish_users(self, uids: List[int]) -> None:
+        await self._notify([
+            self._payload("user", uids=uids[i: i + NOTIFY_UIDS_PER_MSG])
+            for i in range(0, len(uids), NOTIFY_UIDS_PER_MSG)
+        ])
+
+    async def _handle(self, payload: str) -> None:
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+        if msg.get("pid") == self.pid:
+            return
+        self.received += 1
+        kind = msg.get("t")
+        if kind == "lb":
+            for r in msg.get("r") or ():
+                leaderboard_cache.apply(_row_from_wire(r))
+        elif kind == "user":
+            # "uid": eski sürümden gelen tekli mesaj (rolling deploy)
+            for uid in msg.get("uids") or [msg["uid"]]:
+                score_buffer.discard(int(uid))
+                best_cache.discard(int(uid))
+            leaderboard_cache.invalidate()
+        elif kind == "scores":
+            best_cache.discard()
+            leaderboard_cache.invalidate()
+        elif kind == "season":
+            season = int(msg["season"])
+            if season != db.current_season:
+                db.current_season = season
+                score_buffer.discard()
+                best_cache.discard()
+                leaderboard_cache.invalidate()
+        elif kind == "assets":
+            static_routes.resolve()
+            await asyncio.to_thread(asset_index.refresh)
+
+    async def _resync(self) -> None:
+        # kaçan mesajlar arasında reset olabilir
+        leaderboard_cache.invalidate()
+        best_cache.discard()
+        season = db.current_season
+        if await load_current_season() != season:
+            score_buffer.discard()
+        await asyncio.to_thread(asset_index.refresh)
+
+    async def _listen(self) -> None:
+        url = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        delay = 1.0
+        connected_before = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(url, autocommit=True) as conn:
+                    await conn.execute(f'LISTEN "{self.channel}"')
+                    if connected_before:
+                        await self._resync()
+                    connected_before = True
+                    delay = 1.0
+                    async for n in conn.notifies():
+                        try:
+                            await self._handle(n.payload)
+                        except Exception as e:
+                            print("cache bus message error:", e, file=sys.stderr)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("cache bus listen error:", e, file=sys.stderr)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def start(self) -> None:
+        if CACHE_NOTIFY and self._task is None:
+            self.pid = os.getpid()
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+cache_bus = CacheBus(CACHE_NOTIFY_CHANNEL)
+score_buffer.listeners.append(cache_bus.publish_rows)
+
+async def forget_users(uids: List[int]) -> None:
+    """Sıfırlanan kullanıcıları yerel cache'lerden düşürür ve diğer worker'lara duyurur."""
+    for uid in uids:
+        score_buffer.discard(uid)
+        best_cache.discard(uid)
+    leaderboard_cache.invalidate()
+    await cache_bus.publish_users(uids)
+
+async def forget_user(uid: int) -> None:
+    await forget_users([uid])
+
+# =========================
+# RATE LIMITING
+# =========================
+class RateLimiter:
+    """
+    Anahtar başına token bucket. Kovalar erişim sırasına göre OrderedDict'te durur:
+    dolmak için gereken süre kadar boşta kalan kova doluymuş gibi davranacağı için
+    baştan atılır; toplam kova sayısı max_keys ile sınırlıdır.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_keys: int):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.limited = 0
+        self._idle = burst / rate if rate > 0 else 0.0
+        self._buckets: "OrderedDict[Any, List[float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, key: Any) -> float:
+        """Token varsa harcar ve 0 döner; yoksa bir sonraki token'a kalan saniye."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        b = self._buckets.get(key)
+        if b is None:
+            b = [self.burst, now]
+            self._buckets[key] = b
+        else:
+            b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+            b[1] = now
+            self._buckets.move_to_end(key)
+        self._evict(now)
+        if b[0] >= 1.0:
+            b[0] -= 1.0
+            return 0.0
+        self.limited += 1
+        return (1.0 - b[0]) / self.rate
+
+    def _evict(self, now: float) -> None:
+        buckets = self._buckets
+        while len(buckets) > self.max_keys:
+            buckets.popitem(last=False)
+        for _ in range(2):   # amorti: her çağrıda en eski birkaç kovaya bak
+            if not buckets:
+                return
+            k, b = next(iter(buckets.items()))
+            if now - b[1] < self._idle:
+                return
+            del buckets[k]
+
+score_limiter = RateLimiter("score", *RATE_LIMIT_SCORE, RATE_LIMIT_MAX_KEYS)
+score_ip_limiter = RateLimiter("score_ip", *RATE_LIMIT_SCORE_IP, RATE_LIMIT_MAX_KEYS)
+webhook_limiter = RateLimiter("webhook", *RATE_LIMIT_WEBHOOK, RATE_LIMIT_MAX_KEYS)
+rate_limiters = (score_limiter, score_ip_limiter, webhook_limiter)
+
+def _client_ip(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        fwd = request.headers.get("x-forwarded-for")
+        if fwd:
+            return fwd.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else ""
+
+def _enforce(limiter: RateLimiter, key: Any) -> None:
+    wait = limiter.take(key)
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="rate limited",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
 
 # =========================
 # SCORE API
@@ -456,6 +1289,8 @@ async def post_score(
     request: Request,
     x_telegram_init_data: Optional[str] = Header(default=None)
 ):
+    # imza doğrulamadan ve gövdeyi okumadan önce IP bütçesi
+    _enforce(score_ip_limiter, _client_ip(request))
     try:
         body = await request.json()
         if not isinstance(body, dict):
@@ -473,12 +1308,10 @@ async def post_score(
     user_id: Optional[int] = None
     username: Optional[str] = None
 
-    if init_data and _check_webapp_initdata(init_data, TELEGRAM_BOT_TOKEN):
-        params = parse_qs(init_data, keep_blank_values=True)
-        user_json = params.get("user", [None])[0]
-        if user_json:
+    u = initdata_verifier.verify(init_data) if init_data else None
+    if u is not None:
+        if u:
             try:
-                u = json.loads(user_json)
                 user_id = int(u.get("id"))
                 username = _fmt_user(u.get("username") or "", user_id)
             except Exception:
@@ -497,38 +1330,178 @@ async def post_score(
     if user_id is None:
         raise HTTPException(status_code=401, detail="invalid signature")
 
-    if engine is None:
+    # kullanıcı bütçesi doğrulanmış kimlikle; DB işinden önce
+    _enforce(score_limiter, user_id)
+
+    if db.engine is None:
         raise HTTPException(status_code=500, detail="database not configured")
 
-    async with engine.begin() as conn:
-        await conn.execute(
+    if RUN_HISTORY:
+        run_log.add(user_id, db.current_season, score_val)
+
+    # rekor değil ve kullanıcı adı değişmemişse yazacak bir şey yok; yanıt aynı kalır
+    noop = best_cache.is_noop(user_id, db.current_season, score_val, username)
+
+    if SCORE_WRITE_BEHIND:
+        if not noop:
+            score_buffer.submit(user_id, username, score_val)
+        return {"ok": True, "saved": False, "queued": True, "user_id": user_id, "username": username, "score": score_val}
+
+    if noop:
+        return {"ok": True, "saved": True, "user_id": user_id, "username": username, "score": score_val}
+
+    token = best_cache.token()
+    received = time.monotonic()
+    async with db_begin() as conn:
+        res = await sql(
+            conn, "score_upsert",
             text("""
-                INSERT INTO scores (user_id, username, best_score)
-                VALUES (:uid, :uname, :s)
-                ON CONFLICT (user_id) DO UPDATE
+                INSERT INTO scores (season, user_id, username, best_score)
+                VALUES (:season, :uid, :uname, :s)
+                ON CONFLICT (season, user_id) DO UPDATE
                 SET username   = EXCLUDED.username,
                     best_score = GREATEST(scores.best_score, EXCLUDED.best_score),
-                    updated_at = now();
+                    -- "ilk ulaşan" sıralaması: yalnızca rekor zamanı değiştirir (cache'ten atlanan yazıyla aynı sonuç)
+                    updated_at = CASE WHEN EXCLUDED.best_score > scores.best_score
+                                      THEN now() ELSE scores.updated_at END
+                WHERE scores.reset_at IS NULL
+                   OR scores.reset_at < statement_timestamp() - make_interval(secs => CAST(:age AS DOUBLE PRECISION))
+                RETURNING user_id, username, best_score, updated_at, season;
             """),
-            {"uid": user_id, "uname": username, "s": score_val}
+            {"season": db.current_season, "uid": user_id, "uname": username, "s": score_val,
+             "age": time.monotonic() - received}
         )
+        found = res.one_or_none()
+    if found is None:
+        # skor, istek işlenirken yapılan bir admin reset'inden önce alınmıştı
+        return {"ok": True, "saved": False, "user_id": user_id, "username": username, "score": score_val}
+    row = dict(found._mapping)
+    best_cache.update(row, token)
+    if leaderboard_cache.apply(row):
+        await cache_bus.publish_rows([row])
 
     return {"ok": True, "saved": True, "user_id": user_id, "username": username, "score": score_val}
 
 @app.get("/api/leaderboard")
-async def leaderboard(limit: int = 200):
-    if engine is None:
+async def leaderboard(request: Request, limit: int = 200, season: Optional[int] = None):
+    if db.engine is None:
         raise HTTPException(status_code=500, detail="database not configured")
     limit = max(1, min(200, int(limit)))
-    async with engine.connect() as conn:
-        res = await conn.execute(text("""
-            SELECT user_id, username, best_score, updated_at
-            FROM scores
-            ORDER BY best_score DESC, updated_at ASC
-            LIMIT :lim
-        """), {"lim": limit})
+    if season is not None and season != db.current_season:
+        # geçmiş sezonlar cache'te tutulmaz
+        async with db_read() as conn:
+            return await _rows_after(conn, season, *LB_FIRST_KEY, limit)
+    await leaderboard_cache.ensure_loaded()
+    body, etag = leaderboard_render.json(limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    inm = request.headers.get("if-none-match")
+    if inm and _if_none_match(inm, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/api/leaderboard/live")
+async def leaderboard_live():
+    """Server-Sent Events: önce snapshot, sonra yalnızca değişen sıralar (LiveLeaderboard)."""
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    sub = await live_board.subscribe()
+    if sub is None:
+        raise HTTPException(status_code=503, detail="too many live subscribers", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        live_board.stream(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/seasons")
+async def list_seasons():
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    async with db_read() as conn:
+        res = await sql(conn, "seasons_select", text("""
+            SELECT s.id, s.started_at, s.ended_at,
+                   COALESCE((SELECT sum(n) FROM score_hist h WHERE h.season = s.id), 0) AS players
+            FROM seasons s ORDER BY s.id DESC
+        """))
         rows = [dict(r._mapping) for r in res]
-    return rows
+    return {"current": db.current_season, "seasons": rows}
+
+LEADERBOARD_PAGE_MAX = 1000
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row["best_score"], row["updated_at"].isoformat(), row["user_id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[int, datetime, int]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    s, t, uid = json.loads(raw)
+    return int(s), datetime.fromisoformat(t), int(uid)
+
+@app.get("/api/leaderboard/page")
+async def leaderboard_page(limit: int = 100, cursor: Optional[str] = None, season: Optional[int] = None):
+    """
+    Keyset sayfalama: `next` bir sonraki isteğe cursor olarak verilir. İlk sayfa
+    cache'ten gelir; sonrakiler OFFSET olmadan, son satırın anahtarından devam eder.
+    """
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    limit = max(1, min(LEADERBOARD_PAGE_MAX, int(limit)))
+    if season is None:
+        season = db.current_season
+    if not cursor and limit <= leaderboard_cache.size and season == db.current_season:
+        await leaderboard_cache.ensure_loaded()
+        rows = leaderboard_cache.top(limit)
+    else:
+        if cursor:
+            try:
+                s, t, uid = _decode_cursor(cursor)
+            except Exception:
+                raise HTTPException(status_code=400, detail="invalid cursor")
+        else:
+            s, t, uid = LB_FIRST_KEY
+        async with db_read() as conn:
+            rows = await _rows_after(conn, season, s, t, uid, limit)
+    nxt = _encode_cursor(rows[-1]) if len(rows) == limit else None
+    return {"rows": rows, "next": nxt}
+
+@app.get("/api/rank/{user_id}")
+async def api_rank(user_id: int, around: int = 0, season: Optional[int] = None):
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    info = await rank_lookup(user_id, around, season)
+    if info is None:
+        raise HTTPException(status_code=404, detail="user has no score")
+    return info
+
+@app.get("/api/stats/user/{user_id}")
+async def user_stats(user_id: int, season: Optional[int] = None):
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    if season is None:
+        season = db.current_season
+    async with db_read() as conn:
+        res = await sql(conn, "user_stats_select", text("""
+            SELECT runs, total, last_played FROM user_stats
+            WHERE season = :season AND user_id = :uid
+        """), {"season": season, "uid": user_id})
+        row = res.first()
+    runs, total, last = (row.runs, row.total, row.last_played) if row else (0, 0, None)
+    return {
+        "user_id": user_id, "season": season, "runs": runs, "total": total,
+        "avg": round(total / runs, 2) if runs else None, "last_played": last,
+    }
+
+@app.get("/api/stats/daily")
+async def daily_stats(days: int = 30):
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    days = max(1, min(366, int(days)))
+    async with db_read() as conn:
+        res = await sql(conn, "daily_stats_select", text("""
+            SELECT day, players, runs, total FROM daily_stats
+            ORDER BY day DESC LIMIT :n
+        """), {"n": days})
+        return [dict(r._mapping) for r in res]
 
 # =========================
 # ADMIN API (HTTP)
@@ -537,39 +1510,274 @@ def _check_admin_header(request: Request) -> bool:
     tok = request.headers.get("X-Admin-Token", "") if hasattr(request, "headers") else ""
     return bool(SECRET_ADMIN and tok and tok == SECRET_ADMIN)
 
+def _parse_user_ids(values: Any) -> List[int]:
+    """Tekrarsız, sırası korunmuş user_id listesi; geçersiz değer ya da sınır aşımında ValueError."""
+    if not isinstance(values, (list, tuple)) or not values:
+        raise ValueError("user_ids must be a non-empty list")
+    uids = list(dict.fromkeys(int(v) for v in values))
+    if len(uids) > ADMIN_BULK_MAX_USERS:
+        raise ValueError(f"at most {ADMIN_BULK_MAX_USERS} user_ids per request")
+    return uids
+
+async def reset_users(uids: List[int]) -> int:
+    """
+    Mevcut sezonda verilen kullanıcıların skorunu tek UPDATE ile sıfırlar. Flush kilidi
+    tutulur: bu worker'da partisi alınmış bir flush reset'ten sonra commit edilemez;
+    diğer worker'ların geç kalan partileri reset_at koşuluyla atlanır.
+    """
+    async with score_buffer.exclusive(drop=uids):
+        async with db_begin() as conn:
+            res = await sql(
+                conn, "reset_users",
+                text("""
+                    UPDATE scores SET best_score=0, updated_at=now(), reset_at=statement_timestamp()
+                    WHERE season=:season AND user_id = ANY(CAST(:uids AS BIGINT[]))
+                """),
+                {"season": db.current_season, "uids": uids}
+            )
+            changed = res.rowcount or 0
+        await forget_users(uids)
+    return changed
+
 @app.post("/api/admin/reset_user")
 async def api_reset_user(payload: Dict[str, Any], request: Request):
     if not _check_admin_header(request):
         raise HTTPException(status_code=403, detail="forbidden")
-    if engine is None:
+    if db.engine is None:
         raise HTTPException(status_code=500, detail="database not configured")
     try:
         uid = int(payload.get("user_id"))
     except Exception:
         raise HTTPException(status_code=400, detail="invalid user_id")
-    async with engine.begin() as conn:
-        res = await conn.execute(
-            text("UPDATE scores SET best_score=0, updated_at=now() WHERE user_id=:uid"),
-            {"uid": uid}
-        )
-        changed = res.rowcount or 0
+    changed = await reset_users([uid])
     return {"ok": True, "changed": changed}
 
+@app.post("/api/admin/reset_users")
+async def api_reset_users(payload: Dict[str, Any], request: Request):
+    """{"user_ids": [...]} -> hepsi tek ifadede sıfırlanır."""
+    if not _check_admin_header(request):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    try:
+        uids = _parse_user_ids(payload.get("user_ids"))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid user_ids: {e}")
+    changed = await reset_users(uids)
+    return {"ok": True, "requested": len(uids), "changed": changed}
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+async def _export_rows(fmt: str, season: int):
+    # server-side cursor: satırlar geldikçe parça parça yazılır, bellekte birikmez
+    assert db.engine is not None
+    if fmt == "csv":
+        yield "user_id,username,best_score,updated_at\n".encode("utf-8")
+    async with db_read() as conn:
+        result = await conn.stream(text("""
+            SELECT user_id, username, best_score, updated_at
+            FROM scores
+            WHERE season = :season
+            ORDER BY best_score DESC, updated_at ASC, user_id ASC
+        """), {"season": season})
+        async for part in result.mappings().partitions(1000):
+            if fmt == "csv":
+                buf = io.StringIO()
+                w = csv.writer(buf, lineterminator="\n")
+                for r in part:
+                    w.writerow([r["user_id"], r["username"] or "", r["best_score"], r["updated_at"].isoformat()])
+                chunk = buf.getvalue()
+            else:
+                chunk = "".join(
+                    json.dumps({
+                        "user_id": r["user_id"],
+                        "username": r["username"],
+                        "best_score": r["best_score"],
+                        "updated_at": r["updated_at"].isoformat(),
+                    }, ensure_ascii=False) + "\n"
+                    for r in part
+                )
+            yield chunk.encode("utf-8")
+
+@app.get("/api/admin/export")
+async def api_export(request: Request, format: str = "ndjson", season: Optional[int] = None):
+    if not _check_admin_header(request):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    fmt = format.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    return StreamingResponse(
+        _export_rows(fmt, db.current_season if season is None else season),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="scores.{fmt}"'},
+    )
+
+@app.post("/api/admin/import")
+async def api_import(request: Request, format: str = "ndjson", season: Optional[int] = None):
+    """
+    NDJSON/CSV gövdesini akış halinde okuyup ayrıştırır ve biriktirir; gövde tamamen
+    gelince COPY ile geçici tabloya yazar, sonra tek upsert ile scores'a birleştirir
+    (GREATEST: import mevcut rekoru düşürmez). DB kısmı tek transaction'dır; hata olursa
+    hiçbir satır yazılmaz.
+    """
+    if not _check_admin_header(request):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    fmt = format.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    season = db.current_season if season is None else season
+    async with db_read(fresh=True) as conn:
+        exists = (await sql(conn, "import_season", text(
+            "SELECT EXISTS (SELECT 1 FROM seasons WHERE id = :season)"
+        ), {"season": season})).scalar()
+    if not exists:
+        raise HTTPException(status_code=404, detail="season not found")
+    parser = ScoreImportParser(fmt)
+    spool = await spool_import(request, parser)
+    try:
+        merged = await merge_import(spool, season)
+    finally:
+        spool.close()
+    if merged:
+        best_cache.discard()
+        leaderboard_cache.invalidate()
+        await cache_bus.publish("scores")
+    return {
+        "ok": True, "season": season, "rows": parser.rows, "merged": merged,
+        "rejected": parser.rejected, "first_error": parser.first_error,
+    }
+
 @app.post("/api/admin/reset_all")
 async def api_reset_all(request: Request):
     if not _check_admin_header(request):
         raise HTTPException(status_code=403, detail="forbidden")
-    if engine is None:
+    if db.engine is None:
         raise HTTPException(status_code=500, detail="database not configured")
-    async with engine.begin() as conn:
-        await conn.execute(text("UPDATE scores SET best_score=0, updated_at=now()"))
-    return {"ok": True, "reset_all": True}
+    season = await start_new_season()
+    return {"ok": True, "reset_all": True, "season": season}
+
+@app.post("/api/admin/prune_seasons")
+async def api_prune_seasons(payload: Dict[str, Any], request: Request):
+    """Son `keep` sezon dışındakileri arka planda parça parça siler."""
+    if not _check_admin_header(request):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if db.engine is None:
+        raise HTTPException(status_code=500, detail="database not configured")
+    try:
+        keep = max(1, int(payload.get("keep", 1)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid keep")
+    before = db.current_season - keep + 1
+    schedule_season_prune(before)
+    return {"ok": True, "pruning_before": before}
 
 # =========================
 # WEBHOOK
 # =========================
+class RecentIds:
+    """Son görülen update_id'lerin sınırlı LRU kümesi (Telegram tekrar teslimleri için)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._ids: "OrderedDict[int, None]" = OrderedDict()
+
+    def seen(self, update_id: int) -> bool:
+        return update_id in self._ids
+
+    def add(self, update_id: int) -> None:
+        self._ids[update_id] = None
+        self._ids.move_to_end(update_id)
+        if len(self._ids) > self.size:
+            self._ids.popitem(last=False)
+
+    def discard(self, update_id: int) -> None:
+        self._ids.pop(update_id, None)
+
+class WebhookQueue:
+    """
+    WEBHOOK_QUEUE açıkken webhook güncellemeleri bu sınırlı kuyruğa atılır ve
+    WEBHOOK_WORKERS adet worker tarafından işlenir; Telegram'ın isteği hemen 200 alır.
+    """
+
+    def __init__(self, maxsize: int, workers: int):
+        self.maxsize = maxsize
+        self.workers = workers
+        self._queue: "asyncio.Queue[Tuple[float, Update]]" = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.shed = 0
+        self.rejected = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def put(self, update: Update) -> bool:
+        try:
+            self._queue.put_nowait((time.monotonic(), update))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _worker(self) -> None:
+        while True:
+            enqueued_at, update = await self._queue.get()
+            lag = time.monotonic() - enqueued_at
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            try:
+                await telegram_ready()
+                await telegram_app.process_update(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print("webhook worker error:", e, file=sys.stderr)
+            finally:
+                self._queue.task_done()
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        # kuyruktakileri bitirmeye çalış, sonra worker'ları kapat
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                print(f"WARNING: {self._queue.qsize()} webhook updates dropped on shutdown.", file=sys.stderr)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = 0.0
+        if not self._queue.empty():
+            oldest = time.monotonic() - self._queue._queue[0][0]
+        return {
+            "depth": self._queue.qsize(),
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "shed": self.shed,
+            "rejected": self.rejected,
+            "oldest_ms": round(oldest * 1000, 1),
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
+
+recent_updates = RecentIds(WEBHOOK_DEDUPE_SIZE)
+webhook_queue = WebhookQueue(WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS)
+webhook_duplicates = 0
+
 @app.api_route(WEBHOOK_PATH, methods=["GET", "POST"])
 async def telegram_webhook(request: Request):
+    global webhook_duplicates
     if request.method == "GET":
         return PlainTextResponse("OK", status_code=status.HTTP_200_OK)
     try:
@@ -578,25 +1786,127 @@ async def telegram_webhook(request: Request):
         body = await request.body()
         print("WEBHOOK parse error:", body[:500], file=sys.stderr)
         return JSONResponse({"ok": False, "error": "invalid json"}, status_code=400)
+    if not isinstance(data, dict) or not isinstance(data.get("update_id"), int):
+        return JSONResponse({"ok": False, "error": "invalid update"}, status_code=400)
+    update_id = data["update_id"]
+    if recent_updates.seen(update_id):
+        webhook_duplicates += 1
+        return {"ok": True, "duplicate": True}
     update = Update.de_json(data, telegram_app.bot)
-    await telegram_app.process_update(update)
+    user = update.effective_user
+    if user is not None and webhook_limiter.take(user.id) > 0:
+        # 429 Telegram'ın tüm kuyruğu yeniden denemesine yol açar; fazlası sessizce düşer
+        recent_updates.add(update_id)
+        return {"ok": True, "limited": True}
+    if not WEBHOOK_QUEUE:
+        recent_updates.add(update_id)
+        try:
+            await telegram_ready(TELEGRAM_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            # getMe hâlâ başarısız: isteği asılı tutmak yerine Telegram'ın sonra tekrar göndermesine izin ver
+            recent_updates.discard(update_id)
+            return JSONResponse(
+                {"ok": False, "error": "telegram not ready"},
+                status_code=503, headers={"Retry-After": "5"},
+            )
+        try:
+            await telegram_app.process_update(update)
+        except Exception:
+            # hata olursa Telegram'ın tekrar göndermesine izin ver
+            recent_updates.discard(update_id)
+            raise
+        return {"ok": True}
+    if not webhook_queue.put(update):
+        if WEBHOOK_QUEUE_FULL == "shed":
+            # güncellemeyi bırak ama Telegram tekrar göndermesin
+            webhook_queue.shed += 1
+            recent_updates.add(update_id)
+            return {"ok": True, "shed": True}
+        webhook_queue.rejected += 1
+        return JSONResponse({"ok": False, "error": "queue full"}, status_code=503)
+    recent_updates.add(update_id)
     return {"ok": True}
 
+@app.get("/__webhook")
+async def webhook_stats():
+    return {"queue": WEBHOOK_QUEUE, "duplicates": webhook_duplicates, **webhook_queue.stats()}
+
 # =========================
 # LIFECYCLE
 # =========================
+static_reload_task: Optional[asyncio.Task] = None
+telegram_init_task: Optional[asyncio.Task] = None
+asset_build_task: Optional[asyncio.Task] = None
+manifest_record_task: Optional[asyncio.Task] = None
+
+async def _init_telegram() -> None:
+    # getMe ağ çağrısı açılışı bekletmez; başarısız olursa artan aralıklarla yeniden denenir
+    delay = 1.0
+    while True:
+        try:
+            await telegram_app.initialize()
+            readiness["telegram"] = True
+            return
+        except Exception as e:
+            print("telegram initialize error:", e, file=sys.stderr)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
+
+async def telegram_ready(timeout: Optional[float] = None) -> None:
+    """Update işlemeden önce: initialize bitmediyse onu bekler (süre verilirse asyncio.TimeoutError)."""
+    if not readiness["telegram"] and telegram_init_task is not None:
+        await asyncio.wait_for(asyncio.shield(telegram_init_task), timeout)
+
+async def _build_assets() -> None:
+    # sıkıştırma CPU işi; bitene kadar istekler dosyadan sıkıştırmasız servis edilir
+    try:
+        await asyncio.to_thread(asset_index.build)
+    except Exception as e:
+        print("asset index build error:", e, file=sys.stderr)
+    readiness["assets"] = True
+
 @app.on_event("startup")
 async def on_startup():
-    await telegram_app.initialize()
-    global engine
+    global static_reload_task, telegram_init_task, asset_build_task, manifest_record_task
+    static_routes.resolve()
+    admission.start()
+    telegram_init_task = asyncio.create_task(_init_telegram())
+    asset_build_task = asyncio.create_task(_build_assets())
+    if STATIC_HOT_RELOAD:
+        static_reload_task = asyncio.create_task(_static_reload_loop())
+    if WEBHOOK_QUEUE:
+        webhook_queue.start()
     if DATABASE_URL:
-        engine = create_async_engine(DATABASE_URL, pool_pre_ping=True)
-        await ensure_schema()
+        db.engine, db.read_engine = create_engines()
+        await migrate()
+        await load_current_season()
+        await leaderboard_cache.ensure_loaded()
+        cache_bus.start()
+        if SCORE_WRITE_BEHIND:
+            score_buffer.start()
+        if RUN_HISTORY:
+            run_log.start()
+        manifest_record_task = asyncio.create_task(record_manifest(after=asset_build_task))
     else:
         print("WARNING: DATABASE_URL not set.")
+    readiness["database"] = True
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    if static_reload_task is not None:
+        static_reload_task.cancel()
+    await webhook_queue.stop()
+    if telegram_init_task is not None and not telegram_init_task.done():
+        telegram_init_task.cancel()
     await telegram_app.shutdown()
-    if engine is not None:
-        await engine.dispose()
+    if season_prune_task is not None:
+        season_prune_task.cancel()
+    await cache_bus.stop()
+    await live_board.stop()
+    await admission.stop()
+    if db.engine is not None:
+        await score_buffer.stop()
+        await run_log.stop()
+        await db.engine.dispose()
+    if db.read_engine is not None:
+        await db.read_engine.dispose()
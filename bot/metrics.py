@@ -0,0 +1,147 @@
+# bot/metrics.py
+"""
+Prometheus metrikleri: route/SQL/komut süre histogramları, pool bekleme süreleri ve
+alt sistemlerin kaydettiği gauge'lar. Metin yalnızca /metrics istendiğinde üretilir.
+"""
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+from bot.assets import NO_STORE_PREFIXES, NO_STORE_PATHS, asset_index
+
+# =========================
+# METRICS
+# =========================
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Sabit kovalı histogram; kayıt sırasında kümülatif toplam yapılmaz, scrape'te yapılır."""
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, v)] += 1
+        self.sum += v
+        self.count += 1
+
+class Metrics:
+    """
+    Tek event loop üzerinde çalıştığımız için sayaçlar kilitsiz düz sözlüklerdir;
+    Prometheus metni yalnızca /metrics istendiğinde üretilir.
+    """
+
+    def __init__(self):
+        self.http: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.http_status: Counter = Counter()
+        self.sql: Dict[str, Histogram] = defaultdict(Histogram)
+        self.commands: Dict[str, Histogram] = defaultdict(Histogram)
+        self.command_errors: Counter = Counter()
+        self.pool_wait = Histogram()
+        self.read_pool_wait = Histogram()
+        self.started = time.time()
+        # scrape anında çağrılır; her alt sistem kendi gauge'larını (ad, değer) listesi olarak verir
+        self.gauges: List[Callable[[], List[Tuple[str, Any]]]] = []
+
+    @staticmethod
+    def _hist_lines(name: str, labels: str, h: Histogram) -> List[str]:
+        sep = "," if labels else ""
+        out = []
+        acc = 0
+        for le, n in zip(LATENCY_BUCKETS, h.counts):
+            acc += n
+            out.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {acc}')
+        out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {h.count}')
+        lab = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{lab} {h.sum:.6f}")
+        out.append(f"{name}_count{lab} {h.count}")
+        return out
+
+    def render(self) -> str:
+        lines = [
+            "# TYPE kapi_http_request_duration_seconds histogram",
+        ]
+        for (route, method), h in sorted(self.http.items()):
+            lines += self._hist_lines("kapi_http_request_duration_seconds", f'route="{route}",method="{method}"', h)
+        lines.append("# TYPE kapi_http_responses_total counter")
+        for (route, method, code), n in sorted(self.http_status.items()):
+            lines.append(f'kapi_http_responses_total{{route="{route}",method="{method}",status="{code}"}} {n}')
+        lines.append("# TYPE kapi_sql_duration_seconds histogram")
+        for name, h in sorted(self.sql.items()):
+            lines += self._hist_lines("kapi_sql_duration_seconds", f'statement="{name}"', h)
+        lines.append("# TYPE kapi_command_duration_seconds histogram")
+        for name, h in sorted(self.commands.items()):
+            lines += self._hist_lines("kapi_command_duration_seconds", f'command="{name}"', h)
+        lines.append("# TYPE kapi_command_errors_total counter")
+        for name, n in sorted(self.command_errors.items()):
+            lines.append(f'kapi_command_errors_total{{command="{name}"}} {n}')
+        lines.append("# TYPE kapi_db_pool_checkout_seconds histogram")
+        lines += self._hist_lines("kapi_db_pool_checkout_seconds", 'pool="write"', self.pool_wait)
+        lines += self._hist_lines("kapi_db_pool_checkout_seconds", 'pool="read"', self.read_pool_wait)
+        # aynı metriğin etiketli satırları tek TYPE başlığı altında gruplanmalı
+        seen = set()
+        for name, value in sorted(self._gauges(), key=lambda g: g[0].split("{", 1)[0]):
+            base = name.split("{", 1)[0]
+            if base not in seen:
+                seen.add(base)
+                lines.append(f"# TYPE {base} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _gauges(self) -> List[Tuple[str, Any]]:
+        g: List[Tuple[str, Any]] = [("kapi_uptime_seconds", round(time.time() - self.started, 1))]
+        for collect in self.gauges:
+            g += collect()
+        return g
+
+metrics = Metrics()
+
+# sabit route'lar endpoint'ten path şablonuna eşlenir (etiket sayısı sınırlı kalsın)
+_route_labels: Dict[Any, str] = {}
+
+def _route_label(scope) -> str:
+    p = scope["path"]
+    if p.startswith(NO_STORE_PREFIXES):
+        return "/" + p.split("/", 2)[1]
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        label = _route_labels.get(endpoint)
+        if label is None:
+            for r in scope["app"].routes:
+                if getattr(r, "endpoint", None) is endpoint:
+                    label = r.path
+                    break
+            _route_labels[endpoint] = label = label or "other"
+        return label
+    if p in asset_index.assets or p in NO_STORE_PATHS:
+        return "static"
+    return "other"
+
+class MetricsMiddleware:
+    """Her HTTP isteğinin süresini ve durum kodunu route şablonuna göre kaydeder."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status_code = 500
+
+        async def send_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            key = (_route_label(scope), scope["method"])
+            metrics.http[key].observe(time.perf_counter() - t0)
+            metrics.http_status[key + (status_code,)] += 1
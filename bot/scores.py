@@ -0,0 +1,706 @@
+# bot/scores.py
+"""
+Skor hattı: geçerli sezonun bellek içi leaderboard'u, en iyi skor önbelleği,
+write-behind skor tamponu, run geçmişinin COPY ile toplu yazımı ve NDJSON/CSV skor importu.
+"""
+import sys
+import csv
+import json
+import asyncio
+import tempfile
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, HTTPException
+from sqlalchemy import text
+
+from bot import db
+from bot.config import (
+    IMPORT_MAX_LINE, IMPORT_SPOOL_MEMORY, LEADERBOARD_CACHE_SIZE, SCORE_FLUSH_INTERVAL_MS,
+    SCORE_FLUSH_MAX_BATCH, RUN_FLUSH_INTERVAL_MS, RUN_FLUSH_MAX_BATCH, RUN_BUFFER_MAX,
+    RUN_RETAIN_MONTHS, BEST_CACHE_SIZE,
+)
+from bot.metrics import metrics
+from bot.db import db_begin, db_read, sql
+
+# =========================
+# LEADERBOARD CACHE
+# =========================
+LbKey = Tuple[int, datetime, int]
+
+def _lb_key(row: Dict[str, Any]) -> LbKey:
+    # ORDER BY best_score DESC, updated_at ASC (+ user_id, eşitlikte sabit sıra için)
+    return (-int(row["best_score"]), row["updated_at"], int(row["user_id"]))
+
+# API'deki leaderboard satırının alanları; upsert/bus satırlarındaki season gibi ekler cache'e girmez
+LB_FIELDS = ("user_id", "username", "best_score", "updated_at")
+
+def _lb_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: row[k] for k in LB_FIELDS}
+
+class LeaderboardCache:
+    """
+    Geçerli sezonun ilk `size` satırının bellekteki sıralı kopyası.
+    Açılışta DB'den doldurulur, post_score'un döndürdüğü satırlarla güncellenir;
+    admin reset'lerinden sonra invalidate edilir ve ilk okumada yeniden yüklenir.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.season = 0
+        self._keys: List[LbKey] = []
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._truncated = False   # tabloda cache dışında kalan satır var mı
+        self._stale = True
+        self._gen = 0             # her invalidate'te artar
+        self._pending: Optional[List[Dict[str, Any]]] = None  # yükleme sırasında gelen yazılar
+        self._lock = asyncio.Lock()
+        self.listeners: List[Callable[[], None]] = []  # ilk sıralar değişmiş olabilir
+        self.version = 0          # ilk sıralar her değiştiğinde artar (render cache anahtarı)
+
+    def _changed(self) -> None:
+        self.version += 1
+        for fn in self.listeners:
+            fn()
+
+    def invalidate(self) -> None:
+        self._gen += 1
+        self._stale = True
+        self._changed()
+
+    async def ensure_loaded(self) -> None:
+        while self._stale:
+            async with self._lock:
+                if not self._stale:
+                    return
+                await self._load()
+
+    async def _load(self) -> None:
+        assert db.engine is not None
+        gen = self._gen
+        season = db.current_season
+        self._pending = []
+        try:
+            async with db_read(fresh=True) as conn:
+                res = await sql(conn, "leaderboard_select", text("""
+                    SELECT user_id, username, best_score, updated_at
+                    FROM scores
+                    WHERE season = :season
+                    ORDER BY best_score DESC, updated_at ASC
+                    LIMIT :lim
+                """), {"season": season, "lim": self.size + 1})
+                rows = [_lb_row(r._mapping) for r in res]
+            self.season = season
+            self._truncated = len(rows) > self.size
+            rows = rows[: self.size]
+            self._rows = {int(r["user_id"]): r for r in rows}
+            self._keys = sorted(_lb_key(r) for r in rows)
+            self._stale = False
+            # SELECT ile bu nokta arasında commit edilen yazıları tekrar uygula
+            for row in self._pending:
+                self._apply(row)
+        finally:
+            self._pending = None
+        if gen != self._gen:
+            self._stale = True
+
+    def apply(self, row: Dict[str, Any]) -> bool:
+        """
+        Upsert'in RETURNING ile döndürdüğü güncel satırı cache'e işler.
+        False: satır cache'teki ilk `size` sırayı etkilemedi (diğer worker'lara duyurmaya gerek yok).
+        """
+        if self._pending is not None:
+            self._pending.append(row)
+        changed = True if self._stale else self._apply(row)
+        if changed:
+            self._changed()
+        return changed
+
+    def _apply(self, row: Dict[str, Any]) -> bool:
+        if row.get("season", self.season) != self.season:
+            return False
+        uid = int(row["user_id"])
+        key = _lb_key(row)
+        old = self._rows.get(uid)
+        if old is not None and old["updated_at"] > row["updated_at"]:
+            # başka worker'dan gecikmeli gelen eski satır
+            return False
+        self._rows.pop(uid, None)
+        if old is not None:
+            old_key = _lb_key(old)
+            del self._keys[bisect_left(self._keys, old_key)]
+            if key > old_key and self._truncated and self._keys and key > self._keys[-1]:
+                # satır geriye kaydı ve cache'in sonuna düştü; dışarıdaki satırlar
+                # onu geçmiş olabilir, bu yüzden sırayı DB'den yeniden kur
+                self.invalidate()
+                return True
+        elif len(self._keys) >= self.size or self._truncated:
+            if not self._keys or key > self._keys[-1]:
+                self._truncated = True
+                return False
+        insort(self._keys, key)
+        self._rows[uid] = _lb_row(row)
+        if len(self._keys) > self.size:
+            dropped = self._keys.pop()
+            del self._rows[dropped[2]]
+            self._truncated = True
+        return True
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return [self._rows[k[2]] for k in self._keys[:limit]]
+
+    def rank_of(self, user_id: int) -> Optional[int]:
+        """Kullanıcı cache'teyse 1 tabanlı sırası, değilse None."""
+        if self._stale:
+            return None
+        row = self._rows.get(user_id)
+        if row is None:
+            return None
+        return bisect_left(self._keys, _lb_key(row)) + 1
+
+leaderboard_cache = LeaderboardCache(LEADERBOARD_CACHE_SIZE)
+
+# =========================
+# BEST SCORE CACHE
+# =========================
+class BestScoreCache:
+    """
+    user_id -> (sezon, best_score, username) LRU'su; upsert'in RETURNING satırlarıyla
+    tembelce dolar. Skor mevcut en iyiyi geçmiyor ve kullanıcı adı aynıysa yazı atlanır.
+    Reset/sezon değişiminde ilgili kayıtlar atılır; atma sırasında uçuşta olan bir
+    yazının dönen (eski) satırı `token` ile reddedilir.
+    Çok worker'da başka worker'ın yükselttiği best burada daha düşük görünebilir;
+    bu yalnızca gereksiz (ama zararsız, GREATEST'li) bir yazıya yol açar.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.skipped = 0
+        self._gen = 0
+        self._data: "OrderedDict[int, Tuple[int, int, Optional[str]]]" = OrderedDict()
+
+    def token(self) -> int:
+        return self._gen
+
+    def is_noop(self, user_id: int, season: int, score: int, username: Optional[str]) -> bool:
+        e = self._data.get(user_id)
+        if e is None or e[0] != season or score > e[1] or username != e[2]:
+            return False
+        self._data.move_to_end(user_id)
+        self.skipped += 1
+        return True
+
+    def update(self, row: Dict[str, Any], token: int) -> None:
+        if self.size <= 0 or token != self._gen:
+            return
+        uid = int(row["user_id"])
+        self._data[uid] = (int(row["season"]), int(row["best_score"]), row["username"])
+        self._data.move_to_end(uid)
+        if len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def discard(self, user_id: Optional[int] = None) -> None:
+        self._gen += 1
+        if user_id is None:
+            self._data.clear()
+        else:
+            self._data.pop(user_id, None)
+
+best_cache = BestScoreCache(BEST_CACHE_SIZE)
+
+# =========================
+# SCORE WRITE BUFFER
+# =========================
+class ScoreWriteBuffer:
+    """
+    SCORE_WRITE_BEHIND açıkken post_score'un yazdığı yer. Her user_id için yalnızca
+    en yüksek skoru tutar; SCORE_FLUSH_INTERVAL_MS dolunca ya da SCORE_FLUSH_MAX_BATCH
+    kullanıcıya ulaşınca hepsini tek bir çok satırlı upsert ile yazar.
+    """
+
+    def __init__(self, interval_ms: int, max_batch: int):
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self._pending: Dict[int, Tuple[Optional[str], int]] = {}
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # leaderboard cache'ini değiştiren satırlar flush sonunda bunlara verilir (ör. diğer worker'lara yayın)
+        self.listeners: List[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = []
+
+    def submit(self, user_id: int, username: Optional[str], score: int) -> None:
+        prev = self._pending.get(user_id)
+        if prev is not None and prev[1] > score:
+            score = prev[1]
+        self._pending[user_id] = (username, score)
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def discard(self, user_id: Optional[int] = None) -> None:
+        # admin reset'inden önce gelmiş, henüz yazılmamış skorlar reset'e dahildir
+        if user_id is None:
+            self._pending.clear()
+        else:
+            self._pending.pop(user_id, None)
+
+    @asynccontextmanager
+    async def exclusive(self, drop: List[int] = ()):
+        """
+        Blok boyunca flush çalışmaz (alınmış bir parti yok, yenisi de alınmaz);
+        `drop` kullanıcılarının bekleyen skorları girişte atılır.
+        """
+        async with self._flush_lock:
+            for uid in drop:
+                self.discard(uid)
+            yield
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending or db.engine is None:
+                return 0
+            batch, self._pending = self._pending, {}
+            taken = time.monotonic()
+            uids = sorted(batch)   # sabit kilit sırası: eşzamanlı flush'lar deadlock'a girmez
+            token = best_cache.token()
+            try:
+                async with db_begin() as conn:
+                    res = await sql(
+                        conn, "score_upsert_batch",
+                        text("""
+                            INSERT INTO scores (season, user_id, username, best_score)
+                            SELECT :season, * FROM unnest(
+                                CAST(:uids AS BIGINT[]),
+                                CAST(:unames AS TEXT[]),
+                                CAST(:scores AS INTEGER[])
+                            )
+                            ON CONFLICT (season, user_id) DO UPDATE
+                            SET username   = EXCLUDED.username,
+                                best_score = GREATEST(scores.best_score, EXCLUDED.best_score),
+                                updated_at = CASE WHEN EXCLUDED.best_score > scores.best_score
+                                                  THEN now() ELSE scores.updated_at END
+                            WHERE scores.reset_at IS NULL
+                               OR scores.reset_at < statement_timestamp() - make_interval(secs => CAST(:age AS DOUBLE PRECISION))
+                            RETURNING user_id, username, best_score, updated_at, season;
+                        """),
+                        {
+                            "season": db.current_season,
+                            # partinin alınma anı DB saatine süre olarak taşınır (sunucu saat farkı etkilemez)
+                            "age": time.monotonic() - taken,
+                            "uids": uids,
+                            "unames": [batch[u][0] for u in uids],
+                            "scores": [batch[u][1] for u in uids],
+                        }
+                    )
+                    rows = [dict(r._mapping) for r in res]
+            except Exception:
+                # yazılamayanları geri koy; bu arada gelen daha yüksek skorlar korunur
+                for uid, (uname, sc) in batch.items():
+                    cur = self._pending.get(uid)
+                    if cur is None:
+                        self._pending[uid] = (uname, sc)
+                    elif cur[1] < sc:
+                        self._pending[uid] = (cur[0], sc)
+                raise
+            for row in rows:
+                best_cache.update(row, token)
+            changed = [row for row in rows if leaderboard_cache.apply(row)]
+            if changed:
+                for fn in self.listeners:
+                    await fn(changed)
+            return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print("score flush error:", e, file=sys.stderr)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # kapanışta son flush; geçici DB hatalarında birkaç kez dene
+        for attempt in range(3):
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                print(f"final score flush error (attempt {attempt + 1}):", e, file=sys.stderr)
+                await asyncio.sleep(0.5)
+        if self._pending:
+            print(f"WARNING: {len(self._pending)} buffered scores were not written.", file=sys.stderr)
+
+score_buffer = ScoreWriteBuffer(SCORE_FLUSH_INTERVAL_MS, SCORE_FLUSH_MAX_BATCH)
+
+# =========================
+# RUN HISTORY
+# =========================
+RUNS_PARTITION_LOCK_KEY = 0x4B415052
+
+def _month_start(y: int, m: int) -> date:
+    return date(y + (m - 1) // 12, (m - 1) % 12 + 1, 1)
+
+class RunLog:
+    """
+    İyileşmeyenler dahil her skor gönderimi. post_score yalnızca belleğe ekler;
+    arka plan görevi birikenleri tek işlemde COPY ile `runs`a yazar ve aynı işlemde
+    user_stats / daily_stats'ı partideki toplamlarla artırır (GROUP BY taraması yok).
+    Hata olursa parti geri konur; işlem atomik olduğu için çift sayım olmaz.
+    """
+
+    def __init__(self, interval_ms: int, max_batch: int, max_pending: int):
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: List[Tuple[datetime, int, int, int]] = []
+        self._months: set = set()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, user_id: int, season: int, score: int) -> None:
+        if len(self._pending) >= self.max_pending:
+            # DB yetişemiyorsa bellek sınırsız büyümesin
+            self.dropped += 1
+            return
+        self._pending.append((datetime.now(timezone.utc), user_id, season, score))
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    async def ensure_partitions(self, months) -> None:
+        missing = sorted(m for m in set(months) if m not in self._months)
+        if not missing:
+            return
+        async with db_begin() as conn:
+            # worker'lar aynı bölümü aynı anda açmaya çalışmasın
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": RUNS_PARTITION_LOCK_KEY})
+            for y, m in missing:
+                lo, hi = _month_start(y, m), _month_start(y, m + 1)
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS runs_{y:04d}{m:02d} PARTITION OF runs "
+                    f"FOR VALUES FROM ('{lo} 00:00+00') TO ('{hi} 00:00+00')"
+                ))
+            if RUN_RETAIN_MONTHS > 0:
+                y, m = missing[-1]
+                cutoff = _month_start(y, m - RUN_RETAIN_MONTHS + 1)
+                res = await conn.execute(text("""
+                    SELECT c.relname FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'runs'::regclass
+                """))
+                for (name,) in res.all():
+                    suffix = name[len("runs_"):]
+                    if suffix.isdigit() and len(suffix) == 6 and _month_start(int(suffix[:4]), int(suffix[4:])) < cutoff:
+                        await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                # DAU tablosu da aynı pencereyle budanır; yoksa her gün oyuncu başına bir satır birikir
+                await conn.execute(text("DELETE FROM user_days WHERE day < :cutoff"), {"cutoff": cutoff})
+        self._months.update(missing)
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._pending or db.engine is None:
+                return 0
+            batch = self._pending[: self.max_batch]
+            del self._pending[: len(batch)]
+            users: Dict[Tuple[int, int], List[Any]] = {}
+            days: Dict[date, List[int]] = {}
+            day_users = set()
+            for at, uid, season, score in batch:
+                u = users.get((season, uid))
+                if u is None:
+                    users[(season, uid)] = [1, score, at]
+                else:
+                    u[0] += 1
+                    u[1] += score
+                    u[2] = max(u[2], at)
+                d = days.setdefault(at.date(), [0, 0])
+                d[0] += 1
+                d[1] += score
+                day_users.add((at.date(), uid))
+            try:
+                await self.ensure_partitions((d.year, d.month) for d in days)
+                async with db_begin() as conn:
+                    t0 = time.perf_counter()
+                    raw = await conn.get_raw_connection()
+                    async with raw.driver_connection.cursor() as cur:
+                        async with cur.copy("COPY runs (played_at, user_id, season, score) FROM STDIN") as cp:
+                            for row in batch:
+                                await cp.write_row(row)
+                    metrics.sql["runs_copy"].observe(time.perf_counter() - t0)
+                    # eşzamanlı flush'lar (diğer worker'lar) satırları aynı sırayla kilitlesin: deadlock olmaz
+                    keys = sorted(users)
+                    await sql(conn, "user_stats_upsert", text("""
+                        INSERT INTO user_stats (season, user_id, runs, total, last_played)
+                        SELECT * FROM unnest(
+                            CAST(:seasons AS INTEGER[]),
+                            CAST(:uids AS BIGINT[]),
+                            CAST(:runs AS BIGINT[]),
+                            CAST(:totals AS BIGINT[]),
+                            CAST(:lasts AS TIMESTAMPTZ[])
+                        )
+                        ON CONFLICT (season, user_id) DO UPDATE
+                        SET runs        = user_stats.runs + EXCLUDED.runs,
+                            total       = user_stats.total + EXCLUDED.total,
+                            last_played = GREATEST(user_stats.last_played, EXCLUDED.last_played);
+                    """), {
+                        "seasons": [k[0] for k in keys],
+                        "uids": [k[1] for k in keys],
+                        "runs": [users[k][0] for k in keys],
+                        "totals": [users[k][1] for k in keys],
+                        "lasts": [users[k][2] for k in keys],
+                    })
+                    dl = sorted(days)
+                    pairs = sorted(day_users)
+                    await sql(conn, "daily_stats_upsert", text("""
+                        WITH fresh AS (
+                            INSERT INTO user_days (day, user_id)
+                            SELECT * FROM unnest(CAST(:pdays AS DATE[]), CAST(:puids AS BIGINT[]))
+                            ON CONFLICT DO NOTHING
+                            RETURNING day
+                        ), firsts AS (
+                            SELECT day, count(*) AS n FROM fresh GROUP BY day
+                        )
+                        INSERT INTO daily_stats (day, players, runs, total)
+                        SELECT d.day, COALESCE(f.n, 0), d.runs, d.total
+                        FROM unnest(
+                            CAST(:days AS DATE[]), CAST(:runs AS BIGINT[]), CAST(:totals AS BIGINT[])
+                        ) AS d(day, runs, total)
+                        LEFT JOIN firsts f ON f.day = d.day
+                        ON CONFLICT (day) DO UPDATE
+                        SET players = daily_stats.players + EXCLUDED.players,
+                            runs    = daily_stats.runs + EXCLUDED.runs,
+                            total   = daily_stats.total + EXCLUDED.total;
+                    """), {
+                        "pdays": [p[0] for p in pairs],
+                        "puids": [p[1] for p in pairs],
+                        "days": dl,
+                        "runs": [days[d][0] for d in dl],
+                        "totals": [days[d][1] for d in dl],
+                    })
+            except Exception:
+                # yazılamayan partiyi başa geri koy (sınırı aşan kısım düşer)
+                self._pending[:0] = batch
+                over = len(self._pending) - self.max_pending
+                if over > 0:
+                    del self._pending[-over:]
+                    self.dropped += over
+                raise
+            if self._pending:
+                self._wake.set()
+            return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print("run history flush error:", e, file=sys.stderr)
+                await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for attempt in range(3):
+            try:
+                while await self.flush():
+                    pass
+                return
+            except Exception as e:
+                print(f"final run history flush error (attempt {attempt + 1}):", e, file=sys.stderr)
+                await asyncio.sleep(0.5)
+        if self._pending:
+            print(f"WARNING: {len(self._pending)} buffered runs were not written.", file=sys.stderr)
+
+run_log = RunLog(RUN_FLUSH_INTERVAL_MS, RUN_FLUSH_MAX_BATCH, RUN_BUFFER_MAX)
+
+# =========================
+# SCORE IMPORT
+# =========================
+SCORE_INT_MAX = 2**31 - 1   # scores.best_score INTEGER
+
+async def request_lines(request: Request):
+    # gövde geldikçe satırlara bölünür; bellekte yalnızca yarım kalan son satır durur
+    buf = b""
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buf) > IMPORT_MAX_LINE:
+            raise HTTPException(status_code=400, detail=f"line longer than {IMPORT_MAX_LINE} bytes")
+    if buf:
+        yield buf
+
+class ScoreImportParser:
+    """
+    Export'un ürettiği NDJSON/CSV satırlarını (user_id, username, best_score) demetine çevirir.
+    CSV'de başlık satırı varsa sütunlar adla, yoksa user_id,username,best_score sırasıyla okunur.
+    NDJSON'da "score" da kabul edilir. Okunamayan satırlar sayılıp atlanır.
+    """
+
+    def __init__(self, fmt: str):
+        self.fmt = fmt
+        self.lineno = 0
+        self.rows = 0
+        self.rejected = 0
+        self.first_error: Optional[str] = None
+        self._columns: Optional[Dict[str, int]] = None
+
+    def _reject(self, why: str) -> None:
+        self.rejected += 1
+        if self.first_error is None:
+            self.first_error = f"line {self.lineno}: {why}"
+
+    def parse(self, raw: bytes) -> Optional[Tuple[int, Optional[str], int]]:
+        self.lineno += 1
+        try:
+            line = raw.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            self._reject("not utf-8")
+            return None
+        if self.lineno == 1:
+            line = line.lstrip("\ufeff")
+        if not line:
+            return None
+        try:
+            if self.fmt == "csv":
+                fields = next(csv.reader([line]))
+                if self._columns is None:
+                    names = [f.strip().lower() for f in fields]
+                    if "user_id" in names:
+                        self._columns = {n: i for i, n in enumerate(names)}
+                        return None
+                    self._columns = {"user_id": 0, "username": 1, "best_score": 2}
+                c = self._columns
+                uid = fields[c["user_id"]]
+                uname = fields[c["username"]] if "username" in c and c["username"] < len(fields) else ""
+                score = fields[c["best_score"]]
+            else:
+                obj = json.loads(line)
+                uid = obj["user_id"]
+                uname = obj.get("username") or ""
+                score = obj["best_score"] if "best_score" in obj else obj["score"]
+            uid, score = int(uid), int(score)
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError) as e:
+            self._reject(type(e).__name__)
+            return None
+        if uid <= 0 or not 0 <= score <= SCORE_INT_MAX:
+            self._reject("out of range")
+            return None
+        self.rows += 1
+        return uid, (str(uname).strip() or None), score
+
+def copy_field(v: Any) -> str:
+    # COPY text biçimi: NULL \N, ters bölü/sekme/satır sonu kaçışlı
+    if v is None:
+        return "\\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+async def spool_import(request: Request, parser: ScoreImportParser):
+    """
+    Gövdeyi istemcinin hızında okur, geçerli satırları COPY text biçiminde geçici dosyaya
+    yazar. Yavaş bir yükleme bu sırada DB bağlantısı ya da açık transaction tutmaz.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MEMORY)
+    try:
+        out: List[str] = []
+        async for line in request_lines(request):
+            row = parser.parse(line)
+            if row is not None:
+                out.append("\t".join(copy_field(v) for v in row))
+            if len(out) >= 1000:
+                spool.write(("\n".join(out) + "\n").encode("utf-8"))
+                out.clear()
+        if out:
+            spool.write(("\n".join(out) + "\n").encode("utf-8"))
+        spool.seek(0)
+        return spool
+    except BaseException:
+        spool.close()
+        raise
+
+async def merge_import(spool, season: int) -> int:
+    """Biriktirilen satırları tek transaction'da COPY + upsert ile yazar; değişen satır sayısı."""
+    async with db_begin() as conn:
+        await sql(conn, "import_stage", text("""
+            CREATE TEMP TABLE score_import (
+                user_id    BIGINT  NOT NULL,
+                username   TEXT,
+                best_score INTEGER NOT NULL
+            ) ON COMMIT DROP
+        """))
+        t0 = time.perf_counter()
+        raw = await conn.get_raw_connection()
+        async with raw.driver_connection.cursor() as cur:
+            async with cur.copy("COPY score_import (user_id, username, best_score) FROM STDIN") as cp:
+                while True:
+                    block = spool.read(256 * 1024)
+                    if not block:
+                        break
+                    await cp.write(block)
+        metrics.sql["import_copy"].observe(time.perf_counter() - t0)
+        # aynı kullanıcı dosyada birden çok kez geçebilir: en yüksek skor ve onun adı alınır
+        res = await sql(conn, "import_merge", text("""
+            INSERT INTO scores (season, user_id, username, best_score)
+            SELECT :season, user_id,
+                   (array_agg(username ORDER BY best_score DESC) FILTER (WHERE username IS NOT NULL))[1],
+                   max(best_score)
+            FROM score_import
+            GROUP BY user_id
+            ORDER BY user_id
+            ON CONFLICT (season, user_id) DO UPDATE
+            SET username   = COALESCE(EXCLUDED.username, scores.username),
+                best_score = GREATEST(scores.best_score, EXCLUDED.best_score),
+                updated_at = CASE WHEN EXCLUDED.best_score > scores.best_score
+                                  THEN now() ELSE scores.updated_at END
+            WHERE EXCLUDED.best_score > scores.best_score
+               OR (EXCLUDED.username IS NOT NULL AND EXCLUDED.username IS DISTINCT FROM scores.username)
+        """), {"season": season})
+        return res.rowcount or 0
+
+# =========================
+# GAUGES
+# =========================
+def _gauges() -> List[Tuple[str, Any]]:
+    return [
+        ("kapi_leaderboard_cache_rows", len(leaderboard_cache._keys)),
+        ("kapi_best_cache_entries", len(best_cache._data)),
+        ("kapi_score_writes_skipped", best_cache.skipped),
+        ("kapi_run_log_pending", len(run_log._pending)),
+        ("kapi_run_log_dropped", run_log.dropped),
+    ]
+
+metrics.gauges.append(_gauges)
@@ -1,4 +1,7 @@
 ﻿import os
+import sys
+import time
+import asyncio
 from fastapi import FastAPI, Request, Header, HTTPException
 import httpx
 
@@ -7,19 +10,113 @@ GAME_SHORT_NAME = os.getenv("GAME_SHORT_NAME", "kapi_run")
 PUBLIC_GAME_URL = os.getenv("PUBLIC_GAME_URL", "")
 SECRET = os.getenv("SECRET", "")
 
-TELEGRAM_API = f"https://api.telegram.org/bot{BOT_TOKEN}"
+# yerel test için Bot API adresi değiştirilebilir (ör. http://127.0.0.1:8081)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+TELEGRAM_API = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}"
+
+TG_MAX_CONNECTIONS = max(1, int(os.getenv("TG_MAX_CONNECTIONS", "20")))
+TG_RATE = max(1.0, float(os.getenv("TG_RATE", "30")))        # saniyede en fazla istek (Bot API genel sınırı)
+TG_MAX_RETRIES = max(0, int(os.getenv("TG_MAX_RETRIES", "3")))
 
 app = FastAPI()
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "tg_inflight": len(sender.inflight)}
+
+class TgSender:
+    """
+    Paylaşılan keep-alive httpx istemcisiyle Bot API çağrıları.
+    - Aynı sohbete giden çağrılar sırayla, farklı sohbetlerinkiler eşzamanlı gider.
+    - Saniyede TG_RATE isteği aşmaz; 429 gelirse retry_after kadar tüm gönderimler bekler.
+    """
+
+    def __init__(self):
+        self.client: httpx.AsyncClient | None = None
+        self.inflight: set = set()
+        self._chains: dict = {}         # chat_id -> o sohbetin son gönderim task'ı
+        self._paused_until = 0.0
+        self._next_slot = 0.0
+        self._slots = asyncio.Semaphore(TG_MAX_CONNECTIONS)
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            timeout=15,
+            limits=httpx.Limits(max_connections=TG_MAX_CONNECTIONS, max_keepalive_connections=TG_MAX_CONNECTIONS),
+        )
+
+    async def stop(self, timeout: float = 10.0):
+        if self.inflight:
+            await asyncio.wait(list(self.inflight), timeout=timeout)
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _wait_turn(self):
+        now = time.monotonic()
+        start = max(now, self._paused_until, self._next_slot)
+        self._next_slot = start + 1.0 / TG_RATE
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def call(self, method: str, payload: dict) -> dict:
+        assert self.client is not None
+        url = f"{TELEGRAM_API}/{method}"
+        for attempt in range(TG_MAX_RETRIES + 1):
+            await self._wait_turn()
+            try:
+                async with self._slots:
+                    r = await self.client.post(url, json=payload)
+                data = r.json()
+            except (httpx.TransportError, ValueError) as e:
+                if attempt == TG_MAX_RETRIES:
+                    raise
+                print(f"tg {method} error:", e, file=sys.stderr)
+                await asyncio.sleep(0.5 * (attempt + 1))
+                continue
+            retry_after = (data.get("parameters") or {}).get("retry_after")
+            if r.status_code == 429 and retry_after and attempt < TG_MAX_RETRIES:
+                self._paused_until = max(self._paused_until, time.monotonic() + float(retry_after))
+                continue
+            return data
+
+    def submit(self, method: str, payload: dict, chat_id=None) -> asyncio.Task:
+        """Çağrıyı arka planda gönderir; chat_id verilirse o sohbetin önceki çağrılarından sonra."""
+        prev = self._chains.get(chat_id) if chat_id is not None else None
+
+        async def run():
+            if prev is not None:
+                await asyncio.gather(prev, return_exceptions=True)
+            try:
+                data = await self.call(method, payload)
+                if not data.get("ok"):
+                    print(f"tg {method} failed:", data, file=sys.stderr)
+                return data
+            except Exception as e:
+                print(f"tg {method} error:", e, file=sys.stderr)
+            finally:
+                if chat_id is not None and self._chains.get(chat_id) is task:
+                    del self._chains[chat_id]
+
+        task = asyncio.create_task(run())
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+        if chat_id is not None:
+            self._chains[chat_id] = task
+        return task
+
+sender = TgSender()
+
+@app.on_event("startup")
+async def on_startup():
+    await sender.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await sender.stop()
 
 async def tg(method: str, payload: dict):
-    url = f"{TELEGRAM_API}/{method}"
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.post(url, json=payload)
-        return r.json()
+    return await sender.call(method, payload)
 
 @app.post("/telegram/webhook")
 async def telegram_webhook(request: Request,
@@ -34,25 +131,26 @@ async def telegram_webhook(request: Request,
         chat_id = message["chat"]["id"]
         text = (message.get("text") or "").strip()
 
+        # webhook hemen 200 döner; gönderimler sohbet sırası korunarak arka planda gider
         if text.startswith("/start"):
-            await tg("sendGame", {"chat_id": chat_id, "game_short_name": GAME_SHORT_NAME})
+            sender.submit("sendGame", {"chat_id": chat_id, "game_short_name": GAME_SHORT_NAME}, chat_id)
             if PUBLIC_GAME_URL:
-                await tg("sendMessage", {
+                sender.submit("sendMessage", {
                     "chat_id": chat_id,
                     "text": "Oyunu açmak için düğmeye tıkla 👇",
                     "reply_markup": {
                         "inline_keyboard": [[{"text": "🎮 KAPI RUN", "url": PUBLIC_GAME_URL}]]
                     }
-                })
+                }, chat_id)
             return {"ok": True}
 
-        await tg("sendMessage", {"chat_id": chat_id, "text": "Merhaba! /start yazarak oyunu başlatabilirsin."})
+        sender.submit("sendMessage", {"chat_id": chat_id, "text": "Merhaba! /start yazarak oyunu başlatabilirsin."}, chat_id)
         return {"ok": True}
 
     callback_query = update.get("callback_query")
     if callback_query:
         cq_id = callback_query["id"]
-        await tg("answerCallbackQuery", {"callback_query_id": cq_id})
+        sender.submit("answerCallbackQuery", {"callback_query_id": cq_id})
         return {"ok": True}
 
     return {"ok": True}
@@ -0,0 +1,71 @@
+# tests/conftest.py
+"""
+Ortak fixture'lar. bot.main import edilirken ENV okunduğu için ayarlar burada,
+import'tan önce yapılır; DB gereken testler bench'in bellek içi sahte motorunu kullanır.
+"""
+import os
+import sys
+import asyncio
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.bench import BENCH_ADMIN, BENCH_BOT_TOKEN, BENCH_SECRET  # noqa: E402
+
+os.environ["TELEGRAM_BOT_TOKEN"] = BENCH_BOT_TOKEN
+os.environ["SECRET"] = BENCH_SECRET
+os.environ["SECRET_ADMIN"] = BENCH_ADMIN
+os.environ["DATABASE_URL"] = "postgresql+psycopg://fake/test"
+os.environ["RUN_HISTORY"] = "0"
+for name in ("RATE_LIMIT_SCORE", "RATE_LIMIT_SCORE_IP", "RATE_LIMIT_WEBHOOK"):
+    os.environ[name] = "0"
+
+import bot.main as main  # noqa: E402
+from bot import assets as bot_assets  # noqa: E402
+
+@pytest.fixture
+def assets(monkeypatch):
+    """Repo kökündeki oyun dosyalarından kurulmuş (paylaşılan) asset indeksi."""
+    monkeypatch.chdir(ROOT)
+    bot_assets.asset_index.build()
+    return bot_assets.asset_index
+
+@pytest.fixture
+def client(assets):
+    from starlette.testclient import TestClient
+    # lifespan çalıştırılmaz: statik katman DB ve Telegram olmadan yanıt verir
+    return TestClient(main.app)
+
+@pytest.fixture(scope="session")
+def loop():
+    # modül düzeyindeki kilit/event'ler ilk beklemede bir loop'a bağlanır: tüm testler aynı loop'ta koşar
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest.fixture
+def run(loop):
+    return loop.run_until_complete
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """bench'in bellek içi sahte DB'si; skor singleton'ları test öncesi ve sonrası boşaltılır."""
+    from bench.bench import FakeDatabase, FakeEngine
+    from bot import db
+    from bot.scores import best_cache, leaderboard_cache, score_buffer
+
+    def reset():
+        score_buffer.discard()
+        best_cache.discard()
+        leaderboard_cache.invalidate()
+
+    fake = FakeDatabase(0, 15)
+    engine = FakeEngine(fake)
+    monkeypatch.setattr(db, "engine", engine)
+    monkeypatch.setattr(db, "read_engine", engine)
+    monkeypatch.setattr(db, "current_season", fake.season)
+    reset()
+    yield fake
+    reset()
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from bench.bench import BENCH_ADMIN
+from bot.scores import ScoreImportParser, copy_field, leaderboard_cache, score_buffer
+
+import bot.main as main
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def _put(fake, uid, score, uname=None):
+    fake.scores[(fake.season, uid)] = {"user_id": uid, "username": uname or f"u{uid}",
+                                       "best_score": score, "updated_at": T0, "season": fake.season}
+
+def _best(fake, uid):
+    return fake.scores[(fake.season, uid)]["best_score"]
+
+# ---- reset ile tampondaki skorların sırası ----
+
+def test_reset_drops_pending_buffered_score(run, fake_db):
+    _put(fake_db, 1, 50)
+
+    async def go():
+        score_buffer.submit(1, "u1", 100)
+        assert await main.reset_users([1]) == 1
+        assert await score_buffer.flush() == 0
+        assert _best(fake_db, 1) == 0
+
+    run(go())
+
+def test_reset_waits_for_in_flight_flush(run, fake_db):
+    _put(fake_db, 1, 50)
+    fake_db.latency = 0.02
+
+    async def go():
+        score_buffer.submit(1, "u1", 100)
+        flush = asyncio.ensure_future(score_buffer.flush())
+        await asyncio.sleep(0)
+        # parti alındı, upsert yolda: reset onun commit'ini bekler ve sonra sıfırlar
+        reset = asyncio.ensure_future(main.reset_users([1]))
+        assert await flush == 1
+        assert not reset.done()
+        assert await reset == 1
+        assert _best(fake_db, 1) == 0
+        await leaderboard_cache.ensure_loaded()
+        assert leaderboard_cache.top(1)[0]["best_score"] == 0
+
+    run(go())
+
+def test_score_after_reset_is_kept(run, fake_db):
+    _put(fake_db, 1, 50)
+
+    async def go():
+        await main.reset_users([1])
+        await asyncio.sleep(0.01)
+        score_buffer.submit(1, "u1", 30)
+        assert await score_buffer.flush() == 1
+        assert _best(fake_db, 1) == 30
+
+    run(go())
+
+def test_batch_taken_before_reset_is_skipped(run, fake_db, monkeypatch):
+    # başka bir worker'ın reset'ten önce aldığı parti: age reset anının gerisine düşer
+    _put(fake_db, 1, 50)
+    _put(fake_db, 2, 10)
+
+    async def go():
+        await main.reset_users([1])
+        score_buffer.submit(1, "u1", 100)
+        score_buffer.submit(2, "u2", 20)
+        # flush'ın partiyi alış anı (ilk monotonic çağrısı) bir dakika geriye çekilir
+        real = time.monotonic
+        taken = [real() - 60]
+        monkeypatch.setattr(time, "monotonic", lambda: taken.pop() if taken else real())
+        assert await score_buffer.flush() == 1
+        assert _best(fake_db, 1) == 0
+        assert _best(fake_db, 2) == 20
+
+    run(go())
+
+# ---- import ----
+
+def test_import_parser_ndjson():
+    p = ScoreImportParser("ndjson")
+    lines = [b'\xef\xbb\xbf{"user_id": 1, "username": " ada ", "best_score": 5}',
+             b'{"user_id": "2", "score": 7}', b"", b"not json", b'{"user_id": 3, "best_score": -1}',
+             b'\xff']
+    assert [p.parse(x) for x in lines] == [(1, "ada", 5), (2, None, 7), None, None, None, None]
+    assert (p.rows, p.rejected) == (2, 3)
+    assert p.first_error == "line 4: JSONDecodeError"
+
+def test_import_parser_csv_header_and_positional():
+    p = ScoreImportParser("csv")
+    assert p.parse(b"best_score,user_id") is None
+    assert p.parse(b"9,4") == (4, None, 9)
+    q = ScoreImportParser("csv")
+    assert q.parse(b'5,"a, b",12') == (5, "a, b", 12)
+    assert q.parse(b"6,x") is None and q.rejected == 1
+
+def test_copy_field_escapes_round_trip():
+    from bench.bench import _copy_unescape
+    tricky = 'tab\there\nnew\\line\rx\\N'
+    assert copy_field(None) == "\\N"
+    assert copy_field(tricky) == 'tab\\there\\nnew\\\\line\\rx\\\\N'
+    assert _copy_unescape(copy_field(tricky)) == tricky
+    assert _copy_unescape(copy_field(None)) is None
+
+async def _post_import(body_lines, **params):
+    async def body():
+        # satırlar parça sınırlarına denk gelmesin diye gövde küçük parçalarla gönderilir
+        data = "\n".join(body_lines).encode("utf-8")
+        for i in range(0, len(data), 7):
+            yield data[i: i + 7]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.post("/api/admin/import", params=params, content=body(),
+                            headers={"X-Admin-Token": params.pop("token", BENCH_ADMIN)})
+
+def test_import_merges_by_max_score(run, fake_db):
+    _put(fake_db, 1, 50, "old")
+    _put(fake_db, 4, 70, "same")
+    lines = [
+        json.dumps({"user_id": 1, "username": "new", "best_score": 40}),   # yalnız ad değişir
+        json.dumps({"user_id": 2, "username": "low", "best_score": 10}),
+        json.dumps({"user_id": 2, "username": "tab\there", "best_score": 30}),
+        json.dumps({"user_id": 2, "best_score": 20}),
+        json.dumps({"user_id": 3, "best_score": 5}),                        # yeni, adsız
+        json.dumps({"user_id": 4, "username": "same", "best_score": 70}),   # değişiklik yok
+        "garbage",
+    ]
+
+    async def go():
+        await leaderboard_cache.ensure_loaded()
+        r = await _post_import(lines)
+        assert r.status_code == 200, r.text
+        assert r.json() == {"ok": True, "season": 1, "rows": 6, "merged": 3,
+                            "rejected": 1, "first_error": "line 7: JSONDecodeError"}
+        s = fake_db.scores
+        assert (s[(1, 1)]["username"], s[(1, 1)]["best_score"]) == ("new", 50)
+        assert (s[(1, 2)]["username"], s[(1, 2)]["best_score"]) == ("tab\there", 30)
+        assert (s[(1, 3)]["username"], s[(1, 3)]["best_score"]) == (None, 5)
+        assert s[(1, 4)]["updated_at"] == T0
+        # import cache'i geçersiz kılar: yeniden yüklenen sıralama DB ile aynı
+        await leaderboard_cache.ensure_loaded()
+        assert [r["user_id"] for r in leaderboard_cache.top(10)] == [4, 1, 2, 3]
+
+    run(go())
+
+@pytest.mark.parametrize("params,status", [({"season": 9}, 404), ({"format": "xml"}, 400), ({"token": "nope"}, 403)])
+def test_import_rejects_bad_requests(run, fake_db, params, status):
+    async def go():
+        r = await _post_import(['{"user_id": 1, "best_score": 1}'], **params)
+        assert r.status_code == status
+        assert fake_db.scores == {}
+
+    run(go())
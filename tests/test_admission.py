@@ -0,0 +1,210 @@
+import asyncio
+
+import pytest
+
+from bot import admission as bot_admission
+from bot.admission import AdmissionController
+from bot.config import WEBHOOK_PATH
+
+def _scope(path, method="GET"):
+    return {"type": "http", "path": path, "method": method, "headers": [], "query_string": b""}
+
+def _ctl(capacity=10, queue=8):
+    return AdmissionController(capacity, queue, 100, 100)
+
+async def _settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+def test_classify(assets):
+    c = _ctl()
+    cls = lambda path, method="GET": getattr(c.classify(_scope(path, method)), "name", None)  # noqa: E731
+    assert cls(WEBHOOK_PATH, "POST") == "webhook"
+    assert cls("/api/score", "POST") == "score"
+    assert cls("/api/leaderboard") == "read"
+    assert cls("/api/leaderboard/live") is None
+    assert cls("/api/admin/import", "POST") is None
+    # bellekten sunulanlar ve giriş dosyaları hiç sınıflandırılmaz
+    assert cls("/") is None
+    assert cls("/media/music.webm") is None
+    assert cls("/sw.js") is None
+    assert cls("/media/not-in-index.webm") == "static"
+    assert cls("/media/not-in-index.webm", "POST") is None
+
+def test_class_limits_follow_share(run):
+    c = _ctl(capacity=10)
+    read, score = c.classes["read"], c.classes["score"]
+
+    async def go():
+        for _ in range(7):
+            assert await c.acquire(read)
+        waiter = asyncio.ensure_future(c.acquire(read))
+        await _settle()
+        assert not waiter.done() and len(read.waiting) == 1
+        # üst sınıfın payı daha büyük: okuma kuyruktayken skor yine girer
+        assert await c.acquire(score)
+        assert c.inflight == 8
+        c.release(score)
+        c.release(read)
+        assert await waiter
+        assert c.inflight == 7 and read.inflight == 7 and not read.waiting
+
+    run(go())
+
+def test_queue_full_sheds_newcomer_of_same_or_lower_priority(run):
+    c = _ctl(capacity=1, queue=1)
+    read, static = c.classes["read"], c.classes["static"]
+
+    async def go():
+        assert await c.acquire(read)
+        waiter = asyncio.ensure_future(c.acquire(read))
+        await _settle()
+        assert not await c.acquire(read)
+        assert not await c.acquire(static)
+        assert read.shed == 1 and static.shed == 1
+        c.release(read)
+        assert await waiter
+        c.release(read)
+        assert c.inflight == 0
+
+    run(go())
+
+def test_higher_priority_evicts_lowest_waiter(run):
+    c = _ctl(capacity=1, queue=1)
+    read, static, score = c.classes["read"], c.classes["static"], c.classes["score"]
+
+    async def go():
+        assert await c.acquire(read)
+        low = asyncio.ensure_future(c.acquire(static))
+        await _settle()
+        high = asyncio.ensure_future(c.acquire(score))
+        await _settle()
+        assert low.done() and low.result() is False
+        assert static.shed == 1 and not static.waiting
+        c.release(read)
+        assert await high
+        c.release(score)
+        assert c.inflight == 0
+
+    run(go())
+
+def test_release_wakes_by_priority(run):
+    c = _ctl(capacity=1, queue=8)
+    read, static, webhook = c.classes["read"], c.classes["static"], c.classes["webhook"]
+
+    async def go():
+        assert await c.acquire(read)
+        order = []
+
+        async def want(cls):
+            assert await c.acquire(cls)
+            order.append(cls.name)
+
+        tasks = [asyncio.ensure_future(want(static)), asyncio.ensure_future(want(webhook))]
+        await _settle()
+        c.release(read)
+        await _settle()
+        assert order == ["webhook"]
+        c.release(webhook)
+        await asyncio.gather(*tasks)
+        assert order == ["webhook", "static"]
+        c.release(static)
+        assert c.inflight == 0
+
+    run(go())
+
+def test_wait_timeout_sheds_without_leaking(run):
+    c = _ctl(capacity=1, queue=8)
+    read = c.classes["read"]
+    read.max_wait = 0.01
+
+    async def go():
+        assert await c.acquire(read)
+        assert not await c.acquire(read)
+        assert read.shed == 1 and not read.waiting
+        c.release(read)
+        assert c.inflight == 0 and read.inflight == 0
+
+    run(go())
+
+def test_slot_granted_as_wait_times_out_is_kept(run, monkeypatch):
+    c = _ctl(capacity=1, queue=8)
+    read = c.classes["read"]
+
+    async def grant_then_timeout(fut, timeout):
+        # _wake yeri tam süre dolarken verir; wait_for yine de TimeoutError fırlatır
+        c.release(read)
+        assert fut.done() and fut.result() is True
+        raise asyncio.TimeoutError
+
+    async def go():
+        assert await c.acquire(read)
+        monkeypatch.setattr(bot_admission.asyncio, "wait_for", grant_then_timeout)
+        assert await c.acquire(read)
+        assert c.inflight == 1 and read.inflight == 1 and read.shed == 0
+        c.release(read)
+        assert c.inflight == 0
+
+    run(go())
+
+@pytest.mark.parametrize("granted", [False, True])
+def test_cancelled_waiter_releases_or_discards(run, granted):
+    c = _ctl(capacity=1, queue=8)
+    read = c.classes["read"]
+
+    async def go():
+        assert await c.acquire(read)
+        waiter = asyncio.ensure_future(c.acquire(read))
+        await _settle()
+        if granted:
+            c.release(read)   # yer verildi ama görev devam etmeden istemci koptu
+        waiter.cancel()
+        try:
+            kept = await waiter
+        except asyncio.CancelledError:
+            kept = False
+        else:
+            # 3.11 wait_for'u sonuç hazırsa iptali yutar: yer çağırana geçer, onu bırakmak ona düşer
+            assert granted and kept
+        assert not read.waiting
+        assert c.inflight == (1 if kept or not granted else 0)
+        if c.inflight:
+            c.release(read)
+        assert c.inflight == 0 and read.inflight == 0
+
+    run(go())
+
+def test_middleware_rejects_with_retry_after(run, monkeypatch):
+    c = _ctl(capacity=1, queue=0)
+    monkeypatch.setattr(bot_admission, "admission", c)
+    gate = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    mw = bot_admission.AdmissionMiddleware(app)
+
+    async def call(path):
+        sent = []
+
+        async def send(m):
+            sent.append(m)
+
+        await mw(_scope(path), None, send)
+        return sent
+
+    async def go():
+        first = asyncio.ensure_future(call("/api/leaderboard"))
+        await _settle()
+        c.scale = 0.25
+        rejected = await call("/api/leaderboard")
+        start = rejected[0]
+        assert start["status"] == 503
+        assert dict(start["headers"])[b"retry-after"] == b"4"
+        gate.set()
+        assert (await first)[0]["status"] == 200
+        assert c.inflight == 0
+
+    run(go())
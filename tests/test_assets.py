@@ -0,0 +1,154 @@
+import os
+import re
+
+from bot.assets import StaticRouteTable, _accepted_encodings, _etag_matches, _parse_range, _pick_encoding
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_page_references_are_served_immutable(client):
+    page = client.get("/").text
+    refs = re.findall(r'(?:src|href)="\./([^"]+\?v=[^"]+)"', page)
+    assert "style.css" in " ".join(refs)
+    for ref in refs:
+        r = client.get("/" + ref)
+        assert r.status_code == 200, ref
+        if ref.startswith("appmanifest.json"):   # URL'i sabit, her açılışta doğrulanır
+            assert r.headers["cache-control"] == "no-cache"
+        else:
+            assert "immutable" in r.headers["cache-control"], ref
+
+def test_script_loader_url_is_hash_versioned(client, assets):
+    page = client.get("/index.html").text
+    h = assets.assets["/scripts/main.js"].hash
+    assert f'"./scripts/main.js?v={h}"' in page
+    assert "immutable" in client.get(f"/scripts/main.js?v={h}").headers["cache-control"]
+    assert client.get("/scripts/main.js?v=old").headers["cache-control"] == "no-cache"
+
+def test_manifest_file_list_matches_page_urls(client, assets):
+    manifest = client.get("/offline.json").json()
+    css = "style.css?v=" + assets.assets["/style.css"].hash
+    assert css in manifest["fileList"]
+    assert css in manifest["files"]
+    assert css in client.get("/").text
+
+MEDIA = "/media/music.webm"
+
+def test_parse_range():
+    assert _parse_range("bytes=0-99", 1000) == (0, 99)
+    assert _parse_range("bytes=900-", 1000) == (900, 999)
+    assert _parse_range("bytes=-100", 1000) == (900, 999)
+    assert _parse_range("bytes=-5000", 1000) == (0, 999)
+    assert _parse_range("bytes=500-5000", 1000) == (500, 999)
+    assert _parse_range("bytes=1000-", 1000) == (-1, -1)
+    assert _parse_range("bytes=1000-900", 1000) == (-1, -1)
+    assert _parse_range("bytes=-0", 1000) == (-1, -1)
+    # geçersiz ya da çok aralıklı: tam yanıt
+    assert _parse_range("bytes=5-1", 1000) is None
+    assert _parse_range("bytes=0-1,5-9", 1000) is None
+    assert _parse_range("items=0-1", 1000) is None
+    assert _parse_range("bytes=a-b", 1000) is None
+
+def test_pick_encoding_honours_q_values(assets):
+    a = assets.assets["/scripts/c3runtime.js"]
+    assert {"br", "gzip"} <= set(a.bodies)
+    assert _pick_encoding(a, "gzip, br") == "br"
+    assert _pick_encoding(a, "br;q=0.5, gzip") == "gzip"
+    assert _pick_encoding(a, "br;q=0, gzip;q=0") == "identity"
+    assert _pick_encoding(a, "*") == "br"
+    assert _pick_encoding(a, "*, br;q=0") == "gzip"
+    assert _pick_encoding(a, "identity") == "identity"
+    assert _pick_encoding(a, "") == "identity"
+    assert _accepted_encodings("gzip;q=bad, br") == {"br": 1.0}
+
+def test_etag_matches_any_encoding_variant(assets):
+    a = assets.assets["/style.css"]
+    assert _etag_matches(a, a.etag("identity"))
+    assert _etag_matches(a, 'W/' + a.etag("gzip"))
+    assert _etag_matches(a, '"other", ' + a.etag("br"))
+    assert _etag_matches(a, "*")
+    assert not _etag_matches(a, '"other"')
+
+def test_precompressed_body_and_conditional_get(client, assets):
+    a = assets.assets["/scripts/c3runtime.js"]
+    r = client.get("/scripts/c3runtime.js", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"] == a.etag("gzip")
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert r.content == bytes(a.bodies["identity"])
+    r = client.get("/scripts/c3runtime.js", headers={"Accept-Encoding": "br", "If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+    assert r.headers["etag"] == a.etag("br")
+    assert r.content == b""
+
+def test_range_requests(client, assets):
+    a = assets.assets[MEDIA]
+    data = bytes(a.bodies["identity"])
+    size = len(data)
+    r = client.get(MEDIA, headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.headers["content-range"] == f"bytes 10-19/{size}"
+    assert r.content == data[10:20]
+    r = client.get(MEDIA, headers={"Range": "bytes=-16"})
+    assert r.status_code == 206 and r.content == data[-16:]
+    r = client.get(MEDIA, headers={"Range": f"bytes={size}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{size}"
+
+def test_range_ignores_encoding_and_stale_if_range(client, assets):
+    a = assets.assets["/scripts/c3runtime.js"]
+    data = bytes(a.bodies["identity"])
+    r = client.get("/scripts/c3runtime.js", headers={"Range": "bytes=0-9", "Accept-Encoding": "br"})
+    assert r.status_code == 206
+    assert "content-encoding" not in r.headers
+    assert r.content == data[:10]
+    r = client.get("/scripts/c3runtime.js", headers={
+        "Range": "bytes=0-9", "If-Range": a.etag("identity"), "Accept-Encoding": "identity"})
+    assert r.status_code == 206
+    # parça eski sürüme aitse tam gövde
+    r = client.get("/scripts/c3runtime.js", headers={
+        "Range": "bytes=0-9", "If-Range": '"old"', "Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert r.content == data
+
+def test_large_media_body_is_sent_whole(client, assets):
+    a = assets.assets[MEDIA]
+    r = client.get(MEDIA)
+    assert r.status_code == 200
+    assert r.headers["accept-ranges"] == "bytes"
+    assert int(r.headers["content-length"]) == len(a.bodies["identity"])
+    assert r.content == bytes(a.bodies["identity"])
+
+def test_media_maps_private_copy_unless_immutable(tmp_path, monkeypatch):
+    from bot import assets as bot_assets
+    f = tmp_path / "clip.webm"
+    f.write_bytes(b"A" * 4096)
+    monkeypatch.setattr(bot_assets, "STATIC_FILES_IMMUTABLE", False)
+    private = bot_assets.StaticAsset.load("clip.webm", str(f))
+    monkeypatch.setattr(bot_assets, "STATIC_FILES_IMMUTABLE", True)
+    shared = bot_assets.StaticAsset.load("clip.webm", str(f))
+    assert isinstance(private.bodies["identity"], memoryview)
+    assert isinstance(shared.bodies["identity"], memoryview)
+    assert private.hash == shared.hash
+    # yerinde yeniden yazma: özel kopya hash'lenen içerikte kalır, doğrudan eşleme değişikliği görür
+    with open(f, "r+b") as fh:
+        fh.write(b"B" * 4096)
+    assert bytes(private.bodies["identity"]) == b"A" * 4096
+    assert bytes(shared.bodies["identity"]) == b"B" * 4096
+
+def test_static_routes_resolve_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "only-here.txt").write_text("x")
+    table = StaticRouteTable(("only-here.txt", "index.html", "missing.txt"))
+    assert table.get("only-here.txt") == str(tmp_path / "only-here.txt")
+    # çalışma dizininde yoksa repo kökündeki dosya
+    assert table.get("index.html") == os.path.join(ROOT, "index.html")
+    assert table.get("missing.txt") is None
+    assert table.get("not-registered.txt") is None
+    # istek başına stat yok: değişiklik ancak resolve() ile görülür
+    (tmp_path / "only-here.txt").unlink()
+    (tmp_path / "index.html").write_text("local")
+    assert table.get("only-here.txt") == str(tmp_path / "only-here.txt")
+    table.resolve()
+    assert table.get("only-here.txt") is None
+    assert table.get("index.html") == str(tmp_path / "index.html")
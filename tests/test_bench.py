@@ -0,0 +1,59 @@
+import hashlib
+import hmac
+import json
+import subprocess
+import sys
+from urllib.parse import parse_qsl
+
+import httpx
+
+from bench.bench import BENCH_BOT_TOKEN, FakeBotApi, _percentile, sign_init_data, sign_legacy
+from tests.conftest import ROOT
+
+def test_signed_init_data_matches_telegram_scheme():
+    fields = dict(parse_qsl(sign_init_data({"id": 7, "username": "p7"}, auth_date=1000)))
+    got = fields.pop("hash")
+    secret = hmac.new(b"WebAppData", BENCH_BOT_TOKEN.encode(), hashlib.sha256).digest()
+    dcs = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+    assert got == hmac.new(secret, dcs.encode(), hashlib.sha256).hexdigest()
+    assert json.loads(fields["user"])["id"] == 7 and fields["auth_date"] == "1000"
+    assert sign_legacy(7, 10) != sign_legacy(7, 11)
+
+def test_percentile():
+    assert _percentile([], 95) == 0.0
+    vals = [i / 100 for i in range(1, 101)]
+    assert _percentile(vals, 50) == 0.5
+    assert _percentile(vals, 100) == 1.0
+    assert _percentile([0.3], 99) == 0.3
+
+def test_fake_bot_api_answers_like_telegram(run):
+    api = FakeBotApi()
+
+    async def go():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://tg") as c:
+            me = (await c.post(f"/bot{BENCH_BOT_TOKEN}/getMe")).json()
+            sent = (await c.post(f"/bot{BENCH_BOT_TOKEN}/sendMessage", json={"chat_id": 1})).json()
+            ok = (await c.post(f"/bot{BENCH_BOT_TOKEN}/setChatMenuButton")).json()
+        assert me["ok"] and me["result"]["is_bot"]
+        assert sent["result"]["message_id"] == 1
+        assert ok == {"ok": True, "result": True}
+        assert api.calls == {"getMe": 1, "sendMessage": 1, "setChatMenuButton": 1}
+
+    run(go())
+
+def test_bench_smoke(tmp_path):
+    # bütün senaryolar küçük ölçekte hatasız koşar ve JSON rapor yazar
+    out = tmp_path / "bench.json"
+    proc = subprocess.run(
+        [sys.executable, "-m", "bench.bench", "--requests", "40", "--clients", "1",
+         "--concurrency", "8", "--seed", "20", "--botapi-latency-ms", "0", "--json", str(out)],
+        cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    results = {r["scenario"]: r for r in json.loads(out.read_text())["results"]}
+    assert set(results) == {"game_over_storm", "top_burst", "cold_asset_load"}
+    for r in results.values():
+        for label, ep in r["endpoints"].items():
+            assert ep["requests"] and ep["errors"] == 0, (label, ep)
+    reval = results["cold_asset_load"]["endpoints"]["GET static (revalidate)"]
+    assert reval["statuses"] == {"304": reval["requests"]}
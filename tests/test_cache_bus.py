@@ -0,0 +1,87 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import bot.main as main
+from bot import db
+from bot.main import NOTIFY_UIDS_PER_MSG, CacheBus
+from bot.scores import best_cache, leaderboard_cache, score_buffer
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def _row(uid, score, season=1):
+    return {"user_id": uid, "username": "ü" * 40 + str(uid), "best_score": score,
+            "updated_at": T0 + timedelta(seconds=uid), "season": season}
+
+@pytest.fixture
+def peer(monkeypatch):
+    """Başka bir worker'ın bus'ı: yayınladıkları toplanır."""
+    monkeypatch.setattr(main, "CACHE_NOTIFY", True)
+    bus = CacheBus("test")
+    bus.pid = -1
+    sent = []
+
+    async def notify(payloads):
+        sent.extend(payloads)
+
+    monkeypatch.setattr(bus, "_notify", notify)
+    return bus, sent
+
+def test_rows_are_chunked_under_the_payload_limit(run, fake_db, peer):
+    bus, sent = peer
+    rows = [_row(uid, 1000 - uid) for uid in range(1, 301)]
+
+    async def go():
+        await leaderboard_cache.ensure_loaded()
+        await bus.publish_rows(rows)
+        assert len(sent) > 1
+        assert all(len(p.encode("utf-8")) < 8000 for p in sent)
+        for p in sent:
+            await main.cache_bus._handle(p)
+        top = leaderboard_cache.top(300)
+        assert [r["user_id"] for r in top[:5]] == [1, 2, 3, 4, 5]
+        assert top[0] == {k: rows[0][k] for k in ("user_id", "username", "best_score", "updated_at")}
+
+    run(go())
+
+def test_user_reset_message_drops_local_state(run, fake_db, peer):
+    bus, sent = peer
+    uids = list(range(1, NOTIFY_UIDS_PER_MSG * 2 + 2))
+
+    async def go():
+        score_buffer.submit(7, "p7", 10)
+        score_buffer.submit(99999, "keep", 10)
+        best_cache.update(_row(7, 10), best_cache.token())
+        await leaderboard_cache.ensure_loaded()
+        await bus.publish_users(uids)
+        assert len(sent) == 3
+        for p in sent:
+            await main.cache_bus._handle(p)
+        assert 7 not in score_buffer._pending and 99999 in score_buffer._pending
+        assert not best_cache.is_noop(7, 1, 5, "ü" * 40 + "7")
+        assert leaderboard_cache._stale
+
+    run(go())
+
+def test_season_message_switches_season(run, fake_db, peer):
+    bus, sent = peer
+
+    async def go():
+        score_buffer.submit(1, "p1", 10)
+        await bus.publish("season", season=5)
+        await main.cache_bus._handle(sent[0])
+        assert db.current_season == 5 and not score_buffer._pending
+
+    run(go())
+
+def test_own_and_malformed_messages_are_ignored(run, fake_db):
+    own = json.dumps({"t": "season", "pid": main.cache_bus.pid, "season": 9})
+
+    async def go():
+        received = main.cache_bus.received
+        await main.cache_bus._handle(own)
+        await main.cache_bus._handle("{not json")
+        assert db.current_season == 1 and main.cache_bus.received == received
+
+    run(go())
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest, TimedOut
+
+import bot.main as main
+from bot.main import ChatStateCache
+
+class FakeBot:
+    def __init__(self, fail=False):
+        self.menu_calls = 0
+        self.fail = fail
+
+    async def set_chat_menu_button(self, chat_id, menu_button):
+        self.menu_calls += 1
+        if self.fail:
+            raise TimedOut()
+
+class FakeMessage:
+    def __init__(self, reject=None):
+        self.replies = []
+        self.reject = reject   # web_app butonlu cevapta fırlatılacak hata
+
+    async def reply_text(self, text, reply_markup=None, **kw):
+        button = reply_markup.inline_keyboard[0][0]
+        kind = "web_app" if button.web_app else "url"
+        self.replies.append(kind)
+        if kind == "web_app" and self.reject is not None:
+            raise self.reject
+
+@pytest.fixture
+def state(monkeypatch):
+    cache = ChatStateCache(10)
+    monkeypatch.setattr(main, "chat_state", cache)
+    return cache
+
+def _start(run, bot, msg, chat_type="private"):
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=5, type=chat_type),
+                             message=msg, effective_message=msg)
+    run(main.cmd_start(update, SimpleNamespace(bot=bot)))
+
+def test_menu_button_is_set_once(run, state):
+    bot = FakeBot()
+    for _ in range(3):
+        msg = FakeMessage()
+        _start(run, bot, msg)
+        assert msg.replies == ["web_app"]
+    assert bot.menu_calls == 1
+
+def test_failed_menu_call_is_retried(run, state):
+    bot = FakeBot(fail=True)
+    _start(run, bot, FakeMessage())
+    bot.fail = False
+    _start(run, bot, FakeMessage())
+    _start(run, bot, FakeMessage())
+    assert bot.menu_calls == 2
+
+def test_rejected_web_app_button_falls_back_for_good(run, state):
+    bot = FakeBot()
+    msg = FakeMessage(reject=BadRequest("BUTTON_TYPE_INVALID"))
+    _start(run, bot, msg)
+    assert msg.replies == ["web_app", "url"]
+    msg = FakeMessage()
+    _start(run, bot, msg)
+    assert msg.replies == ["url"]
+
+def test_transient_error_falls_back_only_once(run, state):
+    bot = FakeBot()
+    msg = FakeMessage(reject=TimedOut())
+    _start(run, bot, msg)
+    assert msg.replies == ["web_app", "url"]
+    msg = FakeMessage()
+    _start(run, bot, msg)
+    assert msg.replies == ["web_app"]
+
+def test_game_url_change_resets_menu_and_fallback(run, state, monkeypatch):
+    bot = FakeBot()
+    _start(run, bot, FakeMessage(reject=BadRequest("BUTTON_TYPE_INVALID")))
+    monkeypatch.setattr(main, "PUBLIC_GAME_URL", "https://example.org/new/")
+    monkeypatch.setattr(main, "START_KB_VERSION", "other")
+    msg = FakeMessage()
+    _start(run, bot, msg)
+    assert msg.replies == ["web_app"] and bot.menu_calls == 2
+
+def test_groups_are_ignored(run, state):
+    bot, msg = FakeBot(), FakeMessage()
+    _start(run, bot, msg, chat_type="group")
+    assert msg.replies == [] and bot.menu_calls == 0
+
+def test_state_cache_is_bounded(run):
+    cache = ChatStateCache(2)
+
+    async def go():
+        for cid in (1, 2, 3):
+            await cache.save(cid, {"menu_url": str(cid)})
+        assert list(cache._data) == [2, 3]
+        assert (await cache.get(1))["menu_url"] is None
+
+    run(go())
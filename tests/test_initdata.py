@@ -0,0 +1,49 @@
+import time
+
+from bench.bench import BENCH_BOT_TOKEN, sign_init_data
+from bot.main import InitDataVerifier
+
+USER = {"id": 42, "username": "ada"}
+
+def _verifier(max_age=3600, size=4):
+    return InitDataVerifier(BENCH_BOT_TOKEN, max_age, size)
+
+def test_valid_init_data_returns_user():
+    assert _verifier().verify(sign_init_data(USER)) == USER
+
+def test_rejects_tampered_foreign_and_expired():
+    v = _verifier()
+    good = sign_init_data(USER)
+    assert v.verify(good.replace("ada", "eve")) is None
+    assert v.verify(sign_init_data(USER, bot_token="1:other")) is None
+    assert v.verify(sign_init_data(USER, auth_date=int(time.time()) - 7200)) is None
+    assert v.verify("user=%7B%7D") is None
+    assert v.verify("") is None
+    # max_age=0: yaş kontrolü kapalı
+    assert _verifier(max_age=0).verify(sign_init_data(USER, auth_date=1)) == USER
+
+def test_cache_skips_hmac_only_for_identical_body():
+    v = _verifier()
+    good = sign_init_data(USER)
+    assert v.verify(good) == USER
+    # anahtar bozulsa bile önbellekteki aynı initData HMAC hesaplanmadan kabul edilir
+    v._secret = b"x" * 32
+    assert v.verify(good) == USER
+    # aynı hash'i taşıyan farklı gövde önbellekten geçemez
+    forged = good.replace("query_id=AAH42", "query_id=AAH43")
+    assert v.verify(forged) is None
+    assert v.verify(good) is None   # kayıt atıldı, yeniden doğrulama bozuk anahtarla başarısız
+
+def test_cached_entry_expires_with_auth_date(monkeypatch):
+    v = _verifier(max_age=60)
+    now = time.time()
+    good = sign_init_data(USER, auth_date=int(now))
+    assert v.verify(good) == USER
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert v.verify(good) is None
+
+def test_cache_is_bounded():
+    v = _verifier(size=4)
+    for i in range(10):
+        assert v.verify(sign_init_data({"id": i})) == {"id": i}
+    assert len(v._cache) == 4
@@ -0,0 +1,190 @@
+import asyncio
+import itertools
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+import bot.main as main
+from bench.bench import BENCH_ADMIN
+from bot.scores import LeaderboardCache, _lb_key, _lb_row, leaderboard_cache
+
+SIZE = 10
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def _brute(fake, limit=SIZE):
+    rows = [r for (season, _), r in fake.scores.items() if season == fake.season]
+    return [_lb_row(r) for r in sorted(rows, key=_lb_key)[:limit]]
+
+def _assert_matches(cache, fake):
+    want = _brute(fake)
+    assert cache.top(SIZE) == want
+    for i, r in enumerate(want, 1):
+        assert cache.rank_of(r["user_id"]) == i
+    outside = set(uid for (_, uid) in fake.scores) - set(r["user_id"] for r in want)
+    assert all(cache.rank_of(uid) is None for uid in outside)
+
+def test_cache_matches_brute_force_ranking(run, fake_db):
+    rnd = random.Random(20261018)
+    clock = itertools.count(1)
+    stamp = lambda: T0 + timedelta(milliseconds=next(clock))  # noqa: E731
+    for uid in range(1, 31):
+        # dar skor aralığı: eşit skorlarda updated_at/user_id sırası da sınanır
+        fake_db.scores[(1, uid)] = {"user_id": uid, "username": f"u{uid}", "best_score": rnd.randint(0, 40),
+                                    "updated_at": stamp(), "season": 1}
+    cache = LeaderboardCache(SIZE)
+    history = {}
+
+    async def go():
+        await cache.ensure_loaded()
+        _assert_matches(cache, fake_db)
+        for _ in range(3000):
+            uid = rnd.randint(1, 45)
+            old = fake_db.scores.get((1, uid))
+            roll = rnd.random()
+            if (roll < 0.05 and uid in history and cache.rank_of(uid) is not None
+                    and history[uid]["updated_at"] < old["updated_at"]):
+                # başka worker'dan gecikmeli gelen eski satır: yok sayılmalı
+                # (yalnız ad değişikliği updated_at'i ilerletmez, o yüzden ayırt edilemez)
+                cache.apply(dict(history[uid]))
+            else:
+                if roll < 0.15 and old is not None:
+                    # reset benzeri geriye düşüş
+                    row = {**old, "best_score": rnd.randint(0, old["best_score"]), "updated_at": stamp()}
+                else:
+                    s = rnd.randint(0, 60)
+                    if old is not None and s <= old["best_score"]:
+                        row = {**old, "username": f"u{uid}-{s}"}
+                    else:
+                        row = {"user_id": uid, "username": f"u{uid}", "best_score": s,
+                               "updated_at": stamp(), "season": 1}
+                if old is not None:
+                    history[uid] = old
+                fake_db.scores[(1, uid)] = row
+                cache.apply(dict(row))
+            await cache.ensure_loaded()
+            _assert_matches(cache, fake_db)
+
+    run(go())
+
+def test_other_season_rows_are_ignored(run, fake_db):
+    fake_db.scores[(1, 1)] = {"user_id": 1, "username": "a", "best_score": 5, "updated_at": T0, "season": 1}
+    cache = LeaderboardCache(SIZE)
+
+    async def go():
+        await cache.ensure_loaded()
+        assert not cache.apply({"user_id": 2, "username": "b", "best_score": 99,
+                                "updated_at": T0, "season": 2})
+        _assert_matches(cache, fake_db)
+
+    run(go())
+
+def test_writes_during_load_are_replayed(run, fake_db):
+    for uid in range(1, 21):
+        fake_db.scores[(1, uid)] = {"user_id": uid, "username": f"u{uid}", "best_score": uid,
+                                    "updated_at": T0, "season": 1}
+    fake_db.latency = 0.01
+    cache = LeaderboardCache(SIZE)
+
+    async def go():
+        load = asyncio.ensure_future(cache.ensure_loaded())
+        await asyncio.sleep(0)
+        # SELECT sürerken commit edilen yazı: yükleme bittiğinde yeniden uygulanır
+        row = {"user_id": 3, "username": "u3", "best_score": 100,
+               "updated_at": T0 + timedelta(seconds=1), "season": 1}
+        fake_db.scores[(1, 3)] = row
+        cache.apply(dict(row))
+        await load
+        await cache.ensure_loaded()
+        _assert_matches(cache, fake_db)
+        assert cache.rank_of(3) == 1
+
+    run(go())
+
+def test_invalidate_during_load_reloads(run, fake_db):
+    fake_db.scores[(1, 1)] = {"user_id": 1, "username": "a", "best_score": 5, "updated_at": T0, "season": 1}
+    fake_db.latency = 0.01
+    cache = LeaderboardCache(SIZE)
+
+    async def go():
+        load = asyncio.ensure_future(cache.ensure_loaded())
+        await asyncio.sleep(0)
+        fake_db.scores[(1, 1)] = {**fake_db.scores[(1, 1)], "best_score": 0}
+        cache.invalidate()
+        await load
+        await cache.ensure_loaded()
+        _assert_matches(cache, fake_db)
+
+    run(go())
+
+# ---- keyset sayfalama ve export ----
+
+def _seed(fake, n, rnd):
+    for uid in range(1, n + 1):
+        fake.scores[(1, uid)] = {"user_id": uid, "username": f"u{uid}", "best_score": rnd.randint(0, 8),
+                                 "updated_at": T0 + timedelta(seconds=rnd.randint(0, 3)), "season": 1}
+
+async def _get(path, **params):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.get(path, params=params, headers={"X-Admin-Token": BENCH_ADMIN})
+
+def test_keyset_pages_walk_the_whole_ranking(run, fake_db):
+    _seed(fake_db, 57, random.Random(8))
+    want = [r["user_id"] for r in _brute(fake_db, None)]
+
+    async def go():
+        for limit in (1, 10, 57, 100):
+            got, cursor = [], None
+            while True:
+                params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+                body = (await _get("/api/leaderboard/page", **params)).json()
+                got += [r["user_id"] for r in body["rows"]]
+                cursor = body["next"]
+                if cursor is None:
+                    break
+            assert got == want, limit
+        assert (await _get("/api/leaderboard/page", cursor="%%%")).status_code == 400
+
+    run(go())
+
+def test_export_streams_the_ranking(run, fake_db):
+    _seed(fake_db, 2500, random.Random(9))
+    want = _brute(fake_db, None)
+
+    async def go():
+        r = await _get("/api/admin/export", format="ndjson")
+        rows = [json.loads(line) for line in r.text.splitlines()]
+        assert [x["user_id"] for x in rows] == [x["user_id"] for x in want]
+        assert rows[0]["updated_at"] == want[0]["updated_at"].isoformat()
+        r = await _get("/api/admin/export", format="csv")
+        lines = r.text.splitlines()
+        assert lines[0] == "user_id,username,best_score,updated_at"
+        assert [int(x.split(",")[0]) for x in lines[1:]] == [x["user_id"] for x in want]
+
+    run(go())
+
+# ---- sıra ve çevresi ----
+
+def test_rank_and_window_match_brute_force(run, fake_db, monkeypatch):
+    _seed(fake_db, 40, random.Random(10))
+    want = [r["user_id"] for r in _brute(fake_db, None)]
+    # ilk 5 sıra cache'ten, gerisi sayımla gelir
+    monkeypatch.setattr(leaderboard_cache, "size", 5)
+    leaderboard_cache.invalidate()
+
+    async def go():
+        await leaderboard_cache.ensure_loaded()
+        for uid in want:
+            body = (await _get(f"/api/rank/{uid}", around=3)).json()
+            rank = want.index(uid) + 1
+            assert body["rank"] == rank and body["total"] == len(want)
+            lo = max(0, rank - 4)
+            assert [r["user_id"] for r in body["above"]] == want[lo: rank - 1]
+            assert [r["user_id"] for r in body["below"]] == want[rank: rank + 3]
+            assert [r["rank"] for r in body["above"] + body["below"]] == (
+                list(range(lo + 1, rank)) + list(range(rank + 1, min(len(want), rank + 3) + 1)))
+        assert (await _get("/api/rank/999")).status_code == 404
+
+    run(go())
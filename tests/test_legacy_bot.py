@@ -0,0 +1,109 @@
+import asyncio
+import importlib.util
+import json
+import os
+import time
+
+import httpx
+import pytest
+
+PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "public", "kapi_run", "bot", "main.py")
+
+@pytest.fixture
+def legacy(monkeypatch):
+    spec = importlib.util.spec_from_file_location("legacy_bot", PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    monkeypatch.setattr(mod, "TG_RATE", 1000.0)
+    return mod
+
+class BotApi:
+    """MockTransport arkasındaki Bot API: çağrıları ve eşzamanlılığı kaydeder."""
+
+    def __init__(self, script=()):
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.script = list(script)   # sırayla dönecek özel yanıtlar / hatalar
+
+    async def __call__(self, request):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            payload = json.loads(request.content)
+            await asyncio.sleep(0.01 if payload.get("chat_id") == 1 else 0.001)
+            if self.script:
+                step = self.script.pop(0)
+                if isinstance(step, Exception):
+                    raise step
+                return step
+            self.calls.append((request.url.path.rsplit("/", 1)[-1], payload.get("chat_id"), payload.get("n")))
+            return httpx.Response(200, json={"ok": True})
+        finally:
+            self.active -= 1
+
+def _use(legacy, api):
+    legacy.sender.client = httpx.AsyncClient(transport=httpx.MockTransport(api))
+
+def test_same_chat_in_order_other_chats_concurrent(run, legacy):
+    api = BotApi()
+    _use(legacy, api)
+
+    async def go():
+        tasks = []
+        for n in range(5):
+            tasks.append(legacy.sender.submit("sendMessage", {"chat_id": 1, "n": n}, 1))
+            tasks.append(legacy.sender.submit("sendMessage", {"chat_id": 2, "n": n}, 2))
+        await asyncio.gather(*tasks)
+        assert [n for _, chat, n in api.calls if chat == 1] == list(range(5))
+        assert [n for _, chat, n in api.calls if chat == 2] == list(range(5))
+        # yavaş sohbet 1 hızlı sohbet 2'yi bekletmez
+        assert api.peak >= 2
+        assert not legacy.sender._chains and not legacy.sender.inflight
+
+    run(go())
+
+def test_429_pauses_and_retries(run, legacy):
+    api = BotApi([httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.05}})])
+    _use(legacy, api)
+
+    async def go():
+        t0 = time.monotonic()
+        assert await legacy.sender.call("sendMessage", {"chat_id": 3}) == {"ok": True}
+        assert time.monotonic() - t0 >= 0.05
+        assert len(api.calls) == 1
+
+    run(go())
+
+def test_transport_errors_are_retried_then_raised(run, legacy, monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda d, *a: real_sleep(0))
+    api = BotApi([httpx.ConnectError("down")])
+    _use(legacy, api)
+
+    async def go():
+        assert await legacy.sender.call("sendMessage", {"chat_id": 3}) == {"ok": True}
+        api.script = [httpx.ConnectError("down")] * (legacy.TG_MAX_RETRIES + 1)
+        with pytest.raises(httpx.ConnectError):
+            await legacy.sender.call("sendMessage", {"chat_id": 3})
+
+    run(go())
+
+def test_webhook_answers_before_sending(run, legacy, monkeypatch):
+    monkeypatch.setattr(legacy, "PUBLIC_GAME_URL", "https://example.org/game/")
+    api = BotApi()
+    _use(legacy, api)
+    update = {"update_id": 1, "message": {"message_id": 1, "chat": {"id": 1}, "text": "/start"}}
+
+    async def go():
+        transport = httpx.ASGITransport(app=legacy.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            r = await c.post("/telegram/webhook", json=update)
+            assert r.json() == {"ok": True} and api.calls == []
+            await c.post("/telegram/webhook", json={"update_id": 2, "callback_query": {"id": "q"}})
+        await legacy.sender.stop()
+        assert [m for m, _, _ in api.calls if m != "answerCallbackQuery"] == ["sendGame", "sendMessage"]
+        assert "answerCallbackQuery" in [m for m, _, _ in api.calls]
+
+    run(go())
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bot.main import LiveLeaderboard
+from bot.scores import leaderboard_cache
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def _parse(msg):
+    event, data = msg.decode("utf-8").strip().split("\n")
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+class Client:
+    """Tarayıcıdaki tablo: snapshot'ı alır, diff'leri uygular, sürüm boşluğunu yakalar."""
+
+    def __init__(self):
+        self.ranks = {}
+        self.v = None
+
+    def feed(self, msg):
+        kind, d = _parse(msg)
+        if kind == "snapshot":
+            self.ranks = {r["rank"]: r for r in d["rows"]}
+        else:
+            assert d["v"] == self.v + 1
+            gone = set(d["del"]) | {r["user_id"] for r in d["set"]}
+            self.ranks = {k: r for k, r in self.ranks.items() if r["user_id"] not in gone}
+            self.ranks.update({r["rank"]: r for r in d["set"]})
+        self.v = d["v"]
+
+    def rows(self):
+        return [(r["user_id"], r["username"], r["best_score"]) for _, r in sorted(self.ranks.items())]
+
+@pytest.fixture
+def live(fake_db, monkeypatch):
+    board = LiveLeaderboard(5, 4, 2, 0)
+    monkeypatch.setattr(leaderboard_cache, "listeners", [board.touch])
+    return board
+
+def _write(fake, uid, score, t):
+    row = {"user_id": uid, "username": f"u{uid}", "best_score": score,
+           "updated_at": T0 + timedelta(seconds=t), "season": 1}
+    fake.scores[(1, uid)] = row
+    leaderboard_cache.apply(dict(row))
+
+def test_diffs_rebuild_the_top_rows(run, fake_db, live):
+    rnd = random.Random(15)
+
+    async def go():
+        sub = await live.subscribe()
+        client = Client()
+        for t in range(200):
+            _write(fake_db, rnd.randint(1, 12), rnd.randint(0, 30), t)
+            if rnd.random() < 0.1:
+                leaderboard_cache.invalidate()
+            await live._refresh()
+            while sub.buf:
+                client.feed(sub.buf.popleft())
+            await leaderboard_cache.ensure_loaded()
+            assert client.rows() == [(r["user_id"], r["username"], r["best_score"])
+                                     for r in leaderboard_cache.top(5)]
+        await live.stop()
+
+    run(go())
+
+def test_slow_subscriber_is_dropped_and_limit_enforced(run, fake_db, live):
+    async def go():
+        fast, slow = await live.subscribe(), await live.subscribe()
+        assert await live.subscribe() is None
+        for t in range(6):
+            _write(fake_db, 1, t + 1, t)
+            await live._refresh()
+            fast.buf.clear()
+        assert slow.closed and not slow.buf and live.dropped == 1
+        assert not fast.closed
+        # yer açıldı: yeni abone güncel snapshot ile başlar
+        late = await live.subscribe()
+        kind, d = _parse(late.buf[0])
+        assert kind == "snapshot" and d["v"] == live.version and d["rows"][0]["best_score"] == 6
+        await live.stop()
+
+    run(go())
+
+def test_stream_yields_until_closed(run, fake_db, live):
+    async def go():
+        sub = await live.subscribe()
+        got = []
+
+        async def read():
+            async for chunk in live.stream(sub):
+                got.append(_parse(chunk)[0])
+
+        reader = asyncio.ensure_future(read())
+        await asyncio.sleep(0)
+        _write(fake_db, 1, 5, 0)
+        await live._refresh()
+        await asyncio.sleep(0)
+        await live.stop()
+        await reader
+        assert got == ["snapshot", "diff"]
+        assert sub not in live._subs
+
+    run(go())
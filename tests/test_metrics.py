@@ -0,0 +1,38 @@
+import re
+
+from bot.metrics import LATENCY_BUCKETS, Histogram, Metrics, metrics
+
+def _value(text, line_prefix):
+    m = re.search("^" + re.escape(line_prefix) + r" (\S+)$", text, re.M)
+    return float(m.group(1)) if m else 0.0
+
+def test_histogram_buckets_are_cumulative_in_text():
+    m = Metrics()
+    for v in (0.0005, 0.001, 0.003, 0.2, 99):
+        m.sql["x"].observe(v)
+    text = m.render()
+    assert _value(text, 'kapi_sql_duration_seconds_bucket{statement="x",le="0.001"}') == 2
+    assert _value(text, 'kapi_sql_duration_seconds_bucket{statement="x",le="0.005"}') == 3
+    assert _value(text, 'kapi_sql_duration_seconds_bucket{statement="x",le="10.0"}') == 4
+    assert _value(text, 'kapi_sql_duration_seconds_bucket{statement="x",le="+Inf"}') == 5
+    assert _value(text, 'kapi_sql_duration_seconds_count{statement="x"}') == 5
+    assert len(Histogram().counts) == len(LATENCY_BUCKETS) + 1
+
+def test_requests_are_labelled_by_route_template(client):
+    key = 'kapi_http_responses_total{route="/api/rank/{user_id}",method="GET",status="500"}'
+    before = _value(metrics.render(), key)
+    for uid in (1, 2, 3):
+        assert client.get(f"/api/rank/{uid}").status_code == 500   # DB yok
+    client.get("/style.css")
+    client.get("/no/such/path")
+    text = client.get("/metrics").text
+    assert _value(text, key) == before + 3
+    assert "/api/rank/1" not in text
+    assert 'route="static",method="GET"' in text
+    assert 'route="other",method="GET",status="404"' in text
+
+def test_registered_gauges_are_rendered(client):
+    text = client.get("/metrics").text
+    for name in ("kapi_admission_scale", "kapi_leaderboard_cache_rows", "kapi_webhook_queue_depth",
+                 'kapi_rate_limited{limiter="score"}'):
+        assert re.search("^" + re.escape(name) + " ", text, re.M), name
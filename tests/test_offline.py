@@ -0,0 +1,75 @@
+import json
+
+import httpx
+import pytest
+
+import bot.main as main
+from bot.assets import AssetIndex
+
+PAGE = '<script src="./game.js?v=1"></script><link rel="stylesheet" href="./style.css?v=1" />'
+
+@pytest.fixture
+def game(tmp_path, monkeypatch):
+    """Üç dosyalı küçük bir oyun dizini ve ondan kurulmuş ayrı bir asset indeksi."""
+    (tmp_path / "offline.json").write_text(json.dumps({"fileList": ["game.js", "style.css", "data.pck"]}))
+    (tmp_path / "index.html").write_text(PAGE)
+    (tmp_path / "game.js").write_text("console.log(1)")
+    (tmp_path / "style.css").write_text("body{}")
+    (tmp_path / "data.pck").write_bytes(b"\0" * 64)
+    monkeypatch.chdir(tmp_path)
+    idx = AssetIndex()
+    idx.build()
+    monkeypatch.setattr(main, "asset_index", idx)
+    return tmp_path, idx
+
+async def _changes(**params):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.get("/offline/changes", params=params)
+
+def _key(idx, name):
+    return next(k for k in idx.manifests[idx.version] if k.split("?")[0] == name)
+
+def test_delta_lists_only_changed_files(run, game):
+    root, idx = game
+    v1 = idx.version
+    old_js = _key(idx, "game.js")
+    (root / "game.js").write_text("console.log(2)")
+    idx.build()
+    v2 = idx.version
+    assert v2 != v1 and v1 in idx.manifests
+
+    body = run(_changes(**{"from": v1, "to": v2})).json()
+    new_js = _key(idx, "game.js")
+    assert new_js != old_js
+    assert body["full"] is False
+    # sayfa yeni hash'li URL'i taşıdığı için o da değişir
+    assert sorted(body["changed"]) == sorted([new_js, "index.html"])
+    assert sorted(body["unchanged"]) == sorted([_key(idx, "style.css"), _key(idx, "data.pck")])
+    assert body["removed"] == [old_js]
+
+    # "to" verilmezse güncel sürüm
+    assert run(_changes(**{"from": v1})).json() == body
+
+def test_unknown_versions(run, game):
+    _, idx = game
+    body = run(_changes(**{"from": "nope"})).json()
+    assert body["full"] is True and body["to"] == idx.version
+    assert sorted(body["changed"]) == sorted(idx.manifests[idx.version])
+    assert run(_changes(**{"from": idx.version, "to": "nope"})).status_code == 404
+
+def test_older_version_is_read_from_the_database(run, game, fake_db, monkeypatch):
+    # başka bir worker (ya da önceki deploy) v1'i kaydetmiş; bu worker yalnız v2'yi bellekte tutar
+    root, idx = game
+    v1 = idx.version
+    run(main.record_manifest())
+    (root / "style.css").write_text("body{margin:0}")
+    fresh = AssetIndex()
+    fresh.build()
+    monkeypatch.setattr(main, "asset_index", fresh)
+    assert v1 not in fresh.manifests
+
+    body = run(_changes(**{"from": v1})).json()
+    assert body["full"] is False
+    assert sorted(body["changed"]) == sorted([_key(fresh, "style.css"), "index.html"])
+    assert _key(fresh, "game.js") in body["unchanged"]
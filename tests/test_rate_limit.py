@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+import bot.main as main
+from bot.config import _parse_rate
+from bot.main import RateLimiter
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(time, "monotonic", c)
+    return c
+
+def test_parse_rate():
+    assert _parse_rate("2:30") == (2.0, 30.0)
+    assert _parse_rate("5") == (5.0, 5.0)
+    assert _parse_rate("0") == (0.0, 1.0)
+    assert _parse_rate("-1:0") == (0.0, 1.0)
+    with pytest.raises(ValueError):
+        _parse_rate("fast")
+
+def test_bucket_spends_burst_then_refills(clock):
+    rl = RateLimiter("t", rate=2, burst=3, max_keys=100)
+    assert [rl.take("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert rl.take("a") == pytest.approx(0.5)
+    assert rl.take("b") == 0.0   # anahtarlar birbirini etkilemez
+    clock.now += 0.25
+    assert rl.take("a") == pytest.approx(0.25)
+    clock.now += 0.25
+    assert rl.take("a") == 0.0
+    assert rl.limited == 2
+
+def test_disabled_limiter_never_limits(clock):
+    rl = RateLimiter("t", rate=0, burst=1, max_keys=100)
+    assert all(rl.take("a") == 0.0 for _ in range(100))
+
+def test_buckets_are_bounded_and_idle_ones_dropped(clock):
+    rl = RateLimiter("t", rate=1, burst=2, max_keys=100)
+    for k in range(150):
+        rl.take(k)
+    assert len(rl._buckets) == 100 and 0 not in rl._buckets
+    # dolmak için gereken süre kadar boşta kalan kovalar her çağrıda azar azar atılır
+    clock.now += 10
+    for _ in range(60):
+        rl.take("fresh")
+    assert len(rl._buckets) < 100
+
+def test_score_endpoint_returns_429_with_retry_after(client, monkeypatch):
+    monkeypatch.setattr(main, "score_ip_limiter", RateLimiter("score_ip", rate=0.1, burst=1, max_keys=100))
+    assert client.post("/api/score", json={}).status_code == 401
+    r = client.post("/api/score", json={})
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "10"
@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+import bot.main as main
+from bench.bench import FakeDatabase, FakeEngine
+from bot import db
+from bot.config import DB_POOL, DB_READ_POOL
+from bot.scores import leaderboard_cache
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def replica(fake_db, monkeypatch):
+    """Primary'de bir satır var; replika henüz onu almamış."""
+    fake_db.scores[(1, 1)] = {"user_id": 1, "username": "a", "best_score": 5, "updated_at": T0, "season": 1}
+    lagging = FakeDatabase(0, 5)
+    monkeypatch.setattr(db, "read_engine", FakeEngine(lagging))
+    return lagging
+
+async def _page(**params):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return (await c.get("/api/leaderboard/page", params=params)).json()
+
+def test_plain_reads_use_the_read_pool(run, replica):
+    body = run(_page(limit=leaderboard_cache.size + 1))
+    assert body["rows"] == []
+
+def test_cache_load_reads_the_primary_when_a_replica_is_configured(run, replica, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_READ_URL", "postgresql+psycopg://replica/test")
+
+    async def go():
+        await leaderboard_cache.ensure_loaded()
+        assert [r["user_id"] for r in leaderboard_cache.top(10)] == [1]
+
+    run(go())
+
+def test_without_a_replica_fresh_reads_stay_on_the_read_pool(run, replica, monkeypatch):
+    monkeypatch.setattr(db, "DATABASE_READ_URL", "")
+
+    async def go():
+        # ayrı havuz aynı primary'ye bağlıdır; burada iki sahte DB farkı görünür kılar
+        await leaderboard_cache.ensure_loaded()
+        assert leaderboard_cache.top(10) == []
+
+    run(go())
+
+@pytest.mark.parametrize("read_url", ["", "postgresql+psycopg://replica/test"])
+def test_create_engines_builds_two_pools(run, monkeypatch, read_url):
+    monkeypatch.setattr(db, "DATABASE_READ_URL", read_url)
+    write, read = db.create_engines()
+    try:
+        assert write is not read
+        assert read.get_execution_options().get("postgresql_readonly") is True
+        assert write.get_execution_options().get("postgresql_readonly") is None
+        assert read.url.host == ("replica" if read_url else write.url.host)
+        assert write.pool.size() == DB_POOL["POOL_SIZE"]
+        assert read.pool.size() == DB_READ_POOL["POOL_SIZE"]
+        monkeypatch.setattr(db, "engine", write)
+        monkeypatch.setattr(db, "read_engine", read)
+        labels = {name for name, _ in db._pool_gauges()}
+        assert 'kapi_db_pool_size{pool="write"}' in labels and 'kapi_db_pool_size{pool="read"}' in labels
+    finally:
+        run(write.dispose())
+        run(read.dispose())
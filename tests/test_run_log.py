@@ -0,0 +1,73 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+import pytest
+
+from bot import scores
+from bot.scores import RunLog
+
+def _at(y, m, d, h=12):
+    return datetime(y, m, d, h, tzinfo=timezone.utc)
+
+def _log(max_batch=100, max_pending=1000):
+    return RunLog(60_000, max_batch, max_pending)
+
+def test_flush_copies_runs_and_bumps_aggregates(run, fake_db):
+    log = _log()
+
+    async def go():
+        log._pending += [(_at(2026, 1, 31), 1, 1, 10), (_at(2026, 1, 31, 13), 1, 1, 30),
+                         (_at(2026, 2, 1), 2, 1, 5)]
+        assert await log.flush() == 3
+        # ikinci parti: aynı gün tekrar oynayan kullanıcı DAU'yu artırmaz
+        log._pending += [(_at(2026, 1, 31, 20), 1, 1, 2), (_at(2026, 1, 31, 21), 3, 1, 1)]
+        assert await log.flush() == 2
+        assert len(fake_db.runs) == 5
+        assert fake_db.partitions == {"runs_202601", "runs_202602"}
+        assert fake_db.user_stats[(1, 1)] == [3, 42, _at(2026, 1, 31, 20)]
+        assert fake_db.user_stats[(1, 2)] == [1, 5, _at(2026, 2, 1)]
+        assert fake_db.daily_stats[date(2026, 1, 31)] == [2, 4, 43]
+        assert fake_db.daily_stats[date(2026, 2, 1)] == [1, 1, 5]
+
+    run(go())
+
+def test_old_partitions_and_user_days_are_pruned(run, fake_db, monkeypatch):
+    monkeypatch.setattr(scores, "RUN_RETAIN_MONTHS", 2)
+    log = _log()
+
+    async def go():
+        for month in (1, 2, 3, 4):
+            log._pending.append((_at(2026, month, 2), 1, 1, 1))
+            await log.flush()
+        assert fake_db.partitions == {"runs_202603", "runs_202604"}
+        assert {d for d, _ in fake_db.user_days} == {date(2026, 3, 2), date(2026, 4, 2)}
+
+    run(go())
+
+def test_failed_flush_requeues_and_caps_the_backlog(run, fake_db, monkeypatch):
+    log = _log(max_batch=3, max_pending=4)
+    real = fake_db.execute
+
+    def broken(sql, params):
+        if "user_stats" in sql:
+            raise RuntimeError("db down")
+        return real(sql, params)
+
+    async def go():
+        for i in range(5):
+            log.add(i, 1, i)
+        assert log.dropped == 1 and len(log._pending) == 4
+        monkeypatch.setattr(fake_db, "execute", broken)
+        flush = asyncio.ensure_future(log.flush())
+        await asyncio.sleep(0)
+        log.add(9, 1, 9)   # parti yoldayken gelen
+        with pytest.raises(RuntimeError):
+            await flush
+        # parti başa döner, sınırı aşan en yeni kayıt düşer
+        assert [r[1] for r in log._pending] == [0, 1, 2, 3] and log.dropped == 2
+        monkeypatch.setattr(fake_db, "execute", real)
+        assert await log.flush() == 3
+        assert await log.flush() == 1
+        assert await log.flush() == 0
+
+    run(go())
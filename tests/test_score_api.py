@@ -0,0 +1,153 @@
+import asyncio
+
+import httpx
+import pytest
+
+import bot.main as main
+from bench.bench import db_statements, sign_init_data
+from bot.scores import ScoreWriteBuffer, best_cache, leaderboard_cache, score_buffer
+
+def _user(uid, name=None):
+    return {"id": uid, "username": name or f"p{uid}"}
+
+async def _post(score, user):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/score", json={"score": score},
+                         headers={"X-Telegram-Init-Data": sign_init_data(user)})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def _writes():
+    return sum(db_statements.values())
+
+def test_non_improving_score_skips_the_database(run, fake_db):
+    async def go():
+        assert (await _post(100, _user(1)))["saved"]
+        assert fake_db.scores[(1, 1)]["best_score"] == 100
+        before, skipped = _writes(), best_cache.skipped
+        for s in (100, 50, 0):
+            assert (await _post(s, _user(1))) == {"ok": True, "saved": True, "user_id": 1,
+                                                  "username": "p1", "score": s}
+        assert _writes() == before and best_cache.skipped == skipped + 3
+        # ad değişimi ve rekor yine yazılır
+        await _post(50, _user(1, "renamed"))
+        assert fake_db.scores[(1, 1)]["username"] == "renamed"
+        await _post(120, _user(1, "renamed"))
+        assert fake_db.scores[(1, 1)]["best_score"] == 120
+        assert _writes() > before
+
+    run(go())
+
+def test_reset_forgets_the_cached_best(run, fake_db):
+    async def go():
+        await _post(100, _user(2))
+        await main.reset_users([2])
+        before = _writes()
+        await _post(10, _user(2))
+        assert _writes() > before
+        assert fake_db.scores[(1, 2)]["best_score"] == 10
+
+    run(go())
+
+@pytest.mark.parametrize("season_change", [False, True])
+def test_new_season_is_not_short_circuited(run, fake_db, monkeypatch, season_change):
+    async def go():
+        await _post(100, _user(3))
+        if season_change:
+            fake_db.season = 2
+            monkeypatch.setattr(main.db, "current_season", 2)
+        before = _writes()
+        await _post(40, _user(3))
+        assert (_writes() > before) == season_change
+
+    run(go())
+
+# ---- write-behind tampon ----
+
+def test_write_behind_coalesces_per_user(run, fake_db, monkeypatch):
+    monkeypatch.setattr(main, "SCORE_WRITE_BEHIND", True)
+    published = []
+
+    async def listener(rows):
+        published.extend(rows)
+
+    monkeypatch.setattr(score_buffer, "listeners", [listener])
+
+    async def go():
+        before = _writes()
+        for uid, s in [(1, 10), (2, 5), (1, 30), (1, 20), (2, 7)]:
+            assert (await _post(s, _user(uid)))["queued"]
+        assert _writes() == before and fake_db.scores == {}
+        assert await score_buffer.flush() == 2
+        assert {uid: r["best_score"] for (_, uid), r in fake_db.scores.items()} == {1: 30, 2: 7}
+        # tek partilik upsert: BEGIN + INSERT ... unnest + COMMIT
+        assert _writes() == before + 3
+        assert sorted(r["user_id"] for r in published) == [1, 2]
+        await leaderboard_cache.ensure_loaded()
+        assert [r["user_id"] for r in leaderboard_cache.top(2)] == [1, 2]
+
+    run(go())
+
+def test_full_batch_wakes_the_flusher():
+    buf = ScoreWriteBuffer(60_000, 2)
+    buf.submit(1, "a", 1)
+    buf.submit(1, "a", 2)
+    assert not buf._wake.is_set()
+    buf.submit(2, "b", 1)
+    assert buf._wake.is_set()
+
+def test_failed_flush_requeues_without_losing_newer_scores(run, fake_db, monkeypatch):
+    buf = ScoreWriteBuffer(60_000, 100)
+    fake_db.latency = 0.01
+
+    def broken(sql, params):
+        raise RuntimeError("db down")
+
+    async def go():
+        buf.submit(1, "a", 10)
+        buf.submit(2, "b", 10)
+        monkeypatch.setattr(fake_db, "execute", broken)
+        flush = asyncio.ensure_future(buf.flush())
+        await asyncio.sleep(0)
+        # flush yoldayken gelenler: biri daha yüksek, biri daha düşük
+        buf.submit(1, "a2", 50)
+        buf.submit(2, "b2", 3)
+        with pytest.raises(RuntimeError):
+            await flush
+        assert buf._pending == {1: ("a2", 50), 2: ("b2", 10)}
+
+    run(go())
+
+# ---- leaderboard ETag ----
+
+async def _board(**headers):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.get("/api/leaderboard", params={"limit": 10}, headers=headers)
+
+def test_leaderboard_etag_and_304(run, fake_db):
+    async def go():
+        await _post(10, _user(1))
+        first = await _board()
+        etag = first.headers["etag"]
+        assert first.status_code == 200 and [r["user_id"] for r in first.json()] == [1]
+        again = await _board(**{"If-None-Match": etag})
+        assert again.status_code == 304 and again.content == b""
+        assert again.headers["etag"] == etag
+        assert (await _board(**{"If-None-Match": f'"x", W/{etag}'})).status_code == 304
+        # sıralama değişince ETag da değişir
+        await _post(20, _user(2))
+        changed = await _board(**{"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert [r["user_id"] for r in changed.json()] == [2, 1]
+        # aynı içerik yeniden üretilince (ör. invalidate sonrası) ETag aynı kalır
+        leaderboard_cache.invalidate()
+        assert (await _board(**{"If-None-Match": changed.headers["etag"]})).status_code == 304
+
+    run(go())
+
+def test_if_none_match_parsing():
+    assert main._if_none_match("*", '"a"')
+    assert main._if_none_match('"b", W/"a"', '"a"')
+    assert not main._if_none_match('"b"', '"a"')
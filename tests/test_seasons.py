@@ -0,0 +1,50 @@
+import httpx
+
+import bot.main as main
+from bench.bench import BENCH_ADMIN, sign_init_data
+from bot import db
+from bot.scores import leaderboard_cache, score_buffer
+
+async def _call(method, path, headers=None, **kw):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.request(method, path, headers={"X-Admin-Token": BENCH_ADMIN, **(headers or {})}, **kw)
+
+async def _score(uid, score):
+    r = await _call("POST", "/api/score", json={"score": score},
+                    headers={"X-Telegram-Init-Data": sign_init_data({"id": uid, "username": f"p{uid}"})})
+    assert r.status_code == 200, r.text
+
+def test_reset_all_opens_a_new_season_and_keeps_the_old_one(run, fake_db):
+    async def go():
+        await _score(1, 50)
+        await _score(2, 70)
+        score_buffer.submit(3, "p3", 99)   # eski sezona ait, henüz yazılmamış
+        before = len(fake_db.scores)
+        r = await _call("POST", "/api/admin/reset_all")
+        assert r.json() == {"ok": True, "reset_all": True, "season": 2}
+        assert db.current_season == 2
+        # skor satırlarına dokunulmaz; tampondaki eski sezon skoru atılır
+        assert len(fake_db.scores) == before
+        assert await score_buffer.flush() == 0
+        assert (await _call("GET", "/api/leaderboard")).json() == []
+
+        await _score(1, 10)
+        assert fake_db.scores[(2, 1)]["best_score"] == 10
+        assert fake_db.scores[(1, 1)]["best_score"] == 50
+        now = (await _call("GET", "/api/leaderboard")).json()
+        assert [(r["user_id"], r["best_score"]) for r in now] == [(1, 10)]
+        old = (await _call("GET", "/api/leaderboard", params={"season": 1})).json()
+        assert [(r["user_id"], r["best_score"]) for r in old] == [(2, 70), (1, 50)]
+        await leaderboard_cache.ensure_loaded()
+        assert leaderboard_cache.season == 2
+
+    run(go())
+
+def test_reset_all_requires_admin(run, fake_db):
+    async def go():
+        r = await _call("POST", "/api/admin/reset_all", headers={"X-Admin-Token": "nope"})
+        assert r.status_code == 403
+        assert db.current_season == 1
+
+    run(go())
@@ -0,0 +1,107 @@
+import asyncio
+
+import httpx
+import pytest
+
+import bot.main as main
+from bench.bench import db_statements
+from bot import db
+from bot.config import WEBHOOK_PATH
+
+@pytest.fixture
+def applied(monkeypatch):
+    """Gerçek DDL yerine çalıştığını kaydeden migration'lar (sürümler aynı kalır)."""
+    calls = []
+
+    def step(version):
+        async def fn(conn):
+            calls.append(version)
+        return fn
+
+    monkeypatch.setattr(db, "MIGRATIONS", [(v, step(v)) for v, _ in db.MIGRATIONS])
+    return calls
+
+def test_fresh_database_runs_every_migration_once(run, fake_db, applied):
+    run(db.migrate())
+    assert applied == [v for v, _ in db.MIGRATIONS]
+    assert run(db.schema_version()) == db.SCHEMA_VERSION
+    # güncel şemada açılış tek bir SELECT'tir; kilit alınmaz
+    before = sum(db_statements.values())
+    run(db.migrate())
+    assert applied == [v for v, _ in db.MIGRATIONS]
+    assert sum(db_statements.values()) - before == 1
+
+def test_only_missing_versions_are_applied(run, fake_db, applied):
+    fake_db.schema_versions = {1, 2, 3}
+    run(db.migrate())
+    assert applied == [v for v, _ in db.MIGRATIONS if v > 3]
+    assert fake_db.schema_versions == set(range(1, db.SCHEMA_VERSION + 1))
+
+def test_waiting_worker_skips_finished_migrations(run, fake_db, applied):
+    # kilidi ikinci alan worker işi tekrar çalıştırır; tamamlanmış sürümler atlanır
+    run(db.run_startup_once(db._apply_migrations))
+    run(db.run_startup_once(db._apply_migrations))
+    assert applied == [v for v, _ in db.MIGRATIONS]
+
+def test_real_migrations_run_against_the_fake(run, fake_db):
+    # DDL'in kendisi yok sayılır; sıra ve çağrı imzaları sınanır
+    run(db.migrate())
+    assert fake_db.schema_versions == set(range(1, db.SCHEMA_VERSION + 1))
+
+# ---- ertelenmiş Telegram açılışı ----
+
+class SlowTelegram:
+    bot = None
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.seen = []
+
+    async def initialize(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise RuntimeError("getMe failed")
+
+    async def process_update(self, update):
+        self.seen.append(update.update_id)
+
+@pytest.fixture
+def tg(monkeypatch):
+    fake = SlowTelegram(failures=2)
+    monkeypatch.setattr(main, "telegram_app", fake)
+    monkeypatch.setattr(main, "readiness", {"database": True, "assets": True, "telegram": False})
+    monkeypatch.setattr(main, "recent_updates", main.RecentIds(100))
+    monkeypatch.setattr(main, "WEBHOOK_QUEUE", False)
+    return fake
+
+def test_init_retries_until_telegram_answers(run, tg, monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay, *a: real_sleep(0))
+    run(main._init_telegram())
+    assert tg.attempts == 3 and main.readiness["telegram"]
+
+def test_webhook_waits_for_telegram_then_asks_for_redelivery(run, tg, client, monkeypatch):
+    monkeypatch.setattr(main, "TELEGRAM_READY_TIMEOUT", 0.01)
+    update = {"update_id": 11, "message": {
+        "message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"},
+        "from": {"id": 5, "is_bot": False, "first_name": "a"}, "text": "/start"}}
+
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await c.post(WEBHOOK_PATH, json=update)
+
+    async def go():
+        monkeypatch.setattr(main, "telegram_init_task", asyncio.get_running_loop().create_future())
+        r = await post()
+        assert r.status_code == 503 and r.headers["retry-after"] == "5"
+        assert not main.recent_updates.seen(11) and tg.seen == []
+        main.telegram_init_task.set_result(None)
+        assert (await post()).json() == {"ok": True}
+        assert tg.seen == [11]
+
+    run(go())
+    assert client.get("/ready").status_code == 503
+    main.readiness["telegram"] = True
+    assert client.get("/ready").json() == {"ready": True, "database": True, "assets": True, "telegram": True}
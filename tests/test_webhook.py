@@ -0,0 +1,97 @@
+import httpx
+import pytest
+
+import bot.main as main
+from bot.config import WEBHOOK_PATH
+from bot.main import RecentIds, WebhookQueue
+
+class FakeTelegram:
+    """telegram_app'in webhook yolunda kullanılan kısmı."""
+
+    bot = None
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.seen = []
+
+    async def process_update(self, update):
+        if update.update_id in self.fail:
+            self.fail.discard(update.update_id)
+            raise RuntimeError("boom")
+        self.seen.append(update.update_id)
+
+def _update(uid):
+    return {"update_id": uid, "message": {
+        "message_id": uid, "date": 0, "chat": {"id": 5, "type": "private"},
+        "from": {"id": 5, "is_bot": False, "first_name": "a"}, "text": "/start"}}
+
+async def _send(uid):
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        return await c.post(WEBHOOK_PATH, json=_update(uid))
+
+@pytest.fixture
+def tg(monkeypatch):
+    fake = FakeTelegram()
+    monkeypatch.setattr(main, "telegram_app", fake)
+    monkeypatch.setattr(main, "recent_updates", RecentIds(100))
+    return fake
+
+def test_recent_ids_is_a_bounded_lru():
+    r = RecentIds(2)
+    r.add(1)
+    r.add(2)
+    r.add(1)   # 1 tazelenir, taşınca 2 düşer
+    r.add(3)
+    assert (r.seen(1), r.seen(2), r.seen(3)) == (True, False, True)
+    r.discard(3)
+    assert not r.seen(3)
+
+def test_queue_dedupes_rejects_and_sheds(run, tg, monkeypatch):
+    monkeypatch.setattr(main, "WEBHOOK_QUEUE", True)
+    q = WebhookQueue(2, 1)
+    monkeypatch.setattr(main, "webhook_queue", q)
+
+    async def go():
+        assert (await _send(1)).json() == {"ok": True}
+        assert (await _send(1)).json() == {"ok": True, "duplicate": True}
+        assert (await _send(2)).json() == {"ok": True}
+        # kuyruk dolu: reject modunda 503 ve kimlik kaydedilmez, Telegram tekrar gönderebilir
+        assert (await _send(3)).status_code == 503
+        assert not main.recent_updates.seen(3) and q.rejected == 1
+        monkeypatch.setattr(main, "WEBHOOK_QUEUE_FULL", "shed")
+        assert (await _send(4)).json() == {"ok": True, "shed": True}
+        assert main.recent_updates.seen(4) and q.shed == 1
+        q.start()
+        await q.stop()
+        assert tg.seen == [1, 2] and q.processed == 2
+
+    run(go())
+
+def test_queue_worker_counts_failures(run, tg, monkeypatch):
+    monkeypatch.setattr(main, "WEBHOOK_QUEUE", True)
+    q = WebhookQueue(10, 2)
+    monkeypatch.setattr(main, "webhook_queue", q)
+    tg.fail = {2}
+
+    async def go():
+        q.start()
+        for uid in (1, 2, 3):
+            assert (await _send(uid)).status_code == 200
+        await q.stop()
+        assert sorted(tg.seen) == [1, 3] and (q.processed, q.failed) == (2, 1)
+
+    run(go())
+
+def test_inline_failure_allows_redelivery(run, tg, monkeypatch):
+    monkeypatch.setattr(main, "WEBHOOK_QUEUE", False)
+    tg.fail = {7}
+
+    async def go():
+        assert (await _send(7)).status_code == 500
+        assert not main.recent_updates.seen(7)
+        assert (await _send(7)).json() == {"ok": True}
+        assert (await _send(7)).json()["duplicate"] is True
+        assert tg.seen == [7]
+
+    run(go())